@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from tidepods import cache
+
+# regional test grid, nodes at X0 + k * DX, Y0 + k * DY
+X0, Y0, DX, DY = 10.0625, 54.0625, 0.125, 0.125
+NX, NY = 8, 6
+
+
+def write_constituents(path, amplitudes, phases, x0=X0, y0=Y0, dx=DX, dy=DY):
+    """Write a constituent dfs2 with one amplitude and phase item per constituent.
+
+    amplitudes and phases map constituent names to (ny, nx) arrays.
+    """
+    mikeio = pytest.importorskip("mikeio")
+    import pandas as pd
+
+    ny, nx = np.shape(next(iter(amplitudes.values())))
+    geometry = mikeio.Grid2D(
+        x0=x0, y0=y0, dx=dx, dy=dy, nx=nx, ny=ny, projection="LONG/LAT"
+    )
+    time = pd.date_range("2000-01-01", periods=1)
+    items = []
+    for name in amplitudes:
+        for quantity, values in (("amplitude", amplitudes), ("phase", phases)):
+            items.append(
+                mikeio.DataArray(
+                    np.asarray(values[name], dtype=np.float32)[np.newaxis],
+                    time=time,
+                    geometry=geometry,
+                    item=mikeio.ItemInfo(f"{name} {quantity}"),
+                )
+            )
+    mikeio.Dataset(items).to_dfs(str(path))
+
+    return path
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep the tidepods caches of every test in its own directory."""
+    path = tmp_path / "cache"
+    monkeypatch.setenv(cache.CACHE_ENV, str(path))
+    return path
+
+
+@pytest.fixture
+def constituent_file(tmp_path):
+    """Regional M2/S2 grid with amplitudes varying over the nodes."""
+    rows, cols = np.mgrid[0:NY, 0:NX]
+    amplitudes = {"M2": 1.0 + 0.01 * rows + 0.02 * cols, "S2": np.full((NY, NX), 0.3)}
+    phases = {"M2": 30.0 + cols, "S2": np.full((NY, NX), 60.0)}
+
+    return write_constituents(tmp_path / "constituents.dfs2", amplitudes, phases)
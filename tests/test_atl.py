@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from tidepods import atl
+
+h5py = pytest.importorskip("h5py")
+
+# GPS seconds of 2018-01-01T00:00:00 UTC, the epoch of the ATLAS products
+EPOCH = 1198800018.0
+FILL = np.float32(3.4028235e38)
+
+
+def write_granule(path, short_name="ATL03", beams=("gt1l", "gt2r"), n=5):
+    with h5py.File(path, "w") as h5:
+        if short_name:
+            h5.attrs["short_name"] = np.bytes_(short_name)
+        h5["ancillary_data/atlas_sdp_gps_epoch"] = np.array([EPOCH])
+        for k, beam in enumerate(beams):
+            group = h5.create_group(f"{beam}/heights")
+            group["lon_ph"] = np.linspace(10, 11, n) + k
+            group["lat_ph"] = np.linspace(54, 55, n)
+            group["delta_time"] = np.arange(n) * 3600.5
+            heights = np.arange(n, dtype=np.float32)
+            heights[1] = FILL
+            group.create_dataset("h_ph", data=heights, fillvalue=FILL)
+            group["h_ph"].attrs["_FillValue"] = FILL
+            group["signal_conf_ph"] = np.arange(n * 5, dtype=np.int8).reshape(n, 5)
+    return str(path)
+
+
+def test_to_datetime64_utc(tmp_path):
+    with h5py.File(write_granule(tmp_path / "granule.h5"), "r") as h5:
+        times = atl.to_datetime64(h5, [0.0, 3600.5, 86400.0])
+
+    expected = np.array(
+        ["2018-01-01T00:00:00", "2018-01-01T01:00:00.5", "2018-01-02T00:00:00"],
+        dtype="datetime64[ns]",
+    )
+    np.testing.assert_array_equal(times, expected)
+
+
+def test_product_name(tmp_path):
+    with h5py.File(write_granule(tmp_path / "granule.h5"), "r") as h5:
+        assert atl.product_name(h5) == "ATL03"
+    # older granules are named by their file name
+    path = write_granule(tmp_path / "ATL08_20190101.h5", short_name=None)
+    with h5py.File(path, "r") as h5:
+        assert atl.product_name(h5) == "ATL08"
+    path = write_granule(tmp_path / "other.h5", short_name="ATL06")
+    with h5py.File(path, "r") as h5, pytest.raises(ValueError):
+        atl.product_name(h5)
+
+
+def test_read_granule(tmp_path):
+    path = write_granule(tmp_path / "granule.h5")
+
+    chunks = list(atl.read_granule(path, variables=["signal_conf_ph"], chunksize=3))
+
+    assert [(c["beam"][0], len(c["lon"])) for c in chunks] == [
+        ("gt1l", 3),
+        ("gt1l", 2),
+        ("gt2r", 3),
+        ("gt2r", 2),
+    ]
+    first = chunks[0]
+    np.testing.assert_array_equal(first["height"], [0, np.nan, 2])
+    assert first["time"][1] == np.datetime64("2018-01-01T01:00:00.5", "ns")
+    np.testing.assert_array_equal(chunks[1]["lon"], [10.75, 11.0])
+    # one column per value of the second axis
+    assert [f"signal_conf_ph_{i}" for i in range(5)] == [
+        name for name in first if name.startswith("signal_conf_ph")
+    ]
+    np.testing.assert_array_equal(first["signal_conf_ph_2"], [2, 7, 12])
+
+
+def test_read_granule_beams(tmp_path):
+    path = write_granule(tmp_path / "granule.h5")
+
+    chunks = list(atl.read_granule(path, beams=["gt2r"]))
+
+    assert len(chunks) == 1 and set(chunks[0]["beam"]) == {"gt2r"}
+    with pytest.raises(ValueError, match="gt3l"):
+        next(atl.read_granule(path, beams=["gt1l", "gt3l"]))
@@ -0,0 +1,43 @@
+import datetime
+
+import numpy as np
+
+from tidepods import cache
+
+START = datetime.datetime(2021, 1, 1)
+END = datetime.datetime(2021, 12, 31)
+
+
+def test_series_keys_differ_by_location_and_period():
+    lon, lat = [10.0, 10.0, 10.125], [55.0, 55.0, 55.0]
+    keys = cache.series_keys(lon, lat, START, END, 0.5, "f")
+    other = cache.series_keys([10.0], [55.0], START, END, 1.0, "f")
+
+    assert keys[0] == keys[1] != keys[2]
+    assert other[0] != keys[0]
+
+
+def test_series_round_trip(cache_dir):
+    levels = np.arange(12, dtype=np.float32).reshape(3, 4)
+    cache.put_series(["a", "b", "c"], levels)
+
+    found_levels, found = cache.get_series(["c", "x", "a", "a"], 4)
+
+    assert found.tolist() == [True, False, True, True]
+    np.testing.assert_array_equal(found_levels[[0, 2, 3]], levels[[2, 0, 0]])
+    assert np.isnan(found_levels[1]).all()
+    # a different series length is a miss
+    assert not cache.get_series(["a"], 5)[1].any()
+
+
+def test_put_series_prunes_least_recently_used(monkeypatch):
+    # room for two series of 256 float32 values
+    monkeypatch.setenv(cache.SERIES_LIMIT_ENV, str(2 * 1024 / 2 ** 20))
+    levels = np.zeros((1, 256), dtype=np.float32)
+
+    cache.put_series(["a"], levels)
+    cache.put_series(["b"], levels)
+    cache.get_series(["a"], 256)
+    cache.put_series(["c"], levels)
+
+    assert cache.get_series(["a", "b", "c"], 256)[1].tolist() == [True, False, True]
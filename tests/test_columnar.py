@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from tidepods import columnar
+
+pa = pytest.importorskip("pyarrow")
+
+LON = np.array([10.0625, -3.5, 179.99])
+LAT = np.array([54.0625, 50.25, -89.9])
+
+
+def test_point_wkb_matches_shapely():
+    from shapely import wkb
+    from shapely.geometry import Point
+
+    geometries = columnar.point_wkb(LON, LAT)
+
+    assert [wkb.loads(g.as_py()) for g in geometries] == [
+        Point(x, y) for x, y in zip(LON, LAT)
+    ]
+
+
+def test_point_coordinates_round_trip():
+    geometries = columnar.point_wkb(LON, LAT)
+
+    lon, lat = columnar.point_coordinates(geometries.slice(1))
+
+    np.testing.assert_array_equal(lon, LON[1:])
+    np.testing.assert_array_equal(lat, LAT[1:])
+
+
+def test_point_coordinates_points_only():
+    from shapely.geometry import LineString
+
+    geometries = pa.array([LineString([(0, 0), (1, 1)]).wkb])
+
+    with pytest.raises(ValueError):
+        columnar.point_coordinates(geometries)
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+def test_write_read_points(tmp_path, suffix):
+    path = tmp_path / ("points" + suffix)
+    tide = np.array([0.5, -1.25, 0.0], dtype=np.float32)
+
+    columnar.write_points(path, LON, LAT, {"tide": tide})
+    columns = columnar.read_points(path)
+
+    np.testing.assert_array_equal(columns["lon"], LON)
+    np.testing.assert_array_equal(columns["lat"], LAT)
+    np.testing.assert_array_equal(columns["tide"], tide)
+    chunks = list(columnar.read_table_chunks(path, chunksize=2))
+    assert [len(chunk["lon"]) for chunk in chunks] == [2, 1]
+
+
+def test_geoparquet_metadata(tmp_path):
+    import pyarrow.parquet as pq
+
+    path = tmp_path / "points.parquet"
+    columnar.write_points(path, LON, LAT, {"tide": np.zeros(3)})
+
+    metadata = pq.read_schema(str(path)).metadata
+    assert b"geo" in metadata and b'"primary_column": "geometry"' in metadata[b"geo"]
+
+
+def test_table_format():
+    assert columnar.table_format("out.PARQUET") == "parquet"
+    assert columnar.table_format("out.feather") == "arrow"
+    with pytest.raises(ValueError):
+        columnar.table_format("out.shp")
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import numpy as np
+
+from conftest import DX, DY, NX, NY, X0, Y0
+from tidepods import constituents
+
+
+def test_load_grid_converts_once(constituent_file, cache_dir):
+    grid = constituents.load_grid(constituent_file)
+
+    assert (grid["x0"], grid["y0"], grid["dx"], grid["dy"]) == (X0, Y0, DX, DY)
+    assert grid["constituents"] == ["M2", "S2"]
+    assert grid["data"].shape == (NY, NX, 2, 2)
+    np.testing.assert_allclose(grid["data"][2, 3, 0], [1.0 + 0.02 + 0.06, 33.0])
+
+    # only the final array and index are left, no temporary files
+    files = sorted(p.suffix for p in (cache_dir / "constituents").iterdir())
+    assert files == [".json", ".npy"]
+
+
+def test_open_grid_of_converted_index(constituent_file, tmp_path):
+    index_path = constituents.convert_dfs2(constituent_file, tmp_path / "grid")
+    grid = constituents.open_grid(index_path)
+
+    names = sorted(p.name for p in (tmp_path / "grid").iterdir())
+    assert names == sorted([index_path.name, Path(grid["data"].filename).name])
+    assert isinstance(grid["data"], np.memmap)
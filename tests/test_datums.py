@@ -0,0 +1,70 @@
+import datetime
+
+import numpy as np
+import pytest
+from conftest import DX, DY, X0, Y0, write_constituents
+
+from tidepods import constituents, datums
+
+
+@pytest.fixture(autouse=True)
+def short_cycle(monkeypatch):
+    # a month is enough to reach the M2 + S2 spring range
+    monkeypatch.setattr(datums, "NODAL_CYCLE_END", datetime.datetime(2000, 2, 1))
+
+
+def test_compute_datums_bounds():
+    amplitude = np.array([[1.0, 0.3], [0.5, 0.0]])
+    phase = np.array([[30.0, 60.0], [0.0, 0.0]])
+
+    values = datums.compute_datums(amplitude, phase, ["M2", "S2"])
+
+    lat, msl, hat = values.T
+    assert np.all(lat < msl) and np.all(msl < hat)
+    np.testing.assert_allclose(msl, 0, atol=0.01)
+    # springs add the amplitudes, up to the nodal factors
+    np.testing.assert_allclose(hat, amplitude.sum(axis=1), rtol=0.05)
+    np.testing.assert_allclose(lat, -amplitude.sum(axis=1), rtol=0.05)
+
+
+def test_get_datums_at_nodes(constituent_file):
+    lon = X0 + DX * np.array([0, 3, 7])
+    lat = Y0 + DY * np.array([0, 2, 5])
+
+    values = datums.get_datums(lon, lat, constituent_file)
+
+    grid = constituents.load_grid(constituent_file)
+    amplitude, phase = constituents.node_values(grid, [0, 2, 5], [0, 3, 7])
+    expected = datums.compute_datums(amplitude, phase, grid["constituents"])
+    for k, name in enumerate(datums.DATUMS):
+        np.testing.assert_allclose(values[name], expected[:, k], atol=1e-6)
+    np.testing.assert_array_equal(
+        datums.lowest_astronomical_tide(lon, lat, constituent_file), values["LAT"]
+    )
+
+
+def test_datums_stored(constituent_file, monkeypatch):
+    lon, lat = np.array([10.2, 10.6]), np.array([54.2, 54.5])
+    first = datums.get_datums(lon, lat, constituent_file)
+
+    def recompute(*args):
+        raise AssertionError("datums recomputed")
+
+    monkeypatch.setattr(datums, "compute_datums", recompute)
+    second = datums.get_datums(lon, lat, constituent_file)
+
+    for name in datums.DATUMS:
+        np.testing.assert_array_equal(first[name], second[name])
+
+
+def test_land_nodes_skipped(tmp_path):
+    amplitude = np.full((2, 2), 1.0)
+    amplitude[0, 1] = np.nan
+    path = write_constituents(
+        tmp_path / "land.dfs2", {"M2": amplitude}, {"M2": np.zeros((2, 2))}
+    )
+
+    values = datums.get_datums([X0 + DX / 2, X0 + DX], [Y0, Y0], path)
+
+    # between a land and a sea node, the sea node alone
+    np.testing.assert_allclose(values["HAT"], [1.0, np.nan], atol=0.05)
@@ -0,0 +1,69 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from tidepods import dfs0, make_pfs
+
+mikeio = pytest.importorskip("mikeio")
+pd = pytest.importorskip("pandas")
+
+LEVELS = np.array([[0.5, -0.25, 1.0, 0.0], [1.5, 2.0, -1.0, 0.125]], dtype=np.float32)
+
+
+def write_dfs0(path, time, levels=LEVELS):
+    mikeio.Dataset(
+        [
+            mikeio.DataArray(series, time=time, item=mikeio.ItemInfo(f"Point_{n}"))
+            for n, series in enumerate(levels, 1)
+        ]
+    ).to_dfs(str(path))
+    return str(path)
+
+
+def test_read_equidistant(tmp_path):
+    time = pd.date_range("2021-06-01 06:00", periods=4, freq="30min")
+    path = write_dfs0(tmp_path / "temp.dfs0", time)
+
+    header = dfs0.read_header(path)
+
+    assert header["items"] == ["Point_1", "Point_2"]
+    assert header["start"] == datetime.datetime(2021, 6, 1, 6)
+    assert header["timestep"] == 0.5 and header["ntimes"] == 4
+    np.testing.assert_array_equal(make_pfs.read_dfs0(path), LEVELS)
+    np.testing.assert_array_equal(dfs0.times(path), time.values.astype("M8[ms]"))
+
+
+def test_read_non_equidistant(tmp_path):
+    time = pd.DatetimeIndex(
+        ["2021-06-01 06:00", "2021-06-01 06:10", "2021-06-01 07:00", "2021-06-02"]
+    )
+    path = write_dfs0(tmp_path / "temp.dfs0", time)
+
+    assert dfs0.read_header(path)["timestep"] is None
+    np.testing.assert_array_equal(dfs0.times(path), time.values.astype("M8[ms]"))
+    np.testing.assert_array_equal(make_pfs.read_dfs0(path), LEVELS)
+
+
+def test_to_dataframe_matches_mikeio(tmp_path):
+    time = pd.date_range("2021-06-01", periods=4, freq="h")
+    path = write_dfs0(tmp_path / "temp.dfs0", time)
+
+    expected = mikeio.read(path).to_dataframe()
+    df = dfs0.to_dataframe(path)
+
+    assert list(df.columns) == list(expected.columns)
+    np.testing.assert_array_equal(df.index.values, expected.index.values)
+    np.testing.assert_array_equal(df.values, expected.values)
+
+
+def test_truncated_file(tmp_path):
+    time = pd.date_range("2021-06-01", periods=4, freq="h")
+    path = write_dfs0(tmp_path / "temp.dfs0", time)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-8])
+
+    with pytest.raises(ValueError, match="Truncated"):
+        dfs0.read_header(path)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from tidepods import harmonics
+
+# hourly over two days
+TIMES = np.datetime64("2021-03-01T00:00:00") + np.arange(48) * np.timedelta64(1, "h")
+
+
+def test_s2_follows_solar_time():
+    # S2 has no nodal correction and V = 2T, T counted from midnight UT
+    times = np.array(["2021-03-01T00:00", "2021-03-01T03:00", "2021-03-01T06:00"])
+    levels = harmonics.predict([[1.0]], [[0.0]], ["S2"], harmonics.to_datetime64(times))
+
+    np.testing.assert_allclose(levels[0], [1.0, 0.0, -1.0], atol=1e-9)
+
+
+def test_phase_lag_delays_tide():
+    # a 60 degree S2 phase lag delays high water by two hours
+    levels = harmonics.predict([[1.0]], [[60.0]], ["S2"], TIMES)
+
+    assert np.argmax(levels[0, :12]) == 2
+
+
+def test_m2_repeats_after_its_period():
+    period = np.timedelta64(int(round(12.4206012 * 3600)), "s")
+    a = harmonics.predict([[1.0]], [[30.0]], ["M2"], TIMES)
+    b = harmonics.predict([[1.0]], [[30.0]], ["M2"], TIMES + period)
+
+    np.testing.assert_allclose(a, b, atol=1e-3)
+    assert 0.9 < np.abs(a).max() < 1.1
+
+
+def test_predict_at_is_diagonal_of_predict():
+    rng = np.random.default_rng(0)
+    constituents = ["M2", "S2", "K1", "O1"]
+    amplitude = rng.uniform(0, 1, (5, 4))
+    phase = rng.uniform(0, 360, (5, 4))
+    times = TIMES[[0, 7, 13, 21, 40]]
+
+    full = harmonics.predict(amplitude, phase, constituents, times)
+    at = harmonics.predict_at(amplitude, phase, constituents, times)
+
+    np.testing.assert_allclose(at, np.diag(full))
+
+
+def test_unknown_constituent():
+    with pytest.raises(ValueError):
+        harmonics.predict([[1.0]], [[0.0]], ["XX9"], TIMES)
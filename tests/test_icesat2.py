@@ -0,0 +1,166 @@
+import fiona
+import numpy as np
+import pytest
+from conftest import DX, X0, Y0, write_constituents
+from shapely.geometry import Point, mapping
+
+from tidepods import columnar, icesat2, predict
+from tidepods.pointset import PointSet
+
+DATES = np.array(
+    [
+        "2021-06-01T10:00:05",
+        "2021-06-01T10:00:50",
+        "2021-06-01T10:00:50",
+        "2021-06-01T10:03:00",
+    ],
+    dtype="datetime64[s]",
+)
+
+
+@pytest.fixture
+def points():
+    # first three points in the cell of node (10.5625, 54.4375), the last one
+    # in the same cell minutes later
+    return PointSet([10.55, 10.58, 10.6, 10.56], [54.43, 54.45, 54.40, 54.44])
+
+
+def predict_points(points, constituent_file, **options):
+    return icesat2.predict_points(
+        points, DATES, "MSL", constituent_file, None, None, backend="native", **options
+    )
+
+
+def test_dedupe_predicts_cell_nodes_per_bin(points, constituent_file):
+    tv = predict_points(points, constituent_file, dedupe=True)
+
+    expected = predict.tide_values(
+        [10.5625, 10.5625],
+        [54.4375, 54.4375],
+        np.array(["2021-06-01T10:00", "2021-06-01T10:03"], dtype="datetime64[s]"),
+        "MSL",
+        constituent_file,
+    )
+    np.testing.assert_allclose(tv, np.array(expected)[[0, 0, 0, 1]])
+
+
+def test_dedupe_seconds(points, constituent_file):
+    tv = predict_points(points, constituent_file, dedupe=True, dedupe_seconds=30)
+
+    assert tv[0] != tv[1] and tv[1] == tv[2]
+
+
+def test_dedupe_close_to_points(points, constituent_file):
+    exact = predict_points(points, constituent_file)
+    deduped = predict_points(points, constituent_file, dedupe=True)
+
+    np.testing.assert_allclose(deduped, exact, atol=0.05)
+
+
+def test_dedupe_seconds_positive(points, constituent_file):
+    with pytest.raises(ValueError):
+        predict_points(points, constituent_file, dedupe=True, dedupe_seconds=0)
+
+
+def test_dedupe_land_node(tmp_path):
+    amplitude = np.ones((2, 2))
+    amplitude[0, 1] = np.nan
+    path = write_constituents(
+        tmp_path / "land.dfs2", {"M2": amplitude}, {"M2": np.zeros((2, 2))}
+    )
+    # at sea, though nearest to the land node
+    points = PointSet([X0 + 0.7 * DX, X0 + 0.2 * DX], [Y0, Y0])
+    dates = DATES[:2]
+
+    exact = icesat2.predict_points(
+        points, dates, "MSL", path, None, None, backend="native"
+    )
+    deduped = icesat2.predict_points(
+        points, dates, "MSL", path, None, None, backend="native", dedupe=True
+    )
+
+    assert np.isfinite(exact).all()
+    np.testing.assert_allclose(deduped[0], exact[0])
+    assert np.isfinite(deduped[1])
+
+
+def test_dedupe_keys_over_long_periods(constituent_file):
+    # bins 2 ** 32 ms apart in neighbouring cells must not share a value
+    points = PointSet([10.0625, 10.1875], [54.0625, 54.0625])
+    dates = np.datetime64("2021-06-01T10:00:00", "ms") + np.array(
+        [2 ** 32, 0], dtype="timedelta64[ms]"
+    )
+
+    tv = icesat2.predict_points(
+        points,
+        dates,
+        "MSL",
+        constituent_file,
+        None,
+        None,
+        backend="native",
+        dedupe=True,
+        dedupe_seconds=0.001,
+    )
+
+    expected = predict.tide_values(
+        points.lon, points.lat, dates, "MSL", constituent_file
+    )
+    np.testing.assert_allclose(tv, expected)
+
+
+@pytest.fixture
+def shapefile(tmp_path):
+    path = str(tmp_path / "photons.shp")
+    schema = {
+        "geometry": "Point",
+        "properties": {"pid": "int", "lon": "float", "lat": "float", "time": "str"},
+    }
+    with fiona.open(path, "w", "ESRI Shapefile", schema, crs="EPSG:4326") as dst:
+        for pid in range(7):
+            lon, lat = 10.2 + 0.1 * pid, 54.6 - 0.05 * pid
+            dst.write(
+                {
+                    "geometry": mapping(Point(lon, lat)),
+                    "properties": {
+                        "pid": pid,
+                        "lon": lon,
+                        "lat": lat,
+                        "time": f"2021-06-0{1 + pid % 3} 1{pid}:00",
+                    },
+                }
+            )
+    return path
+
+
+@pytest.mark.parametrize("output_format", ["shp", "parquet"])
+def test_chunked_matches_whole(shapefile, constituent_file, tmp_path, monkeypatch,
+                               output_format):
+    monkeypatch.delenv("MIKE", raising=False)
+
+    def run(outfolder, chunksize):
+        icesat2.main(
+            shapefile,
+            str(outfolder),
+            "MSL",
+            backend="native",
+            constituents=str(constituent_file),
+            chunksize=chunksize,
+            output_format=output_format,
+        )
+        (outfile,) = outfolder.glob(f"*_tides.{output_format}")
+        if output_format == "parquet":
+            columns = columnar.read_points(outfile)
+            return columns["pid"], columns["tide_level"]
+        with fiona.open(outfile) as src:
+            props = [f["properties"] for f in src]
+        return [p["pid"] for p in props], [p["tide_level"] for p in props]
+
+    whole = run(tmp_path / "whole", None)
+    chunked = run(tmp_path / "chunked", 3)
+
+    # chunks are appended in file order
+    np.testing.assert_array_equal(chunked[0], np.arange(7))
+    np.testing.assert_array_equal(chunked[0], whole[0])
+    np.testing.assert_allclose(chunked[1], whole[1])
+    assert np.isfinite(np.asarray(whole[1], dtype=float)).all()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from rasterio.transform import from_origin
+from shapely.geometry import box, mapping, shape
+
+from tidepods import land
+
+fiona = pytest.importorskip("fiona")
+
+# two islands, far apart
+ISLANDS = [box(10.0, 54.0, 10.5, 54.5), box(-3.0, 50.0, -2.0, 51.0)]
+
+
+@pytest.fixture
+def landmask(tmp_path):
+    path = str(tmp_path / "land.shp")
+    schema = {"geometry": "Polygon", "properties": {"id": "int"}}
+    with fiona.open(path, "w", "ESRI Shapefile", schema, crs="EPSG:4326") as dst:
+        for k, island in enumerate(ISLANDS):
+            dst.write({"geometry": mapping(island), "properties": {"id": k}})
+    return path
+
+
+def profile(west, north, width, height, res=0.125):
+    return {
+        "transform": from_origin(west, north, res, res),
+        "width": width,
+        "height": height,
+    }
+
+
+def test_query_features(landmask):
+    geometries = land.query_features(landmask, (10.4, 54.4, 11.0, 55.0))
+
+    assert len(geometries) == 1 and shape(geometries[0]).equals(ISLANDS[0])
+    assert land.query_features(landmask, (0.0, 0.0, 1.0, 1.0)) == []
+
+
+def test_land_mask_pixel_centres(landmask):
+    # 0.125 degree cells from 9.75, 54.75: the island covers rows and cols 2-5
+    mask = land.land_mask(landmask, profile(9.75, 54.75, 8, 8))
+
+    expected = np.zeros((8, 8), dtype=bool)
+    expected[2:6, 2:6] = True
+    np.testing.assert_array_equal(mask, expected)
+
+
+def test_land_mask_at_sea(landmask):
+    mask = land.land_mask(landmask, profile(0.0, 1.0, 4, 4))
+
+    assert mask.shape == (4, 4) and not mask.any()
+
+
+def test_land_mask_cached(landmask, cache_dir, monkeypatch):
+    grid = profile(-3.5, 51.5, 16, 16)
+    first = land.land_mask(landmask, grid)
+
+    def read(*args, **kwargs):
+        raise AssertionError("land polygons read again")
+
+    monkeypatch.setattr(land.fiona, "open", read)
+    np.testing.assert_array_equal(land.land_mask(landmask, grid), first)
+    assert first.sum() == 8 * 8
+    # another grid gets a mask of its own
+    assert land.grid_key(landmask, grid) != land.grid_key(
+        landmask, profile(-3.5, 51.5, 16, 15)
+    )
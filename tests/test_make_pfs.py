@@ -0,0 +1,134 @@
+import datetime
+import os
+import stat
+import sys
+
+import numpy as np
+import pytest
+
+from tidepods import dfs0, make_pfs, pfs
+from tidepods.pointset import PointSet
+
+START = datetime.datetime(2021, 6, 1)
+END = datetime.datetime(2021, 6, 1, 2)
+
+# writes a dfs0 with one series per PFS point, its level the point id
+PREDICTOR = """#!{python}
+import re
+import sys
+
+import mikeio
+import numpy as np
+import pandas as pd
+
+text = open(sys.argv[1]).read()
+pids = re.findall(r"description = (\\d+)", text)
+time = pd.date_range("2021-06-01", periods=5, freq="30min")
+mikeio.Dataset(
+    [
+        mikeio.DataArray(
+            np.full(5, float(pid), dtype=np.float32),
+            time=time,
+            item=mikeio.ItemInfo(f"Point_{{n}}"),
+        )
+        for n, pid in enumerate(pids, 1)
+    ]
+).to_dfs(sys.argv[1].replace(".pfs", ".dfs0"))
+"""
+
+# the stand-in TidePredictor.exe is a script
+posix = pytest.mark.skipif(os.name != "posix", reason="needs an executable script")
+
+
+def install(mikepath, script):
+    exe = mikepath / "bin" / "TidePredictor.exe"
+    exe.parent.mkdir(parents=True)
+    exe.write_text(script)
+    exe.chmod(exe.stat().st_mode | stat.S_IEXEC)
+    return mikepath
+
+
+@pytest.fixture
+def mikepath(tmp_path):
+    pytest.importorskip("mikeio")
+    return install(tmp_path / "mike", PREDICTOR.format(python=sys.executable))
+
+
+def write_pfs(shard, workdir):
+    pfs.write_tidepredictor_pfs(
+        os.path.join(workdir, "temp.pfs"), shard, "c.dfs2", "prepack.dat", START, END
+    )
+
+
+def test_shard_indices_cover_points(monkeypatch):
+    monkeypatch.setattr(make_pfs, "MIN_SHARD_SIZE", 2)
+    shards = make_pfs.shard_indices(7, workers=3)
+
+    assert len(shards) == 3
+    np.testing.assert_array_equal(np.concatenate(shards), np.arange(7))
+
+
+@posix
+def test_predict_shards_in_point_order(mikepath, tmp_path, monkeypatch):
+    monkeypatch.setattr(make_pfs, "MIN_SHARD_SIZE", 2)
+    pts = PointSet(np.linspace(10, 11, 7), np.full(7, 55.0), np.arange(101, 108))
+    tempdir = tmp_path / "temp"
+
+    shards = make_pfs.predict_shards(pts, write_pfs, mikepath, str(tempdir), 3)
+
+    assert len(shards) == 3
+    levels = np.concatenate(shards)
+    np.testing.assert_array_equal(levels[:, 0], pts.ids)
+    # the shard folders are removed once read
+    assert list(tempdir.iterdir()) == []
+
+
+@posix
+def test_predict_shards_fresh_per_call(mikepath, tmp_path):
+    tempdir = str(tmp_path / "temp")
+    first = make_pfs.predict_shards(
+        PointSet([10.0, 10.5], [55.0, 55.0], [1, 2]), write_pfs, mikepath, tempdir
+    )
+    second = make_pfs.predict_shards(
+        PointSet([10.0], [55.0], [3]), write_pfs, mikepath, tempdir
+    )
+
+    assert first[0][:, 0].tolist() == [1, 2] and second[0][:, 0].tolist() == [3]
+
+
+@posix
+def test_make_dfs0_ignores_stale_output(tmp_path):
+    mikepath = install(tmp_path / "mike", "#!/bin/sh\nexit 0\n")
+    pfsfile = tmp_path / "temp.pfs"
+    pfsfile.write_text("")
+    (tmp_path / "temp.dfs0").write_bytes(b"stale")
+
+    with pytest.raises(ValueError):
+        make_pfs.make_dfs0(mikepath, str(pfsfile))
+    assert not (tmp_path / "temp.dfs0").exists()
+
+
+@posix
+def test_make_dfs0_checks_return_code(tmp_path):
+    mikepath = install(tmp_path / "mike", "#!/bin/sh\necho failed >&2\nexit 3\n")
+    pfsfile = tmp_path / "temp.pfs"
+    pfsfile.write_text("")
+
+    with pytest.raises(RuntimeError, match="code 3"):
+        make_pfs.make_dfs0(mikepath, str(pfsfile))
+
+
+@posix
+def test_concat_series_columns_unique(mikepath, tmp_path, monkeypatch):
+    monkeypatch.setattr(make_pfs, "MIN_SHARD_SIZE", 2)
+    pts = PointSet(np.linspace(10, 11, 5), np.full(5, 55.0), np.arange(11, 16))
+
+    shards = make_pfs.predict_shards(
+        pts, write_pfs, mikepath, str(tmp_path), 2, read=dfs0.to_dataframe
+    )
+    df = make_pfs.concat_series(shards)
+
+    # every shard numbers its own points from Point_1
+    assert list(shards[1].columns) == ["Point_1", "Point_2"]
+    assert list(df.columns) == [f"Point_{n}" for n in range(1, 6)]
+    np.testing.assert_array_equal(df.iloc[0], pts.ids)
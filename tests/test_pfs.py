@@ -0,0 +1,82 @@
+import datetime
+import pathlib
+
+import numpy as np
+import pytest
+
+from tidepods import pfs
+from tidepods.pointset import PointSet
+
+START = datetime.datetime(2021, 6, 1, 10, 30)
+END = datetime.datetime(2021, 6, 2)
+
+
+def write(tmp_path, pts, **kwargs):
+    path = tmp_path / "temp.pfs"
+    constituents_path, prepack_path = pathlib.Path("c.dfs2"), pathlib.Path("p.dat")
+    pfs.write_tidepredictor_pfs(
+        str(path), pts, constituents_path, prepack_path, START, END, **kwargs
+    )
+    return path
+
+
+def test_format_double():
+    assert pfs.format_double(2.0) == "2"
+    assert pfs.format_double(0.1) == "0.1"
+    assert pfs.format_double(-12.0625) == "-12.0625"
+    assert pfs.format_double(1e-20) == "1E-20"
+    assert float(pfs.format_double(np.float64(55.123456789012345))) == np.float64(
+        55.123456789012345
+    )
+
+
+def test_format_value():
+    assert pfs.format_value(START) == "2021, 6, 1, 10, 30, 0"
+    assert pfs.format_value(True) == "true"
+    assert pfs.format_value(3) == "3"
+    assert pfs.format_value(pathlib.PurePath("temp.dfs0")) == "|temp.dfs0|"
+    assert pfs.format_value("text") == "'text'"
+    assert pfs.format_value(None) == ""
+
+
+def test_point_sections(tmp_path, monkeypatch):
+    # sections spread over several chunks keep numbering on
+    monkeypatch.setattr(pfs, "CHUNKSIZE", 2)
+    pts = PointSet([10.5, 11.25, 12.0], [55.0, 55.125, -1.5], [7, 8, 9])
+
+    with open(write(tmp_path, pts), newline="") as f:
+        text = f.read()
+
+    assert "\r\n" in text and "\n" not in text.replace("\r\n", "")
+    lines = text.splitlines()
+    assert "      [Point_3]" in lines
+    i = lines.index("      [Point_3]")
+    assert lines[i + 1 : i + 5] == [
+        "         description = 9",
+        "         y = -1.5",
+        "         x = 12",
+        "      EndSect  // Point_3",
+    ]
+    assert "      number_of_points = 3" in lines
+    assert "   start_date = 2021, 6, 1, 10, 30, 0" in lines
+    assert "   timestep = 0.5" in lines
+    assert "      file_name = |temp.dfs0|" in lines
+    assert lines[-2:] == ["EndSect  // TidePredictor", ""]
+
+
+def test_readable_by_mikeio(tmp_path):
+    mikeio = pytest.importorskip("mikeio")
+    pts = PointSet([10.5, 11.25], [55.0, 55.125], [7, 8])
+
+    doc = mikeio.read_pfs(str(write(tmp_path, pts, timestep=0.25)))
+
+    section = doc.TidePredictor
+    assert section.timestep == 0.25
+    assert section.File_1.number_of_points == 2
+    assert section.File_1.Point_2.description == 8
+    assert section.File_1.Point_2.x == 11.25
+
+
+def test_tide_files_missing(tmp_path):
+    with pytest.raises(ValueError):
+        pfs.tide_files(tmp_path)
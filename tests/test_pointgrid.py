@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from rasterio.transform import from_origin
+from shapely.geometry import box
+
+from tidepods import constituents, pointgrid
+
+# global grid with nodes off the -180, -90 lattice, as the MIKE constituent file
+GLOBAL = {"x0": 0.0625, "y0": -89.9375, "dx": 0.125, "dy": 0.125}
+
+
+def test_grid_points_offset_within_bounds():
+    lon, lat = pointgrid.grid_points(box(10, 54, 10.5, 54.25), 0.125, offset=0.0625)
+
+    # as the original loop, the last point is inset by more than the offset
+    np.testing.assert_allclose(np.unique(lon), [10.0625, 10.1875, 10.3125])
+    np.testing.assert_allclose(np.unique(lat), [54.0625])
+
+
+def test_grid_points_empty():
+    with pytest.raises(ValueError):
+        pointgrid.grid_points(box(10, 54, 10.01, 54.01), 0.125, offset=0.0625)
+
+
+def test_lattice_points_are_grid_nodes(constituent_file):
+    grid = constituents.load_grid(constituent_file)
+    lon, lat = pointgrid.lattice_points(box(10.1, 54.1, 10.6, 54.5), grid)
+
+    nodes_x = grid["x0"] + grid["dx"] * np.arange(grid["data"].shape[1])
+    nodes_y = grid["y0"] + grid["dy"] * np.arange(grid["data"].shape[0])
+    assert len(lon) == 4 * 3
+    assert np.isin(lon, nodes_x).all() and np.isin(lat, nodes_y).all()
+
+
+def test_lattice_points_independent_of_aoi():
+    a = pointgrid.lattice_points(box(-3.3, 50.1, -2.1, 51.0), GLOBAL)
+    b = pointgrid.lattice_points(box(-2.9, 50.4, -1.7, 51.3), GLOBAL)
+
+    shared = set(zip(*a)) & set(zip(*b))
+    assert shared
+    assert all((x - 0.0625) % 0.125 == 0 for x, _ in shared)
+
+
+def test_cell_ids_round_trip():
+    lon = np.array([0.0625, -179.9375, 179.94, 10.2, -0.01])
+    lat = np.array([-89.9375, 0.0625, 45.0, 54.3, 0.0])
+
+    ids = pointgrid.cell_ids(GLOBAL, lon, lat)
+    x, y = pointgrid.cell_coordinates(GLOBAL, ids)
+
+    # every point maps to its nearest node, wrapped to the grid longitudes
+    assert np.all(np.abs((x - lon + 180) % 360 - 180) <= 0.0625)
+    assert np.all(np.abs(y - lat) <= 0.0625)
+    np.testing.assert_array_equal(pointgrid.cell_ids(GLOBAL, x, y), ids)
+    assert len(np.unique(ids)) == len(ids)
+
+
+def test_scatter_into_cells():
+    transform = from_origin(10.0, 54.5, 0.125, 0.125)
+    lon = np.array([10.0625, 10.3125, 11.0])
+    lat = np.array([54.4375, 54.1875, 54.4375])
+
+    image = pointgrid.scatter(lon, lat, [1.0, 2.0, 3.0], transform, (4, 4))
+
+    assert image[0, 0] == 1.0 and image[2, 2] == 2.0
+    assert np.isnan(image).sum() == 14
+
+
+def test_lattice_transform_centres_cells_on_nodes():
+    shp = box(-3.3, 50.1, -2.1, 51.0)
+    lon, lat = pointgrid.lattice_points(shp, GLOBAL)
+
+    transform, shape = pointgrid.lattice_transform(GLOBAL, shp.bounds)
+
+    left, top = transform.c, transform.f
+    right, bottom = left + shape[1] * transform.a, top + shape[0] * transform.e
+    assert left <= -3.3 and right >= -2.1 and bottom <= 50.1 and top >= 51.0
+    cols = (lon - left) / transform.a
+    rows = (lat - top) / transform.e
+    np.testing.assert_allclose(cols % 1, 0.5)
+    np.testing.assert_allclose(rows % 1, 0.5)
+
+    # every node gets a cell of its own
+    image = pointgrid.scatter(lon, lat, np.arange(len(lon)), transform, shape)
+    assert np.count_nonzero(~np.isnan(image)) == len(lon)
@@ -0,0 +1,150 @@
+import datetime
+import os
+import sys
+
+import numpy as np
+import pytest
+from test_make_pfs import PREDICTOR, install, posix
+
+from tidepods import cache, pfs, predict
+from tidepods.pointset import PointSet
+
+START = datetime.datetime(2021, 6, 1)
+END = datetime.datetime(2021, 6, 2)
+
+
+def test_time_range_inclusive():
+    times = predict.time_range(START, END, 0.5)
+
+    assert len(times) == 49
+    assert times[0] == np.datetime64(START) and times[-1] == np.datetime64(END)
+
+
+@pytest.mark.parametrize("interpolation", predict.INTERPOLATIONS)
+def test_interpolate_series_on_timestep(interpolation):
+    levels = np.arange(12, dtype=np.float32).reshape(2, 6)
+    date = START + datetime.timedelta(hours=1)
+
+    values = predict.interpolate_series(levels, START, 0.5, date, interpolation)
+
+    np.testing.assert_allclose(values, [2, 8])
+
+
+# squares of the timestep index, reproduced by the Catmull-Rom spline
+SQUARES = np.array([np.arange(6) ** 2, np.arange(6) ** 2 + 100], dtype=np.float32)
+
+
+@pytest.mark.parametrize(
+    "interpolation, expected",
+    [("previous", [1, 101]), ("linear", [2.5, 102.5]), ("cubic", [2.25, 102.25])],
+)
+def test_interpolate_series_between_timesteps(interpolation, expected):
+    date = START + datetime.timedelta(minutes=45)
+
+    values = predict.interpolate_series(SQUARES, START, 0.5, date, interpolation)
+
+    np.testing.assert_allclose(values, expected)
+
+
+@pytest.mark.parametrize(
+    "interpolation, expected",
+    [("previous", [1, 104]), ("linear", [2.5, 106.5]), ("cubic", [2.25, 106.25])],
+)
+def test_interpolate_series_per_point_dates(interpolation, expected):
+    # one instant per point, each read from its own row
+    dates = np.array(["2021-06-01T00:45", "2021-06-01T01:15"], dtype="datetime64[s]")
+
+    values = predict.interpolate_series(SQUARES, START, 0.5, dates, interpolation)
+
+    np.testing.assert_allclose(values, expected)
+
+
+def test_interpolate_series_outside():
+    with pytest.raises(ValueError):
+        predict.interpolate_series(np.zeros((1, 3)), START, 0.5, END)
+
+
+def test_group_periods_splits_on_gaps():
+    dates = np.array(
+        ["2021-06-01T10:00", "2021-06-01T10:05", "2021-06-03T00:00"],
+        dtype="datetime64[s]",
+    )
+    groups = predict.group_periods(dates, window=1, timestep=0.5)
+
+    assert [index.tolist() for index, _, _ in groups] == [[0, 1], [2]]
+    _, start, end = groups[0]
+    assert start <= datetime.datetime(2021, 6, 1, 9) and end >= datetime.datetime(
+        2021, 6, 1, 11, 5
+    )
+
+
+def test_cached_levels_reads_cache_once_per_location(constituent_file):
+    pts = PointSet([10.5, 10.75, 10.5], [54.5, 54.5, 54.5])
+    ntimes = len(predict.time_range(START, END, 1))
+    keys = cache.series_keys(
+        pts.lon, pts.lat, START, END, 1, cache.file_fingerprint(constituent_file)
+    )
+    stored = np.stack([np.full(ntimes, 1.0), np.full(ntimes, 2.0)])
+    cache.put_series(keys[:2], stored)
+
+    def write_pfs(*args):
+        raise AssertionError("cached series must not be predicted")
+
+    levels = predict.cached_levels(
+        pts, write_pfs, START, END, 1, constituent_file, None, None
+    )
+
+    np.testing.assert_array_equal(levels, stored[[0, 1, 0]])
+
+
+def write_series(path, start, periods, freq="30min"):
+    mikeio = pytest.importorskip("mikeio")
+    import pandas as pd
+
+    time = pd.date_range(start, periods=periods, freq=freq)
+    mikeio.DataArray(
+        np.zeros(periods, dtype=np.float32), time=time, item=mikeio.ItemInfo("Point_1")
+    ).to_dfs(str(path))
+    return str(path)
+
+
+def test_read_period(tmp_path):
+    end = START + datetime.timedelta(hours=2)
+    path = write_series(tmp_path / "temp.dfs0", START, 5)
+
+    assert predict.read_period(path, START, end, 0.5).shape == (1, 5)
+    with pytest.raises(ValueError, match="steps"):
+        predict.read_period(path, START + datetime.timedelta(hours=1), end, 0.5)
+    with pytest.raises(ValueError, match="steps"):
+        predict.read_period(path, START, end + datetime.timedelta(hours=1), 0.5)
+    with pytest.raises(ValueError, match="steps"):
+        predict.read_period(path, START, START + datetime.timedelta(hours=4), 1)
+
+
+@posix
+def test_cached_levels_checks_period(tmp_path, constituent_file):
+    pytest.importorskip("mikeio")
+    # the stand-in predictor always writes 5 half-hourly steps from START
+    mikepath = install(tmp_path / "mike", PREDICTOR.format(python=sys.executable))
+    pts = PointSet([10.5, 10.75], [54.5, 54.5], [1, 2])
+
+    def write_pfs(shard, workdir, start, end, timestep):
+        path = os.path.join(workdir, "temp.pfs")
+        pfs.write_tidepredictor_pfs(path, shard, "c.dfs2", "p.dat", start, end)
+
+    end = START + datetime.timedelta(hours=2)
+    levels = predict.cached_levels(
+        pts, write_pfs, START, end, 0.5, constituent_file, mikepath, str(tmp_path)
+    )
+    np.testing.assert_array_equal(levels[:, 0], [1, 2])
+
+    # nothing is cached from series of another period
+    late = START + datetime.timedelta(hours=1)
+    with pytest.raises(ValueError):
+        predict.cached_levels(
+            pts, write_pfs, late, end, 0.5, constituent_file, mikepath, str(tmp_path)
+        )
+    keys = cache.series_keys(
+        pts.lon, pts.lat, late, end, 0.5, cache.file_fingerprint(constituent_file)
+    )
+    assert not cache.get_series(keys, 3)[1].any()
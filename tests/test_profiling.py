@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from tidepods import profiling
+
+
+@pytest.fixture
+def report():
+    profiling.enable("test")
+    yield profiling.report
+    profiling.disable()
+
+
+@profiling.profiled(items=profiling.count_arg())
+def sleep(values, seconds=0.2):
+    time.sleep(seconds)
+    return values
+
+
+def stage(report, name):
+    return next(s for s in report()["stages"] if s["name"] == name)
+
+
+def test_disabled_records_nothing():
+    assert sleep([1, 2], 0) == [1, 2]
+    assert profiling.report() is None
+
+
+def test_calls_and_items(report):
+    sleep([1, 2], 0)
+    sleep([3], 0)
+
+    s = stage(report, "sleep")
+    assert s["calls"] == 2 and s["items"] == 3
+    assert s["wall_seconds"] == pytest.approx(s["seconds"])
+
+
+def test_concurrent_calls_count_once_in_wall_time(report):
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda _: sleep([], 0.3), range(4)))
+
+    s = stage(report, "sleep")
+    assert s["seconds"] >= 1.2
+    assert 0.3 <= s["wall_seconds"] < 0.6
+
+
+def test_rss_growth_of_stage(report):
+    @profiling.profiled()
+    def allocate():
+        return np.ones(64 * 2 ** 20, dtype=np.uint8).sum()
+
+    allocate()
+
+    s = stage(report, "allocate")
+    if s["process_peak_rss_mb"] is None:
+        pytest.skip("peak RSS not available")
+    assert s["peak_rss_growth_mb"] >= 0
+    assert s["process_peak_rss_mb"] >= s["peak_rss_growth_mb"]
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from tidepods import surface
+
+# node raster of 0.125 degree nodes, values a plane in the node indices
+NODE_TRANSFORM = from_origin(10.0, 55.0, 0.125, 0.125)
+ROWS, COLS = np.mgrid[0:6, 0:8]
+PLANE = 0.5 + 0.25 * ROWS - 0.125 * COLS
+
+
+def profile(transform, width, height, crs="EPSG:4326"):
+    return {"transform": transform, "width": width, "height": height, "crs": crs}
+
+
+def test_windows_cover_raster():
+    windows = list(surface.windows(10, 7, blocksize=4))
+
+    covered = np.zeros((10, 7), dtype=int)
+    for w in windows:
+        covered[w.row_off : w.row_off + w.height, w.col_off : w.col_off + w.width] += 1
+    assert (covered == 1).all() and len(windows) == 6
+
+
+def test_memory_blocksize():
+    assert surface.memory_blocksize(256) % 16 == 0
+    assert surface.memory_blocksize(256, bands=3) <= surface.memory_blocksize(256)
+    assert surface.memory_blocksize(0.001) == 16
+    assert surface.memory_blocksize(1e6) == 4096
+
+
+@pytest.mark.parametrize("method", ["linear", "cubic"])
+def test_interpolate_reproduces_plane(method):
+    # away from the edges, where the repeated edge nodes bend the plane
+    rows = np.array([[1.5, 2.25], [3.75, 3.0]])
+    cols = np.array([[1.5, 5.9], [1.2, 3.0]])
+
+    values = surface.interpolate(PLANE, rows, cols, method)
+
+    np.testing.assert_allclose(values, 0.5 + 0.25 * rows - 0.125 * cols)
+
+
+def test_interpolate_nearest_and_bands():
+    image = np.stack([PLANE, -PLANE])
+
+    values = surface.interpolate(
+        image, np.array([1.4, 2.6]), np.array([0.6, 7.9]), "nearest"
+    )
+
+    np.testing.assert_array_equal(values[0], PLANE[[1, 3], [1, 7]])
+    np.testing.assert_array_equal(values[1], -values[0])
+
+
+def test_interpolate_skips_missing_nodes():
+    image = PLANE.copy()
+    image[2, 3] = np.nan
+    image[4:, 6:] = np.nan
+
+    rows, cols = np.array([2.0, 2.5, 4.5]), np.array([3.5, 3.0, 6.5])
+
+    values = surface.interpolate(image, rows, cols)
+
+    # the missing node is left out, not spread to its neighbours
+    assert np.isfinite(values[:2]).all() and np.isnan(values[2])
+    np.testing.assert_allclose(values[0], PLANE[2, 4])
+
+
+def test_interpolate_invalid_method():
+    with pytest.raises(ValueError):
+        surface.interpolate(PLANE, np.zeros(1), np.zeros(1), "spline")
+
+
+def test_node_coordinates_on_node_grid():
+    window = rasterio.windows.Window(2, 1, 5, 4)
+
+    rows, cols = surface.node_coordinates(
+        NODE_TRANSFORM, NODE_TRANSFORM, "EPSG:4326", window, step=2
+    )
+
+    expected_rows, expected_cols = np.mgrid[1:5, 2:7]
+    np.testing.assert_allclose(rows, expected_rows)
+    np.testing.assert_allclose(cols, expected_cols)
+
+
+@pytest.mark.parametrize("cog", [False, True])
+def test_write_surface(tmp_path, cog):
+    src_profile = profile(NODE_TRANSFORM, 8, 6)
+    # UTM grid inside the nodes, at 100 m
+    transform = from_origin(580000, 6070000, 100, 100)
+    dst_profile = profile(transform, 70, 40, "EPSG:32632")
+    outfile = str(tmp_path / "surface.tif")
+
+    surface.write_surface(
+        outfile,
+        np.stack([PLANE, 2 * PLANE]),
+        src_profile,
+        dst_profile,
+        method="linear",
+        memory=1,
+        cog=cog,
+        descriptions=["LAT", "HAT"],
+    )
+
+    with rasterio.open(outfile) as src:
+        data = src.read()
+        assert src.descriptions == ("LAT", "HAT")
+        assert src.crs.to_epsg() == 32632 and np.isnan(src.nodata)
+        layout = src.tags(ns="IMAGE_STRUCTURE").get("LAYOUT")
+        assert layout == ("COG" if cog else None)
+    assert data.shape == (2, 40, 70)
+    assert np.isfinite(data).all()
+    np.testing.assert_allclose(data[1], 2 * data[0], rtol=1e-6)
+    window = rasterio.windows.Window(0, 0, 70, 40)
+    rows, cols = surface.node_coordinates(
+        NODE_TRANSFORM, transform, "EPSG:32632", window
+    )
+    # up to the control mesh of each window
+    np.testing.assert_allclose(data[0], 0.5 + 0.25 * rows - 0.125 * cols, atol=1e-4)
+    assert list(tmp_path.iterdir()) == [tmp_path / "surface.tif"]
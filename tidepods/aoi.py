@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Outlines of target grids, computed from their profile only.
+
+The bounds follow from the transform and size of the grid, and the outline
+is reprojected along densified edges, so no raster is allocated or opened.
+"""
+import numpy as np
+import rasterio.crs
+import rasterio.transform
+import rasterio.warp
+from shapely.geometry import Polygon, box
+
+# points inserted along each edge before reprojecting
+DENSIFY_PTS = 21
+
+
+def profile_bounds(profile):
+    """
+    Bounds of the grid of a rasterio profile.
+
+    Parameters
+    ----------
+    profile : dictionary
+        Rasterio profile with transform, width and height.
+
+    Returns
+    -------
+    left, bottom, right, top : float
+
+    """
+    return rasterio.transform.array_bounds(
+        int(profile["height"]), int(profile["width"]), profile["transform"]
+    )
+
+
+def densified_ring(left, bottom, right, top, densify_pts=DENSIFY_PTS):
+    """
+    Closed ring around bounds with points inserted along each edge.
+
+    Parameters
+    ----------
+    left, bottom, right, top : float
+        Bounds.
+    densify_pts : int, optional
+        Points inserted along each edge. The default is DENSIFY_PTS.
+
+    Returns
+    -------
+    xs, ys : Array
+        Ring coordinates, counter-clockwise from the lower left corner.
+
+    """
+    t = np.linspace(0, 1, densify_pts + 2)[:-1]
+    dx, dy = (right - left) * t, (top - bottom) * t
+    xs = np.r_[left + dx, np.full(len(t), right), right - dx, np.full(len(t), left), left]
+    ys = np.r_[np.full(len(t), bottom), bottom + dy, np.full(len(t), top), top - dy, bottom]
+
+    return xs, ys
+
+
+def outline(profile, target_epsg=4326, buffer=None, densify_pts=DENSIFY_PTS):
+    """
+    Outline of the grid of a rasterio profile, reprojected and buffered.
+
+    Parameters
+    ----------
+    profile : dictionary
+        Rasterio profile with crs, transform, width and height.
+    target_epsg : int, optional
+        The target EPSG code. None keeps the CRS of the grid. The default is
+        4326.
+    buffer : float, optional
+        Buffer added to the outline, in units of the target CRS. The default
+        is None.
+    densify_pts : int, optional
+        Points inserted along each edge before reprojecting. The default is
+        DENSIFY_PTS.
+
+    Returns
+    -------
+    shp : shapely Polygon
+        The grid footprint.
+
+    """
+    left, bottom, right, top = profile_bounds(profile)
+
+    if target_epsg is None:
+        shp = box(left, bottom, right, top)
+    else:
+        xs, ys = densified_ring(left, bottom, right, top, densify_pts)
+        xs, ys = rasterio.warp.transform(
+            profile["crs"], rasterio.crs.CRS.from_epsg(target_epsg), xs, ys
+        )
+        shp = Polygon(zip(xs, ys))
+
+    if buffer:
+        shp = shp.buffer(buffer, join_style=2)
+
+    return shp
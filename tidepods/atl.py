@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Read ICESat-2 ATL03 and ATL08 granules.
+
+The photon (ATL03) or land segment (ATL08) coordinates, times and heights are
+read straight from the HDF5 granule in chunks, so the icesat2 command needs
+no intermediate shapefile and memory stays bounded for full granules.
+"""
+import numpy as np
+
+SUFFIXES = [".h5", ".hdf5"]
+
+BEAMS = ["gt1l", "gt1r", "gt2l", "gt2r", "gt3l", "gt3r"]
+
+# datasets of each product, relative to /<beam>/<group>
+PRODUCTS = {
+    "ATL03": {
+        "group": "heights",
+        "lon": "lon_ph",
+        "lat": "lat_ph",
+        "time": "delta_time",
+        "height": "h_ph",
+    },
+    "ATL08": {
+        "group": "land_segments",
+        "lon": "longitude",
+        "lat": "latitude",
+        "time": "delta_time",
+        "height": "terrain/h_te_best_fit",
+    },
+}
+
+# delta_time is in GPS seconds since atlas_sdp_gps_epoch, GPS runs ahead of
+# UTC by the leap seconds since 1980, 18 since 2017-01-01
+GPS_EPOCH = np.datetime64("1980-01-06T00:00:00", "ns")
+GPS_UTC_LEAP_SECONDS = 18
+
+# number of photons or segments read at once
+CHUNKSIZE = 1000000
+
+
+def product_name(h5):
+    """
+    Product of an open granule, ATL03 or ATL08.
+
+    Parameters
+    ----------
+    h5 : h5py File
+        Open granule.
+
+    Returns
+    -------
+    product : str
+
+    Raises
+    ------
+    ValueError
+        If the granule is not an ATL03 or ATL08 granule.
+
+    """
+    name = h5.attrs.get("short_name", b"")
+    if isinstance(name, bytes):
+        name = name.decode()
+    if name not in PRODUCTS:
+        # older granules lack the attribute, fall back to the file name
+        stem = h5.filename.replace("\\", "/").rsplit("/", 1)[-1]
+        name = next((p for p in PRODUCTS if stem.upper().startswith(p)), name)
+    if name not in PRODUCTS:
+        raise ValueError(f"{h5.filename} is not an ATL03 or ATL08 granule.")
+
+    return name
+
+
+def to_datetime64(h5, delta_time):
+    """
+    UTC times of ATLAS delta_time values.
+
+    Parameters
+    ----------
+    h5 : h5py File
+        Open granule.
+    delta_time : Array
+        Seconds since the ATLAS SDP epoch.
+
+    Returns
+    -------
+    times : Array
+        datetime64[ns] times.
+
+    """
+    epoch = float(np.ravel(h5["ancillary_data/atlas_sdp_gps_epoch"][()])[0])
+    seconds = np.asarray(delta_time, dtype=np.float64) + epoch - GPS_UTC_LEAP_SECONDS
+
+    return GPS_EPOCH + np.rint(seconds * 1e9).astype("timedelta64[ns]")
+
+
+def _read(group, name, start, stop):
+    """Rows start:stop of a dataset, fill values of float data set to NaN."""
+    dataset = group[name]
+    values = dataset[start:stop]
+    fill = dataset.attrs.get("_FillValue")
+    if fill is not None and values.dtype.kind == "f":
+        values[values == fill] = np.nan
+
+    return values
+
+
+def _columns(group, name, start, stop):
+    """Columns of a 1-D or 2-D dataset, one per value of its second axis."""
+    values = _read(group, name, start, stop)
+    column = name.replace("/", "_")
+    if values.ndim == 1:
+        return {column: values}
+
+    return {f"{column}_{i}": values[:, i] for i in range(values.shape[1])}
+
+
+def read_granule(path, beams=None, variables=None, chunksize=CHUNKSIZE):
+    """
+    Read the coordinates, times and heights of an ATL03 or ATL08 granule.
+
+    Parameters
+    ----------
+    path : str
+        Path to the HDF5 granule.
+    beams : list, optional
+        Beams to read, e.g. ["gt1l", "gt2l"]. The default is None, all beams
+        present in the granule.
+    variables : list, optional
+        Further datasets to read along, relative to the beam's heights
+        (ATL03) or land_segments (ATL08) group, e.g. ["signal_conf_ph"] or
+        ["canopy/h_canopy"]. 2-D datasets give one column per value of their
+        second axis. The default is None.
+    chunksize : int, optional
+        Maximum number of photons or segments per chunk. The default is
+        CHUNKSIZE.
+
+    Yields
+    ------
+    columns : dictionary
+        Arrays of one chunk of a beam: beam, lon, lat, time (datetime64[ns]),
+        height and the requested variables.
+
+    Raises
+    ------
+    ValueError
+        If the granule is not an ATL03 or ATL08 granule.
+    ValueError
+        If a requested beam is not in the granule.
+
+    """
+    import h5py
+
+    with h5py.File(path, "r") as h5:
+        product = PRODUCTS[product_name(h5)]
+        present = [b for b in BEAMS if f"{b}/{product['group']}" in h5]
+        beams = beams or present
+        missing = [b for b in beams if b not in present]
+        if missing:
+            raise ValueError(f"Beams {missing} not found in {path}.")
+
+        for beam in beams:
+            group = h5[f"{beam}/{product['group']}"]
+            npoints = len(group[product["time"]])
+            for start in range(0, npoints, chunksize):
+                stop = min(start + chunksize, npoints)
+                columns = {
+                    "beam": np.full(stop - start, beam),
+                    "lon": group[product["lon"]][start:stop].astype(np.float64),
+                    "lat": group[product["lat"]][start:stop].astype(np.float64),
+                    "time": to_datetime64(h5, group[product["time"]][start:stop]),
+                    "height": _read(group, product["height"], start, stop),
+                }
+                for name in variables or []:
+                    columns.update(_columns(group, name, start, stop))
+                yield columns
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Location and keys of the tidepods on-disk caches, and the cache of predicted
+tide series.
+"""
+import hashlib
+import os
+import pathlib
+import sqlite3
+import time
+
+import numpy as np
+
+from tidepods import profiling
+
+CACHE_ENV = "TIDEPODS_CACHE"
+# size limit of the cached tide series in MB, least recently used go first
+SERIES_LIMIT_ENV = "TIDEPODS_SERIES_CACHE_MB"
+SERIES_LIMIT_MB = 2048
+
+
+def cache_dir(subdir=None):
+    """
+    Get (and create) the tidepods cache directory.
+
+    Parameters
+    ----------
+    subdir : str, optional
+        Sub directory within the cache directory.
+
+    Returns
+    -------
+    path : pathlib Path
+        The TIDEPODS_CACHE environment variable, or ~/.tidepods by default.
+
+    """
+    path = pathlib.Path(os.environ.get(CACHE_ENV, pathlib.Path.home() / ".tidepods"))
+    if subdir:
+        path = path / subdir
+    path.mkdir(parents=True, exist_ok=True)
+
+    return path
+
+
+def file_fingerprint(path, blocksize=2 ** 20):
+    """
+    Cheap content fingerprint of a (large) file.
+
+    The file size together with its first and last blocks are hashed, so the
+    fingerprint changes when the file is replaced without reading all of it.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Path to the file.
+    blocksize : int, optional
+        Number of bytes hashed at each end. The default is 1 MiB.
+
+    Returns
+    -------
+    fingerprint : str
+        Hex digest.
+
+    """
+    size = os.path.getsize(path)
+    h = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        h.update(f.read(blocksize))
+        if size > blocksize:
+            f.seek(max(size - blocksize, blocksize))
+            h.update(f.read(blocksize))
+
+    return h.hexdigest()[:16]
+
+
+def series_keys(lon, lat, start, end, timestep, fingerprint):
+    """
+    Content address of the predicted tide series of each point.
+
+    Parameters
+    ----------
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+    start, end : datetime
+        First and last time of the series.
+    timestep : float
+        Timestep in hours.
+    fingerprint : str
+        Fingerprint of the constituent file, see file_fingerprint().
+
+    Returns
+    -------
+    keys : list
+        One hex digest per point.
+
+    """
+    period = f"{start:%Y-%m-%dT%H:%M:%S}/{end:%Y-%m-%dT%H:%M:%S}/{float(timestep)!r}"
+    return [
+        hashlib.sha1(f"{x:.6f},{y:.6f}/{period}/{fingerprint}".encode()).hexdigest()
+        for x, y in zip(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    ]
+
+
+def open_series_cache():
+    """
+    Open (and create) the cache of predicted tide series.
+
+    Returns
+    -------
+    con : sqlite3 Connection
+        Connection to the cache in the "series" cache directory.
+
+    """
+    con = sqlite3.connect(str(cache_dir("series") / "series.sqlite"), timeout=60)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS series "
+        "(key TEXT PRIMARY KEY, levels BLOB, used REAL DEFAULT 0)"
+    )
+    # caches written before the size limit have no access times
+    if "used" not in [row[1] for row in con.execute("PRAGMA table_info(series)")]:
+        with con:
+            con.execute("ALTER TABLE series ADD COLUMN used REAL DEFAULT 0")
+    con.execute("CREATE INDEX IF NOT EXISTS series_used ON series (used)")
+
+    return con
+
+
+def series_limit():
+    """
+    Size limit of the cache of predicted tide series.
+
+    Returns
+    -------
+    limit : int
+        Bytes, from the TIDEPODS_SERIES_CACHE_MB environment variable or
+        SERIES_LIMIT_MB by default.
+
+    """
+    return int(float(os.environ.get(SERIES_LIMIT_ENV, SERIES_LIMIT_MB)) * 2 ** 20)
+
+
+def prune_series(con, limit=None):
+    """
+    Delete the least recently used tide series above the cache size limit.
+
+    Parameters
+    ----------
+    con : sqlite3 Connection
+        Connection from open_series_cache().
+    limit : int, optional
+        Bytes of series kept. The default is None, series_limit().
+
+    Returns
+    -------
+    deleted : int
+        Number of series deleted.
+
+    """
+    limit = series_limit() if limit is None else limit
+    with con:
+        cursor = con.execute(
+            "DELETE FROM series WHERE key IN (SELECT key FROM (SELECT key, "
+            "SUM(LENGTH(levels)) OVER (ORDER BY used DESC, key) AS total "
+            "FROM series) WHERE total > ?)",
+            (limit,),
+        )
+
+    return cursor.rowcount
+
+
+@profiling.profiled(items=profiling.count_arg())
+def get_series(keys, ntimes):
+    """
+    Look up predicted tide series.
+
+    Parameters
+    ----------
+    keys : list
+        Series keys as returned by series_keys().
+    ntimes : int
+        Number of timesteps of the series.
+
+    Returns
+    -------
+    levels : Array
+        Tide levels, shape (points, times). NaN for points not in the cache.
+    found : Array
+        Boolean mask of the points found in the cache.
+
+    """
+    levels = np.full((len(keys), ntimes), np.nan, dtype=np.float32)
+    found = np.zeros(len(keys), dtype=bool)
+    index = {}
+    for i, key in enumerate(keys):
+        index.setdefault(key, []).append(i)
+
+    con = open_series_cache()
+    try:
+        unique = list(index)
+        # stay below the SQLite host parameter limit
+        for i in range(0, len(unique), 900):
+            chunk = unique[i : i + 900]
+            rows = con.execute(
+                "SELECT key, levels FROM series WHERE key IN "
+                f"({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for key, blob in rows:
+                values = np.frombuffer(blob, dtype=np.float32)
+                if len(values) == ntimes:
+                    levels[index[key]] = values
+                    found[index[key]] = True
+        hits = [key for key in unique if found[index[key][0]]]
+        with con:
+            now = time.time()
+            con.executemany(
+                "UPDATE series SET used = ? WHERE key = ?", ((now, key) for key in hits)
+            )
+    finally:
+        con.close()
+
+    return levels, found
+
+
+@profiling.profiled(items=profiling.count_arg())
+def put_series(keys, levels):
+    """
+    Store predicted tide series.
+
+    The least recently used series are deleted when the cache grows above
+    series_limit().
+
+    Parameters
+    ----------
+    keys : list
+        Series keys as returned by series_keys().
+    levels : Array
+        Tide levels, shape (points, times).
+
+    """
+    levels = np.asarray(levels, dtype=np.float32)
+    con = open_series_cache()
+    try:
+        now = time.time()
+        with con:
+            con.executemany(
+                "INSERT OR REPLACE INTO series VALUES (?, ?, ?)",
+                ((key, row.tobytes(), now) for key, row in zip(keys, levels)),
+            )
+        prune_series(con)
+    finally:
+        con.close()
@@ -2,9 +2,105 @@ import click
 from datetime import datetime as dt
 
 @click.group()
-def cli():
+@click.option(
+    "--profile",
+    type=click.Path(dir_okay=False, file_okay=True),
+    help="Write a JSON report with the wall time, peak memory and item counts of "
+    "each processing stage of the command to this file",
+)
+@click.pass_context
+def cli(ctx, profile):
     """Tidal Surface Processing Tasks."""
-    pass
+    if profile:
+        from tidepods import profiling
+
+        profiling.enable(ctx.invoked_subcommand)
+        ctx.call_on_close(lambda: profiling.write_report(profile))
+
+
+backend_option = click.option(
+    "-b",
+    "--backend",
+    type=click.Choice(["mike", "native"]),
+    default="mike",
+    show_default=True,
+    help="Tide prediction backend, MIKE TidePredictor.exe (mike) "
+    "or the NumPy harmonic predictor (native)",
+)
+constituents_option = click.option(
+    "-c",
+    "--constituents",
+    type=click.Path(dir_okay=False, file_okay=True, exists=True),
+    help="Path to global_tide_constituents_height_0.125deg.dfs2 (or its converted "
+    "grid .json index) for the native backend and the tidal datums. Searched for "
+    "in the MIKE directory if not given",
+)
+window_option = click.option(
+    "-w",
+    "--window",
+    type=click.FloatRange(min=0, min_open=True),
+    help="Only predict this many hours before and after the acquisition instead of "
+    "the full year",
+)
+workers_option = click.option(
+    "-j",
+    "--workers",
+    type=click.IntRange(min=1),
+    help="Maximum number of TidePredictor.exe runs in parallel, each on a shard of "
+    "the points. Defaults to the number of CPUs",
+)
+timestep_option = click.option(
+    "--timestep",
+    type=click.FloatRange(min=0, min_open=True),
+    default=0.5,
+    show_default=True,
+    help="Timestep in hours of the series predicted by TidePredictor.exe",
+)
+interpolation_option = click.option(
+    "--interpolation",
+    type=click.Choice(["previous", "linear", "cubic"]),
+    default="linear",
+    show_default=True,
+    help="Interpolation of the predicted series to the acquisition time. With "
+    "cubic, coarser timesteps keep their accuracy",
+)
+resampling_option = click.option(
+    "--resampling",
+    type=click.Choice(["nearest", "linear", "cubic"]),
+    default="cubic",
+    show_default=True,
+    help="Interpolation of the tide surface between the 0.125 deg nodes onto the "
+    "output grid",
+)
+memory_option = click.option(
+    "--memory",
+    type=click.FloatRange(min=1),
+    default=256,
+    show_default=True,
+    help="Approximate memory budget in MiB of the tide surface raster, which is "
+    "computed and written in tiles that fit it",
+)
+cog_option = click.option(
+    "--cog/--no-cog",
+    default=False,
+    show_default=True,
+    help="Write the tide surface raster as a cloud-optimized GeoTIFF with "
+    "overviews, compressed with deflate unless --compress is given",
+)
+compress_option = click.option(
+    "--compress",
+    type=click.Choice(["deflate", "zstd"]),
+    default=None,
+    help="Compression of the tide surface raster, with the floating point "
+    "predictor. Uncompressed by default, deflate with --cog",
+)
+snap_option = click.option(
+    "--snap/--no-snap",
+    default=False,
+    show_default=True,
+    help="Snap the points to the nodes of the constituent grid with stable cell ids, "
+    "so overlapping scenes share predicted (cached) series",
+)
 
 
 @cli.command()
@@ -37,6 +133,17 @@ def cli():
     type=click.Path(dir_okay=False, file_okay=True),
     help="Path to land mask shapefile. e.g. C:/land_mask.shp",
 )
+@backend_option
+@constituents_option
+@window_option
+@timestep_option
+@interpolation_option
+@resampling_option
+@memory_option
+@cog_option
+@compress_option
+@snap_option
+@workers_option
 def s2(**kwargs):
     """Create a tidal surface for a Sentinel 2 acquisition.
 
@@ -57,7 +164,9 @@ def s2(**kwargs):
     "--shapefile",
     type=click.Path(dir_okay=False, file_okay=True),
     required=True,
-    help="Path to input shapefile " "e.g. C:/tides/processed_icesat_pts.shp",
+    help="Path to input shapefile e.g. C:/tides/processed_icesat_pts.shp, to a "
+    "GeoParquet (.parquet) or Arrow IPC (.arrow, .feather) table of points, or to "
+    "an ATL03/ATL08 HDF5 granule",
 )
 @click.option(
     "-o",
@@ -65,7 +174,7 @@ def s2(**kwargs):
     type=click.Path(dir_okay=True, file_okay=False),
     required=True,
     help="Path to output folder where tidepods will create the updated shapefile "
-    "e.g. C:/tides",
+    "(or table) e.g. C:/tides",
 )
 @click.option(
     "-l",
@@ -75,6 +184,57 @@ def s2(**kwargs):
     help="Tide value return type, LAT (Lowest Astronomical Tide) "
     "or MSL (Mean Sea Level)",
 )
+@backend_option
+@constituents_option
+@window_option
+@timestep_option
+@interpolation_option
+@workers_option
+@click.option(
+    "--chunksize",
+    type=click.IntRange(min=1),
+    help="Read, predict and write the points in chunks of this many features, so "
+    "memory stays bounded for very large files",
+)
+@click.option(
+    "--dedupe/--no-dedupe",
+    default=False,
+    show_default=True,
+    help="Predict once per constituent grid cell and acquisition time, at the "
+    "cell node, and copy the values to all points of the cell. Much faster on "
+    "dense tracks",
+)
+@click.option(
+    "--dedupe-seconds",
+    type=click.FloatRange(min=0, min_open=True),
+    default=60,
+    show_default=True,
+    help="Time bin of --dedupe, the points of a cell are predicted once per bin at "
+    "its start",
+)
+@click.option(
+    "--beam",
+    "beams",
+    type=click.Choice(["gt1l", "gt1r", "gt2l", "gt2r", "gt3l", "gt3r"]),
+    multiple=True,
+    help="Beam of an HDF5 granule to read, can be repeated. Defaults to all beams",
+)
+@click.option(
+    "--variable",
+    "variables",
+    multiple=True,
+    help="Further dataset of an HDF5 granule to write along, relative to the "
+    "heights (ATL03) or land_segments (ATL08) group e.g. signal_conf_ph, can be "
+    "repeated",
+)
+@click.option(
+    "-f",
+    "--format",
+    "output_format",
+    type=click.Choice(["shp", "parquet", "arrow"]),
+    help="Output format, shapefile, GeoParquet or Arrow IPC. Defaults to the input "
+    "format, and to parquet for HDF5 granules",
+)
 def icesat2(**kwargs):
     """Extract tide levels at icesat_2 acquisition points.
 
@@ -164,6 +324,23 @@ DATEIN = DateType()
     
 )
 
+@backend_option
+@constituents_option
+@window_option
+@timestep_option
+@interpolation_option
+@resampling_option
+@memory_option
+@cog_option
+@compress_option
+@snap_option
+@workers_option
+@click.option(
+    "--points-format",
+    type=click.Choice(["parquet", "arrow"]),
+    help="Also write the points and their tide values as a GeoParquet or Arrow IPC "
+    "table next to the raster",
+)
 def vhr(**kwargs):
     """Create a point shp containing tide values over AOI (VHR image).
     
@@ -196,6 +373,33 @@ DATEIN = DateType()
               help='Tide value return type, LAT (Lowest Astronomical Tide) '
               'or MSL (Mean Sea Level)')
 
+@backend_option
+@constituents_option
+@window_option
+@timestep_option
+@interpolation_option
+@snap_option
+@workers_option
+@click.option(
+    "-f",
+    "--format",
+    "output_format",
+    type=click.Choice(["shp", "parquet", "arrow"]),
+    default="shp",
+    show_default=True,
+    help="Output format of the points, shapefile, GeoParquet or Arrow IPC",
+)
+@click.option(
+    "--raster/--no-raster",
+    default=False,
+    show_default=True,
+    help="Also write the tide surface interpolated onto the image grid as a "
+    "GeoTIFF",
+)
+@resampling_option
+@memory_option
+@cog_option
+@compress_option
 def points(**kwargs):
     """Create a point shapefile containing tide values over an AOI
 
@@ -227,10 +431,18 @@ def points(**kwargs):
               'e.g. C:/tides')
               
 
+@backend_option
+@constituents_option
+@resampling_option
+@memory_option
+@cog_option
+@compress_option
+@snap_option
+@workers_option
 def timeseries(**kwargs):
     """Create a tide timeseries csv file over an AOI, 
     shapefile containing MSL, HAT and LAT tide values and
-    rasters containg MSL, HAT and LAT tide values.
+    a raster containg MSL, LAT and HAT tide values as three bands.
 
     Example use:
     tidepods timeseries -i A:/ANSU/6_Tasks/_SDB_Tidepods/tidepods-ansu_TestFile/timeseries/AOI.tif  
@@ -251,7 +463,8 @@ def timeseries(**kwargs):
     "--shapefile",
     type=click.Path(dir_okay=False, file_okay=True),
     required=True,
-    help="Path to input shapefile " "e.g. C:/tides/processed_icesat_pts.shp",
+    help="Path to input shapefile e.g. C:/tides/processed_icesat_pts.shp, or to a "
+    "GeoParquet (.parquet) or Arrow IPC (.arrow, .feather) table of points",
 )
 @click.option(
     "-o",
@@ -268,6 +481,18 @@ def timeseries(**kwargs):
 @click.option('-t', '--timestamp', type=TIMEIN, required=True,
               help='Image acquisition time (HH:MM) e.g. 10:30')
 
+@backend_option
+@constituents_option
+@workers_option
+@click.option(
+    "-f",
+    "--format",
+    "output_format",
+    type=click.Choice(["csv", "parquet", "arrow"]),
+    default="csv",
+    show_default=True,
+    help="Output format of the series, csv, Parquet or Arrow IPC",
+)
 def timeseries_shp(**kwargs):
     """Extract tide timeseries of tide levels (MSL, HAT, LAT) at point or points (shp).
 
@@ -279,4 +504,39 @@ def timeseries_shp(**kwargs):
     """
     from tidepods import timeseries_shp
 
-    timeseries_shp.main(**kwargs)
\ No newline at end of file
+    timeseries_shp.main(**kwargs)
+
+
+@cli.command()
+@click.option(
+    "-c",
+    "--constituents",
+    type=click.Path(dir_okay=False, file_okay=True, exists=True),
+    help="Path to global_tide_constituents_height_0.125deg.dfs2. "
+    "Searched for in the MIKE directory if not given",
+)
+@click.option(
+    "-o",
+    "--outfolder",
+    type=click.Path(dir_okay=True, file_okay=False),
+    help="Output folder for the converted grid. Defaults to the tidepods cache "
+    "directory (TIDEPODS_CACHE or ~/.tidepods)",
+)
+def constituents(**kwargs):
+    """Convert the tide constituent dfs2 into a memory-mapped grid.
+
+    This is done automatically on the first native prediction, the command
+    allows preparing the grid once, e.g. before copying it to worker nodes.
+
+    Example use:
+
+    tidepods constituents -c C:/global_tide_constituents_height_0.125deg.dfs2
+    """
+    import os
+    import pathlib
+    from tidepods.constituents import convert_dfs2, find_constituents
+
+    mikepath = os.environ.get("MIKE")
+    path = find_constituents(mikepath and pathlib.Path(mikepath), kwargs["constituents"])
+    index_path = convert_dfs2(path, kwargs["outfolder"])
+    print("The grid index is located:", index_path)
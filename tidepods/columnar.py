@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar (GeoParquet and Arrow IPC) input and output of point products.
+
+Columns are read and written in bulk from arrays with pyarrow, which is
+imported on first use only. Point geometries are stored as WKB in a
+"geometry" column, built from and decoded into the lon/lat arrays without
+touching single points, and described by GeoParquet "geo" metadata.
+"""
+import contextlib
+import json
+
+import numpy as np
+
+from tidepods import profiling
+
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+# format -> suffix of the files written
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+GEOMETRY = "geometry"
+
+# little endian WKB of a 2D point: byte order, geometry type, x, y
+WKB_POINT = np.dtype([("order", "u1"), ("type", "<u4"), ("x", "<f8"), ("y", "<f8")])
+
+# GeoParquet 1.0 metadata, without crs the coordinates are OGC:CRS84 (lon/lat)
+GEO_METADATA = {
+    "version": "1.0.0",
+    "primary_column": GEOMETRY,
+    "columns": {GEOMETRY: {"encoding": "WKB", "geometry_types": ["Point"]}},
+}
+
+
+def table_format(path):
+    """
+    Columnar format of an output path, from its suffix.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Output file, ending in .parquet, .arrow or .feather.
+
+    Returns
+    -------
+    format : str
+        "parquet" or "arrow".
+
+    Raises
+    ------
+    ValueError
+        If the suffix is not a columnar format.
+
+    """
+    suffix = "." + str(path).rsplit(".", 1)[-1].lower()
+    if suffix not in FORMATS:
+        raise ValueError(f"Columnar output should be one of {list(FORMATS)}, not {path}.")
+
+    return FORMATS[suffix]
+
+
+def point_wkb(lon, lat):
+    """
+    WKB geometries of points.
+
+    Parameters
+    ----------
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+
+    Returns
+    -------
+    wkb : pyarrow Array
+        Binary array of 21 byte WKB points, sharing one buffer.
+
+    """
+    import pyarrow as pa
+
+    records = np.empty(len(lon), dtype=WKB_POINT)
+    records["order"] = 1
+    records["type"] = 1
+    records["x"] = lon
+    records["y"] = lat
+
+    # 64 bit offsets once the buffer no longer fits 32 bit ones
+    size = records.nbytes
+    binary, offset_type = (
+        (pa.binary(), np.int32) if size < 2 ** 31 else (pa.large_binary(), np.int64)
+    )
+    offsets = np.arange(0, size + 1, WKB_POINT.itemsize, dtype=offset_type)
+
+    return pa.Array.from_buffers(
+        binary, len(records), [None, pa.py_buffer(offsets), pa.py_buffer(records)]
+    )
+
+
+def point_coordinates(wkb):
+    """
+    Coordinates of WKB points, the inverse of point_wkb().
+
+    Parameters
+    ----------
+    wkb : pyarrow Array or ChunkedArray
+        Binary array of 2D WKB points.
+
+    Returns
+    -------
+    lon, lat : Array
+        Point coordinates.
+
+    Raises
+    ------
+    ValueError
+        If the geometries are not little endian 2D WKB points.
+
+    """
+    import pyarrow as pa
+
+    if isinstance(wkb, pa.ChunkedArray):
+        wkb = wkb.combine_chunks()
+    if wkb.null_count:
+        raise ValueError("Point geometries can not be missing.")
+
+    offset_type = np.int64 if pa.types.is_large_binary(wkb.type) else np.int32
+    _, offsets, data = wkb.buffers()
+    offsets = np.frombuffer(offsets, dtype=offset_type)[
+        wkb.offset : wkb.offset + len(wkb) + 1
+    ]
+    if (np.diff(offsets) != WKB_POINT.itemsize).any():
+        raise ValueError("Only 2D point geometries are supported.")
+
+    records = np.frombuffer(
+        data, dtype=WKB_POINT, count=len(wkb), offset=int(offsets[0]) if len(wkb) else 0
+    )
+    if (records["order"] != 1).any() or (records["type"] != 1).any():
+        raise ValueError("Only little endian 2D WKB point geometries are supported.")
+
+    return records["x"].copy(), records["y"].copy()
+
+
+def _table(columns, geometry=False):
+    """pyarrow Table of a dictionary of arrays, with point geometries if asked."""
+    import pyarrow as pa
+
+    if not geometry:
+        return pa.table(columns)
+
+    table = pa.table(
+        dict(columns, **{GEOMETRY: point_wkb(columns["lon"], columns["lat"])})
+    )
+    return table.replace_schema_metadata({"geo": json.dumps(GEO_METADATA)})
+
+
+@contextlib.contextmanager
+def table_writer(path, geometry=False):
+    """
+    Write a table chunk by chunk.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Output .parquet, .arrow or .feather file.
+    geometry : bool, optional
+        Add a WKB point geometry column built from the lon and lat columns,
+        and GeoParquet metadata. The default is False.
+
+    Yields
+    ------
+    write : callable
+        write(columns) appends a dictionary of equal length arrays. The
+        schema is taken from the first chunk.
+
+    """
+    import pyarrow as pa
+
+    fmt = table_format(path)
+    writer = schema = None
+
+    def write(columns):
+        nonlocal writer, schema
+        table = _table(columns, geometry)
+        if writer is None:
+            schema = table.schema
+            if fmt == "parquet":
+                import pyarrow.parquet as pq
+
+                writer = pq.ParquetWriter(str(path), schema)
+            else:
+                writer = pa.ipc.new_file(str(path), schema)
+        writer.write_table(table.cast(schema))
+
+    try:
+        yield write
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+@profiling.profiled(items=lambda result, *args, **kwargs: len(args[1]))
+def write_points(path, lon, lat, columns):
+    """
+    Write points and their attributes as a GeoParquet or Arrow IPC file.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Output .parquet, .arrow or .feather file.
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+    columns : dictionary
+        Attribute arrays, one value per point.
+
+    """
+    with table_writer(path, geometry=True) as write:
+        write(dict(columns, lon=lon, lat=lat))
+
+
+def _columns(table):
+    """NumPy arrays of the columns of a table or record batch."""
+    columns = {
+        name: table.column(name).to_numpy(zero_copy_only=False)
+        for name in table.schema.names
+        if name != GEOMETRY
+    }
+    if GEOMETRY in table.schema.names and not {"lon", "lat"} <= set(columns):
+        columns["lon"], columns["lat"] = point_coordinates(table.column(GEOMETRY))
+
+    return columns
+
+
+def read_table_chunks(path, chunksize=None):
+    """
+    Read a GeoParquet or Arrow IPC table in chunks.
+
+    Arrow IPC files are memory-mapped, so chunks are views of the file.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Input .parquet, .arrow or .feather file.
+    chunksize : int, optional
+        Maximum number of rows per chunk. The default is None, the whole
+        table in one chunk.
+
+    Yields
+    ------
+    columns : dictionary
+        NumPy arrays of the columns of a chunk. Point geometries are decoded
+        into lon and lat columns unless the table has these already.
+
+    """
+    import pyarrow as pa
+
+    if table_format(path) == "parquet":
+        import pyarrow.parquet as pq
+
+        if chunksize is None:
+            yield _columns(pq.read_table(str(path)))
+            return
+        for batch in pq.ParquetFile(str(path)).iter_batches(batch_size=chunksize):
+            yield _columns(batch)
+        return
+
+    with pa.memory_map(str(path)) as source:
+        table = pa.ipc.open_file(source).read_all()
+        if chunksize is None:
+            yield _columns(table)
+            return
+        for batch in table.to_batches(max_chunksize=chunksize):
+            yield _columns(batch)
+
+
+@profiling.profiled(items=lambda result, *args, **kwargs: len(result["lon"]))
+def read_points(path):
+    """
+    Read a GeoParquet or Arrow IPC table of points.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Input .parquet, .arrow or .feather file.
+
+    Returns
+    -------
+    columns : dictionary
+        NumPy arrays of the columns, with the point coordinates in lon and
+        lat.
+
+    Raises
+    ------
+    ValueError
+        If the table has neither point geometries nor lon and lat columns.
+
+    """
+    columns = next(read_table_chunks(path))
+    if not {"lon", "lat"} <= set(columns):
+        raise ValueError(f"{path} has no point geometries or lon/lat columns.")
+
+    return columns
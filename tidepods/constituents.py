@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+Read the global tide constituent grid, cache it as a memory-mapped array and
+sample it at points.
+"""
+import json
+import os
+import pathlib
+import re
+
+import numpy as np
+
+from tidepods import cache, harmonics, profiling
+
+CONSTITUENTS_FILE = "global_tide_constituents_height_0.125deg.dfs2"
+
+# grids opened in this process, keyed by constituent file path and mtime
+_grids = {}
+
+
+def find_constituents(mikepath=None, constituents=None):
+    """
+    Locate the global tide constituent dfs2 file.
+
+    Parameters
+    ----------
+    mikepath : pathlib Path, optional
+        Path to MIKE installation directory, searched if no file is given.
+    constituents : str, optional
+        Explicit path to the constituent file, or to a grid json index
+        written by convert_dfs2().
+
+    Returns
+    -------
+    path : pathlib Path
+        Path to the constituent file.
+
+    Raises
+    ------
+    ValueError
+        If the constituent file could not be found.
+
+    """
+    if constituents is not None:
+        path = pathlib.Path(constituents)
+        if not path.exists():
+            raise ValueError(f"Constituent file not found: {path}.")
+        return path
+
+    if mikepath is not None:
+        found = list(pathlib.Path(mikepath).glob(f"**/{CONSTITUENTS_FILE}"))
+        if found:
+            return found[0]
+
+    raise ValueError(
+        f"{CONSTITUENTS_FILE} not found. Set the MIKE environment variable or "
+        "give the path to the constituent file."
+    )
+
+
+def parse_item_name(name):
+    """
+    Split a dfs2 item name into constituent and quantity.
+
+    Parameters
+    ----------
+    name : str
+        Item name, e.g. "M2 amplitude" or "Phase_K1".
+
+    Returns
+    -------
+    constituent : str or None
+        Constituent name as in harmonics.CONSTITUENTS.
+    quantity : str or None
+        "amplitude" or "phase".
+
+    """
+    tokens = re.split(r"[\s_:,()\-]+", name.upper())
+    constituent = next((t for t in tokens if t in harmonics.CONSTITUENTS), None)
+
+    if any(t.startswith("AMP") for t in tokens):
+        quantity = "amplitude"
+    elif any(t.startswith("PHA") for t in tokens):
+        quantity = "phase"
+    else:
+        quantity = None
+
+    return constituent, quantity
+
+
+def read_dfs2(path):
+    """
+    Read the constituent dfs2 file into a grid dictionary.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Path to the constituent dfs2 file.
+
+    Returns
+    -------
+    grid : Dictionary
+        Grid with the (lat, lon, constituent, amplitude/phase) float32 "data"
+        array, the "constituents" names and the "x0", "y0", "dx", "dy"
+        cell centre geometry.
+
+    Raises
+    ------
+    ValueError
+        If the file contains no amplitude/phase pairs.
+
+    """
+    import mikeio
+
+    ds = mikeio.read(str(path))
+    geometry = ds.geometry
+    ny, nx = len(geometry.y), len(geometry.x)
+
+    amplitudes, phases = {}, {}
+    for da in ds:
+        constituent, quantity = parse_item_name(da.name)
+        if constituent is None or quantity is None:
+            continue
+        values = np.asarray(da.to_numpy(), dtype=np.float32).reshape(-1, ny, nx)[0]
+        if quantity == "amplitude":
+            amplitudes[constituent] = values
+        else:
+            phases[constituent] = values
+
+    names = [c for c in amplitudes if c in phases]
+    if not names:
+        raise ValueError(f"No constituent amplitude/phase items found in {path}.")
+
+    data = np.empty((ny, nx, len(names), 2), dtype=np.float32)
+    for k, c in enumerate(names):
+        data[:, :, k, 0] = amplitudes[c]
+        data[:, :, k, 1] = phases[c]
+
+    grid = {
+        "data": data,
+        "constituents": names,
+        "x0": float(geometry.x[0]),
+        "y0": float(geometry.y[0]),
+        "dx": float(geometry.dx),
+        "dy": float(geometry.dy),
+    }
+
+    return grid
+
+
+@profiling.profiled()
+def convert_dfs2(path, outfolder=None):
+    """
+    Convert the constituent dfs2 into a memory-mappable grid cache.
+
+    The grid is stored as a .npy array laid out (lat, lon, constituent,
+    amplitude/phase), so the values of one grid node are contiguous and a
+    point lookup only touches the pages of its surrounding nodes. A json
+    index next to it holds the geometry and constituent names.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Path to the constituent dfs2 file.
+    outfolder : str or pathlib Path, optional
+        Output folder. The default is the "constituents" cache directory.
+
+    Returns
+    -------
+    index_path : pathlib Path
+        Path to the json index of the converted grid.
+
+    """
+    outfolder = pathlib.Path(outfolder or cache.cache_dir("constituents"))
+    outfolder.mkdir(parents=True, exist_ok=True)
+    fingerprint = cache.file_fingerprint(path)
+    index_path = outfolder / (fingerprint + ".json")
+    data_path = outfolder / (fingerprint + ".npy")
+
+    grid = read_dfs2(path)
+    data = grid.pop("data")
+
+    # written under per-process names and moved into place, so concurrent
+    # conversions never expose a partial array or index
+    tmp_path = data_path.with_name(f"{fingerprint}.{os.getpid()}.tmp.npy")
+    np.save(tmp_path, data)
+    os.replace(tmp_path, data_path)
+
+    index = dict(
+        grid,
+        data=data_path.name,
+        shape=list(data.shape),
+        source=str(path),
+        fingerprint=fingerprint,
+    )
+    tmp_path = index_path.with_name(f"{fingerprint}.{os.getpid()}.tmp.json")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, index_path)
+
+    return index_path
+
+
+def open_grid(index_path):
+    """
+    Open a converted constituent grid as a read-only memory map.
+
+    Parameters
+    ----------
+    index_path : str or pathlib Path
+        Path to the json index written by convert_dfs2().
+
+    Returns
+    -------
+    grid : Dictionary
+        Grid dictionary as returned by read_dfs2(), with "data" memory-mapped.
+
+    """
+    index_path = pathlib.Path(index_path)
+    with open(index_path) as f:
+        index = json.load(f)
+
+    grid = {k: index[k] for k in ("constituents", "x0", "y0", "dx", "dy")}
+    grid["data"] = np.load(index_path.parent / index["data"], mmap_mode="r")
+    grid["fingerprint"] = index["fingerprint"]
+
+    return grid
+
+
+def load_grid(path):
+    """
+    Load the constituent grid, converting it to the grid cache on first use.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Path to the constituent dfs2 file or to a converted grid json index.
+
+    Returns
+    -------
+    grid : Dictionary
+        Grid dictionary as returned by open_grid().
+
+    """
+    path = pathlib.Path(path)
+    if path.suffix.lower() == ".json":
+        return open_grid(path)
+
+    key = (str(path.resolve()), os.path.getmtime(path))
+    if key not in _grids:
+        index_path = cache.cache_dir("constituents") / (
+            cache.file_fingerprint(path) + ".json"
+        )
+        if not index_path.exists():
+            index_path = convert_dfs2(path)
+        _grids[key] = open_grid(index_path)
+
+    return _grids[key]
+
+
+def node_indices(grid, lon, lat):
+    """
+    Fractional row/column position of points in the grid.
+
+    Parameters
+    ----------
+    grid : Dictionary
+        Grid dictionary as returned by load_grid().
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+
+    Returns
+    -------
+    row, col : Array
+        Fractional row and column of each point.
+
+    """
+    ny, nx = grid["data"].shape[:2]
+    dx = lon - grid["x0"]
+    if abs(nx * grid["dx"] - 360.0) < grid["dx"] / 2:
+        dx = np.mod(dx, 360.0)
+    row = (np.asarray(lat, dtype=np.float64) - grid["y0"]) / grid["dy"]
+    col = np.asarray(dx, dtype=np.float64) / grid["dx"]
+
+    return row, col
+
+
+def surrounding_nodes(grid, lon, lat):
+    """
+    The four grid nodes around each point and their bilinear weights.
+
+    Parameters
+    ----------
+    grid : Dictionary
+        Grid dictionary as returned by load_grid().
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+
+    Returns
+    -------
+    nodes : list
+        Four (row, col, weight) tuples of arrays, one value per point.
+
+    """
+    ny, nx = grid["data"].shape[:2]
+    global_x = abs(nx * grid["dx"] - 360.0) < grid["dx"] / 2
+
+    row, col = node_indices(
+        grid, np.atleast_1d(np.asarray(lon, dtype=np.float64)),
+        np.atleast_1d(np.asarray(lat, dtype=np.float64)),
+    )
+    row = np.clip(row, 0, ny - 1)
+    col = col if global_x else np.clip(col, 0, nx - 1)
+    r0 = np.minimum(np.floor(row).astype(np.intp), ny - 1)
+    c0 = np.floor(col).astype(np.intp)
+    wr = row - r0
+    wc = col - c0
+    r1 = np.minimum(r0 + 1, ny - 1)
+    c1 = np.mod(c0 + 1, nx) if global_x else np.minimum(c0 + 1, nx - 1)
+    c0 = np.mod(c0, nx) if global_x else c0
+
+    return [
+        (r0, c0, (1 - wr) * (1 - wc)),
+        (r0, c1, (1 - wr) * wc),
+        (r1, c0, wr * (1 - wc)),
+        (r1, c1, wr * wc),
+    ]
+
+
+def node_values(grid, row, col):
+    """
+    Constituent amplitude and phase at grid nodes.
+
+    Parameters
+    ----------
+    grid : Dictionary
+        Grid dictionary as returned by load_grid().
+    row, col : Array
+        Integer node rows and columns.
+
+    Returns
+    -------
+    amplitude, phase : Array
+        Amplitude in metres and phase in degrees, shape (nodes, constituents).
+        NaN on land.
+
+    """
+    node = np.asarray(grid["data"][row, col], dtype=np.float64)
+
+    return node[..., 0], node[..., 1]
+
+
+def sample(grid, lon, lat):
+    """
+    Bilinear interpolation of the constituents at points.
+
+    Amplitude and phase are interpolated as a complex number so the phase
+    does not jump at 360 degrees. Land (NaN) nodes are left out of the
+    weighting; points with no water node around them are NaN.
+
+    Parameters
+    ----------
+    grid : Dictionary
+        Grid dictionary as returned by load_grid().
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+
+    Returns
+    -------
+    amplitude, phase : Array
+        Amplitude in metres and phase in degrees, shape (points, constituents).
+
+    """
+    total = 0
+    weight = 0
+    for r, c, w in surrounding_nodes(grid, lon, lat):
+        amplitude, phase = node_values(grid, r, c)
+        z = amplitude * np.exp(1j * np.radians(phase))
+        valid = np.isfinite(z)
+        w = np.where(valid, w[:, np.newaxis], 0.0)
+        total = total + np.where(valid, z, 0.0) * w
+        weight = weight + w
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(weight > 0, total / weight, np.nan)
+
+    amplitude = np.abs(z)
+    phase = np.mod(np.degrees(np.angle(z)), 360.0)
+
+    return amplitude, phase
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent store of tidal datums (LAT, MSL, HAT) per constituent grid node.
+
+The datums of a node are computed once from a native prediction over a full
+18.61 year nodal cycle and kept in a SQLite database in the tidepods cache
+directory, so every command gets them by lookup instead of a long run.
+"""
+import datetime
+import sqlite3
+
+import numpy as np
+
+from tidepods import cache, constituents, harmonics, predict, profiling
+
+DATUMS = ["LAT", "MSL", "HAT"]
+
+# fixed prediction period covering a full nodal cycle (18.61 years)
+NODAL_CYCLE_START = datetime.datetime(2000, 1, 1)
+NODAL_CYCLE_END = datetime.datetime(2018, 12, 31)
+TIMESTEP = 0.5
+
+# number of timesteps predicted at once
+CHUNKSIZE = 8760
+
+
+@profiling.profiled(items=profiling.count_arg())
+def compute_datums(amplitude, phase, names):
+    """
+    LAT, MSL and HAT from a prediction over the nodal cycle.
+
+    Parameters
+    ----------
+    amplitude, phase : Array
+        Constituent amplitudes and phases, shape (points, constituents).
+    names : list
+        Constituent names.
+
+    Returns
+    -------
+    datums : Array
+        LAT, MSL and HAT relative to the model mean, shape (points, 3).
+
+    """
+    times = predict.time_range(NODAL_CYCLE_START, NODAL_CYCLE_END, TIMESTEP)
+    lowest = np.full(len(amplitude), np.inf)
+    highest = np.full(len(amplitude), -np.inf)
+    total = np.zeros(len(amplitude))
+
+    for i in range(0, len(times), CHUNKSIZE):
+        levels = harmonics.predict(amplitude, phase, names, times[i : i + CHUNKSIZE])
+        lowest = np.minimum(lowest, levels.min(axis=1))
+        highest = np.maximum(highest, levels.max(axis=1))
+        total += levels.sum(axis=1)
+
+    return np.column_stack([lowest, total / len(times), highest])
+
+
+def open_store(grid):
+    """
+    Open (and create) the datum store of a constituent grid.
+
+    Parameters
+    ----------
+    grid : Dictionary
+        Grid dictionary as returned by constituents.load_grid().
+
+    Returns
+    -------
+    con : sqlite3 Connection
+        Connection to the store.
+
+    """
+    path = cache.cache_dir("datums") / (grid["fingerprint"] + ".sqlite")
+    con = sqlite3.connect(str(path), timeout=60)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS datums "
+        "(node INTEGER PRIMARY KEY, lat REAL, msl REAL, hat REAL)"
+    )
+
+    return con
+
+
+def node_datums(grid, row, col):
+    """
+    Datums at grid nodes, computing and storing the ones not yet known.
+
+    Parameters
+    ----------
+    grid : Dictionary
+        Grid dictionary as returned by constituents.load_grid().
+    row, col : Array
+        Integer node rows and columns.
+
+    Returns
+    -------
+    datums : Array
+        LAT, MSL and HAT relative to MSL, shape (nodes, 3). NaN on land.
+
+    """
+    nx = grid["data"].shape[1]
+    nodes = np.asarray(row, dtype=np.int64) * nx + np.asarray(col, dtype=np.int64)
+    unique, inverse = np.unique(nodes, return_inverse=True)
+    values = np.full((len(unique), 3), np.nan)
+    known = np.zeros(len(unique), dtype=bool)
+
+    con = open_store(grid)
+    try:
+        # stay below the SQLite host parameter limit
+        for i in range(0, len(unique), 900):
+            chunk = unique[i : i + 900].tolist()
+            rows = con.execute(
+                "SELECT node, lat, msl, hat FROM datums WHERE node IN "
+                f"({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            if rows:
+                found = np.array(rows, dtype=np.float64)
+                idx = np.searchsorted(unique, found[:, 0].astype(np.int64))
+                values[idx] = found[:, 1:]
+                known[idx] = True
+
+        missing = unique[~known]
+        if len(missing):
+            amplitude, phase = constituents.node_values(grid, missing // nx, missing % nx)
+            values[~known] = compute_datums(amplitude, phase, grid["constituents"])
+            with con:
+                con.executemany(
+                    "INSERT OR REPLACE INTO datums VALUES (?, ?, ?, ?)",
+                    (
+                        (int(n), *(None if np.isnan(v) else float(v) for v in d))
+                        for n, d in zip(missing, values[~known])
+                    ),
+                )
+    finally:
+        con.close()
+
+    return values[inverse]
+
+
+@profiling.profiled(items=profiling.count_arg())
+def get_datums(lon, lat, constituents_path):
+    """
+    Tidal datums at points, interpolated from the surrounding grid nodes.
+
+    Parameters
+    ----------
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+    constituents_path : str or pathlib Path
+        Path to the global tide constituent dfs2.
+
+    Returns
+    -------
+    datums : Dictionary
+        "LAT", "MSL" and "HAT" arrays relative to MSL, one value per point.
+
+    """
+    grid = constituents.load_grid(constituents_path)
+    nodes = constituents.surrounding_nodes(grid, lon, lat)
+    row = np.concatenate([r for r, _, _ in nodes])
+    col = np.concatenate([c for _, c, _ in nodes])
+    node_values = node_datums(grid, row, col).reshape(len(nodes), -1, 3)
+
+    total = 0
+    weight = 0
+    for (_, _, w), values in zip(nodes, node_values):
+        valid = np.isfinite(values)
+        w = np.where(valid, w[:, np.newaxis], 0.0)
+        total = total + np.where(valid, values, 0.0) * w
+        weight = weight + w
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        values = np.where(weight > 0, total / weight, np.nan)
+
+    return dict(zip(DATUMS, values.T))
+
+
+def lowest_astronomical_tide(lon, lat, constituents_path):
+    """
+    LAT at points relative to MSL, from the datum store.
+
+    Parameters
+    ----------
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+    constituents_path : str or pathlib Path
+        Path to the global tide constituent dfs2.
+
+    Returns
+    -------
+    lat_datum : Array
+        LAT of each point relative to MSL.
+
+    """
+    return get_datums(lon, lat, constituents_path)["LAT"]
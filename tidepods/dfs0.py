@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Read TidePredictor dfs0 files without the MIKE SDK.
+
+A dfs0 file is a stream of tagged blocks. Each block starts with 0xFF 0xFE
+and a uint16 tag and holds values, each written as a type byte, a uint32
+element count and the elements. The header blocks are parsed value by value.
+The dynamic data that follows has the same layout for every timestep, so it
+is exposed as a strided view of a memory map, without reading the file.
+"""
+import datetime
+import mmap
+import struct
+
+import numpy as np
+
+from tidepods import profiling
+
+# value type byte -> struct format
+STRUCT_FORMATS = {1: "f", 2: "d", 4: "i", 5: "I", 6: "h", 7: "H"}
+
+# value type byte -> NumPy dtype
+VALUE_TYPES = {
+    1: np.dtype("<f4"),
+    2: np.dtype("<f8"),
+    3: np.dtype("S1"),
+    4: np.dtype("<i4"),
+    5: np.dtype("<u4"),
+    6: np.dtype("<i2"),
+    7: np.dtype("<u2"),
+}
+
+BEGIN = b"\xff\xfe"
+EQUIDISTANT_CALENDAR_AXIS = 20053
+NON_EQUIDISTANT_CALENDAR_AXIS = 20054
+ITEM = 30005
+DYNAMIC_DATA = 50001
+END_TIMESTEP = b"\xfe" + struct.pack("<H", DYNAMIC_DATA)
+
+# EUM time units, in seconds
+TIME_UNITS = {1400: 1.0, 1401: 60.0, 1402: 3600.0, 1403: 86400.0}
+
+
+def _value(buf, pos):
+    """Decode the value at pos, returns the value and the next position."""
+    kind = buf[pos]
+    if kind not in VALUE_TYPES:
+        raise ValueError(f"Unknown dfs0 value type {kind} at byte {pos}.")
+    (count,) = struct.unpack_from("<I", buf, pos + 1)
+    start = pos + 5
+    end = start + count * VALUE_TYPES[kind].itemsize
+    if kind == 3:
+        value = buf[start:end].split(b"\0", 1)[0].decode("latin-1")
+    else:
+        value = list(struct.unpack_from(f"<{count}{STRUCT_FORMATS[kind]}", buf, start))
+
+    return value, end
+
+
+def _blocks(buf):
+    """The header blocks as (tag, values) tuples, up to the dynamic data."""
+    pos = buf.find(BEGIN)
+    if pos < 0:
+        raise ValueError("Not a dfs file.")
+
+    tag, values = None, []
+    while pos < len(buf):
+        if buf[pos] == 0xFF and buf[pos + 1] == 0xFE:
+            if tag is not None:
+                yield tag, values
+            (tag,) = struct.unpack_from("<H", buf, pos + 2)
+            values = []
+            pos += 4
+            if tag == DYNAMIC_DATA:
+                yield tag, pos
+                return
+        elif buf[pos] == 0xFE:
+            # end of block marker
+            pos += 3
+        else:
+            value, pos = _value(buf, pos)
+            values.append(value)
+
+    raise ValueError("No dynamic data found in dfs0 file.")
+
+
+def _record_layout(buf, pos, nitems, time_values):
+    """Byte layout of the timestep records starting at pos."""
+    start = pos
+    time_offset = None
+    if time_values:
+        time_offset = 5
+        pos += 5 + VALUE_TYPES[2].itemsize
+    if buf[pos] != 0xFF:
+        raise ValueError(f"Unexpected dfs0 timestep record at byte {pos}.")
+    pos += 1
+
+    dtype = VALUE_TYPES.get(buf[pos])
+    if nitems and (dtype is None or dtype.kind != "f"):
+        raise ValueError("Only dfs0 files with float items are supported.")
+    dtype = dtype or VALUE_TYPES[1]
+    item_stride = 5 + dtype.itemsize
+
+    # type byte, count and value of every item, checked in bulk
+    items = np.frombuffer(
+        buf[pos : pos + nitems * item_stride],
+        dtype=[("kind", "u1"), ("count", "<u4"), ("value", dtype)],
+    )
+    if len(items) != nitems or (items["kind"] != buf[pos]).any() or (
+        items["count"] != 1
+    ).any():
+        raise ValueError(
+            "Only dfs0 files with one value of the same type per item are supported."
+        )
+    value_offset = pos + 5 - start
+    pos += nitems * item_stride
+    if buf[pos : pos + len(END_TIMESTEP)] not in (END_TIMESTEP, b""):
+        raise ValueError(f"Unexpected end of dfs0 timestep record at byte {pos}.")
+
+    return {
+        "dtype": dtype,
+        "value_offset": value_offset,
+        "item_stride": item_stride,
+        "time_offset": time_offset,
+        "stride": pos - start + len(END_TIMESTEP),
+    }
+
+
+@profiling.profiled()
+def read_header(dfsfilepath):
+    """
+    Parse the header of a dfs0 file.
+
+    Parameters
+    ----------
+    dfsfilepath : str
+        Path to the dfs0 file, e.g. created by make_dfs0().
+
+    Returns
+    -------
+    header : dictionary
+        items (item names), start (datetime of the first timestep),
+        timestep (hours, None for a non-equidistant time axis), ntimes and
+        the byte layout of the dynamic data: offset, stride, dtype,
+        value_offset, item_stride and time_offset.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a dfs0 file with a calendar time axis and one
+        float value per item and timestep.
+
+    """
+    with open(dfsfilepath, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buf:
+        return _parse_header(buf, dfsfilepath)
+
+
+def _parse_header(buf, dfsfilepath):
+    """read_header() of a mapped file."""
+    header = {"items": []}
+    axis = None
+    for tag, values in _blocks(buf):
+        if tag in (EQUIDISTANT_CALENDAR_AXIS, NON_EQUIDISTANT_CALENDAR_AXIS):
+            date, time, unit, (offset, step), (ntimes, _) = values[:5]
+            axis = tag
+            scale = TIME_UNITS.get(unit[0])
+            if scale is None:
+                raise ValueError(f"Unsupported dfs0 time unit {unit[0]}.")
+            header["start"] = datetime.datetime.strptime(
+                f"{date} {time}", "%Y-%m-%d %H:%M:%S"
+            ) + datetime.timedelta(seconds=offset * scale)
+            header["timestep"] = (
+                step * scale / 3600 if tag == EQUIDISTANT_CALENDAR_AXIS else None
+            )
+            header["time_scale"] = scale
+            header["ntimes"] = ntimes
+        elif tag == ITEM:
+            header["items"].append(values[1])
+        elif tag == DYNAMIC_DATA:
+            header["offset"] = values
+
+    if axis is None:
+        raise ValueError("Only dfs0 files with a calendar time axis are supported.")
+
+    header.update(
+        _record_layout(
+            buf,
+            header["offset"],
+            len(header["items"]),
+            axis == NON_EQUIDISTANT_CALENDAR_AXIS,
+        )
+    )
+    # the END_TIMESTEP marker is not written after the last timestep
+    size = header["offset"] + header["ntimes"] * header["stride"] - len(END_TIMESTEP)
+    if header["ntimes"] and len(buf) < size:
+        raise ValueError(f"Truncated dfs0 file: {dfsfilepath}.")
+
+    return header
+
+
+def open_dfs0(dfsfilepath):
+    """
+    Memory-map the data of a dfs0 file.
+
+    Nothing but the header is read: slicing the returned array reads the
+    values of one timestep of all items, or of one item for all timesteps,
+    straight from the file.
+
+    Parameters
+    ----------
+    dfsfilepath : str
+        Path to the dfs0 file, e.g. created by make_dfs0().
+
+    Returns
+    -------
+    header : dictionary
+        Header parsed by read_header().
+    data : Array
+        Read-only view of the values, shape (items, times).
+
+    """
+    header = read_header(dfsfilepath)
+    buf = np.memmap(dfsfilepath, dtype=np.uint8, mode="r")
+    data = np.ndarray(
+        shape=(len(header["items"]), header["ntimes"]),
+        dtype=header["dtype"],
+        buffer=buf,
+        offset=header["offset"] + header["value_offset"],
+        strides=(header["item_stride"], header["stride"]),
+    )
+
+    return header, data
+
+
+def times(dfsfilepath):
+    """
+    Times of the timesteps of a dfs0 file.
+
+    Parameters
+    ----------
+    dfsfilepath : str
+        Path to the dfs0 file.
+
+    Returns
+    -------
+    times : Array
+        datetime64[ms] times.
+
+    """
+    header = read_header(dfsfilepath)
+    start = np.datetime64(header["start"], "ms")
+    if header["time_offset"] is None:
+        step = np.timedelta64(int(round(header["timestep"] * 3600e3)), "ms")
+        return start + np.arange(header["ntimes"]) * step
+
+    buf = np.memmap(dfsfilepath, dtype=np.uint8, mode="r")
+    seconds = np.ndarray(
+        shape=(header["ntimes"],),
+        dtype=VALUE_TYPES[2],
+        buffer=buf,
+        offset=header["offset"] + header["time_offset"],
+        strides=(header["stride"],),
+    ) * header["time_scale"]
+
+    return start + np.rint(seconds * 1e3).astype("timedelta64[ms]")
+
+
+@profiling.profiled(items=lambda result, *args, **kwargs: len(result.columns))
+def to_dataframe(dfsfilepath):
+    """
+    All series of a dfs0 file as a DataFrame, the native Dfs0.to_dataframe().
+
+    Parameters
+    ----------
+    dfsfilepath : str
+        Path to the dfs0 file.
+
+    Returns
+    -------
+    df : DataFrame
+        Values indexed by time, one column per item.
+
+    """
+    import pandas as pd
+
+    header, data = open_dfs0(dfsfilepath)
+
+    return pd.DataFrame(
+        np.array(data.T),
+        index=pd.DatetimeIndex(times(dfsfilepath)),
+        columns=header["items"],
+    )
@@ -1,7 +1,8 @@
 import os
 
-import numpy as np
-from shapely.geometry import box, Point, shape
+from shapely.geometry import box, shape
+
+from tidepods import pointgrid
 
 
 def transform_shape_raster(infile):
@@ -109,26 +110,15 @@ def create_pts(infile):
 
     Returns
     -------
-    plist : list
-        List of shapely points for points within infile.
+    lon, lat : Array
+        Coordinates of the points within infile.
 
     Raises
     -------
     ValueError
-        If plist is empty as no points have been generated.
+        If no points have been generated.
 
     """
     shp = transform_shape(infile)
-    bounds = shp.bounds
-    minx, miny, maxx, maxy = bounds
-    plist = []
-    for x in np.arange(minx, maxx, 0.125):
-        for y in np.arange(miny, maxy, 0.125):
-            p = (Point(x, y))
-            if p.within(shp):
-                plist.append(p)
-
-    if not plist:
-        raise ValueError('No points generated. Is the input file covering a large enough AOI?')
-
-    return plist
+
+    return pointgrid.grid_points(shp, 0.125)
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Harmonic tide prediction from constituent amplitudes and phases.
+
+Vectorized replacement for the TidePredictor.exe run: levels are computed
+for every point and every time in a single matrix product.
+"""
+import datetime
+
+import numpy as np
+
+# Argument coefficients of (T, s, h, p, N, p1) and the phase offset in degrees
+# for each constituent, following Schureman. T is the hour angle of the mean
+# sun counted from midnight UT (15 deg/h).
+CONSTITUENTS = {
+    "2Q1": (1, -4, 1, 2, 0, 0, -90),
+    "SIGMA1": (1, -4, 3, 0, 0, 0, -90),
+    "Q1": (1, -3, 1, 1, 0, 0, -90),
+    "RHO1": (1, -3, 3, -1, 0, 0, -90),
+    "O1": (1, -2, 1, 0, 0, 0, -90),
+    "M1": (1, -1, 1, 0, 0, 0, 90),
+    "PI1": (1, 0, -2, 0, 0, 1, -90),
+    "P1": (1, 0, -1, 0, 0, 0, -90),
+    "S1": (1, 0, 0, 0, 0, 0, 90),
+    "K1": (1, 0, 1, 0, 0, 0, 90),
+    "PSI1": (1, 0, 2, 0, 0, -1, 90),
+    "PHI1": (1, 0, 3, 0, 0, 0, 90),
+    "THETA1": (1, 1, -1, 1, 0, 0, 90),
+    "J1": (1, 1, 1, -1, 0, 0, 90),
+    "OO1": (1, 2, 1, 0, 0, 0, 90),
+    "2N2": (2, -4, 2, 2, 0, 0, 0),
+    "MU2": (2, -4, 4, 0, 0, 0, 0),
+    "N2": (2, -3, 2, 1, 0, 0, 0),
+    "NU2": (2, -3, 4, -1, 0, 0, 0),
+    "M2": (2, -2, 2, 0, 0, 0, 0),
+    "LAMBDA2": (2, -1, 0, 1, 0, 0, 180),
+    "L2": (2, -1, 2, -1, 0, 0, 180),
+    "T2": (2, 0, -1, 0, 0, 1, 0),
+    "S2": (2, 0, 0, 0, 0, 0, 0),
+    "R2": (2, 0, 1, 0, 0, -1, 180),
+    "K2": (2, 0, 2, 0, 0, 0, 0),
+    "2SM2": (2, 2, -2, 0, 0, 0, 0),
+    "M3": (3, -3, 3, 0, 0, 0, 0),
+    "MN4": (4, -5, 4, 1, 0, 0, 0),
+    "M4": (4, -4, 4, 0, 0, 0, 0),
+    "MS4": (4, -2, 2, 0, 0, 0, 0),
+    "MK4": (4, -2, 4, 0, 0, 0, 0),
+    "S4": (4, 0, 0, 0, 0, 0, 0),
+    "M6": (6, -6, 6, 0, 0, 0, 0),
+    "M8": (8, -8, 8, 0, 0, 0, 0),
+    "MM": (0, 1, 0, -1, 0, 0, 0),
+    "MF": (0, 2, 0, 0, 0, 0, 0),
+    "MSF": (0, 2, -2, 0, 0, 0, 0),
+    "SA": (0, 0, 1, 0, 0, 0, 0),
+    "SSA": (0, 0, 2, 0, 0, 0, 0),
+}
+
+MJD_EPOCH = np.datetime64("1858-11-17T00:00:00", "s")
+
+
+def to_datetime64(times):
+    """Convert a datetime, or a sequence of them, to a datetime64[s] array."""
+    if isinstance(times, (datetime.datetime, datetime.date, np.datetime64, str)):
+        times = [times]
+    return np.asarray(times, dtype="datetime64[s]")
+
+
+def astronomical_longitudes(mjd):
+    """
+    Mean longitudes of the moon, sun, lunar perigee, lunar node and solar perigee.
+
+    Parameters
+    ----------
+    mjd : Array
+        Modified Julian days (UT).
+
+    Returns
+    -------
+    s, h, p, N, p1 : Array
+        Longitudes in degrees.
+
+    """
+    d = mjd - 51544.4993
+    s = 218.3164 + 13.17639648 * d
+    h = 280.4661 + 0.98564736 * d
+    p = 83.3535 + 0.11140353 * d
+    N = 125.0445 - 0.05295377 * d
+    p1 = 282.9384 + 0.0000470684 * d
+
+    return s, h, p, N, p1
+
+
+def nodal_corrections(constituents, p, N):
+    """
+    Nodal amplitude factors f and phase corrections u for the constituents.
+
+    Parameters
+    ----------
+    constituents : list
+        Constituent names, keys of CONSTITUENTS.
+    p : Array
+        Longitude of the lunar perigee in degrees.
+    N : Array
+        Longitude of the lunar ascending node in degrees.
+
+    Returns
+    -------
+    f : Array
+        Amplitude factors, shape (constituents, times).
+    u : Array
+        Phase corrections in degrees, shape (constituents, times).
+
+    """
+    p = np.radians(p)
+    N = np.radians(N)
+    sinn, cosn = np.sin(N), np.cos(N)
+    sin2n, cos2n = np.sin(2 * N), np.cos(2 * N)
+    sin3n = np.sin(3 * N)
+
+    one = np.ones_like(N)
+    zero = np.zeros_like(N)
+
+    f_o1 = np.hypot(1.0 + 0.189 * cosn - 0.0058 * cos2n, 0.189 * sinn - 0.0058 * sin2n)
+    u_o1 = 10.8 * sinn - 1.3 * sin2n + 0.2 * sin3n
+
+    re = 1.0 + 0.1158 * cosn - 0.0029 * cos2n
+    im = -(0.1554 * sinn - 0.0029 * sin2n)
+    f_k1, u_k1 = np.hypot(re, im), np.degrees(np.arctan2(im, re))
+
+    re = 1.0 - 0.03731 * cosn + 0.00052 * cos2n
+    im = -0.03731 * sinn + 0.00052 * sin2n
+    f_m2, u_m2 = np.hypot(re, im), np.degrees(np.arctan2(im, re))
+
+    re = 1.0 + 0.2852 * cosn + 0.0324 * cos2n
+    im = -(0.3108 * sinn + 0.0324 * sin2n)
+    f_k2, u_k2 = np.hypot(re, im), np.degrees(np.arctan2(im, re))
+
+    re = 1.36 * np.cos(p) + 0.267 * np.cos(p - N)
+    im = 0.64 * np.sin(p) + 0.135 * np.sin(p - N)
+    f_m1, u_m1 = np.hypot(re, im), np.degrees(np.arctan2(im, re))
+
+    re = 1.0 + 0.169 * cosn
+    im = -0.227 * sinn
+    f_j1, u_j1 = np.hypot(re, im), np.degrees(np.arctan2(im, re))
+
+    re = 1.0 + 0.640 * cosn + 0.134 * cos2n
+    im = -(0.640 * sinn + 0.134 * sin2n)
+    f_oo1, u_oo1 = np.hypot(re, im), np.degrees(np.arctan2(im, re))
+
+    re = 1.0 - 0.25 * np.cos(2 * p) - 0.11 * np.cos(2 * p - N) - 0.04 * cosn
+    im = -(0.25 * np.sin(2 * p) + 0.11 * np.sin(2 * p - N) + 0.04 * sinn)
+    f_l2, u_l2 = np.hypot(re, im), np.degrees(np.arctan2(im, re))
+
+    corrections = {
+        "2Q1": (f_o1, u_o1),
+        "SIGMA1": (f_o1, u_o1),
+        "Q1": (f_o1, u_o1),
+        "RHO1": (f_o1, u_o1),
+        "O1": (f_o1, u_o1),
+        "M1": (f_m1, u_m1),
+        "K1": (f_k1, u_k1),
+        "THETA1": (f_j1, u_j1),
+        "J1": (f_j1, u_j1),
+        "OO1": (f_oo1, u_oo1),
+        "2N2": (f_m2, u_m2),
+        "MU2": (f_m2, u_m2),
+        "N2": (f_m2, u_m2),
+        "NU2": (f_m2, u_m2),
+        "M2": (f_m2, u_m2),
+        "LAMBDA2": (f_m2, u_m2),
+        "L2": (f_l2, u_l2),
+        "K2": (f_k2, u_k2),
+        "2SM2": (f_m2, -u_m2),
+        "M3": (f_m2 ** 1.5, 1.5 * u_m2),
+        "MN4": (f_m2 ** 2, 2 * u_m2),
+        "M4": (f_m2 ** 2, 2 * u_m2),
+        "MS4": (f_m2, u_m2),
+        "MK4": (f_m2 * f_k2, u_m2 + u_k2),
+        "M6": (f_m2 ** 3, 3 * u_m2),
+        "M8": (f_m2 ** 4, 4 * u_m2),
+        "MM": (1.0 - 0.130 * cosn, zero),
+        "MF": (1.043 + 0.414 * cosn, -23.7 * sinn + 2.7 * sin2n - 0.4 * sin3n),
+    }
+
+    f = np.array([corrections.get(c, (one, zero))[0] for c in constituents])
+    u = np.array([corrections.get(c, (one, zero))[1] for c in constituents])
+
+    return f, u
+
+
+def equilibrium_arguments(constituents, times):
+    """
+    Equilibrium arguments V, nodal factors f and nodal phases u.
+
+    Parameters
+    ----------
+    constituents : list
+        Constituent names, keys of CONSTITUENTS.
+    times : Array
+        Prediction times as datetime64 (UT).
+
+    Returns
+    -------
+    V, f, u : Array
+        Arrays of shape (constituents, times). V and u are in degrees.
+
+    Raises
+    ------
+    ValueError
+        If a constituent is not supported.
+
+    """
+    unknown = [c for c in constituents if c not in CONSTITUENTS]
+    if unknown:
+        raise ValueError(f"Unsupported tidal constituents: {unknown}.")
+
+    times = to_datetime64(times)
+    mjd = (times - MJD_EPOCH) / np.timedelta64(1, "D")
+    T = 360.0 * np.mod(mjd, 1.0)
+    s, h, p, N, p1 = astronomical_longitudes(mjd)
+
+    coefs = np.array([CONSTITUENTS[c] for c in constituents], dtype=np.float64)
+    astro = np.stack([T, s, h, p, N, p1, np.ones_like(T)])
+    V = coefs @ astro
+    f, u = nodal_corrections(constituents, p, N)
+
+    return V, f, u
+
+
+def predict(amplitude, phase, constituents, times):
+    """
+    Predict tide levels for all points and all times in one pass.
+
+    Parameters
+    ----------
+    amplitude : Array
+        Constituent amplitudes in metres, shape (points, constituents).
+    phase : Array
+        Constituent Greenwich phase lags in degrees, shape (points, constituents).
+    constituents : list
+        Constituent names, keys of CONSTITUENTS.
+    times : Array
+        Prediction times as datetime64 (UT).
+
+    Returns
+    -------
+    levels : Array
+        Tide levels relative to MSL, shape (points, times).
+
+    """
+    V, f, u = equilibrium_arguments(constituents, times)
+    arg = np.radians(V + u)
+    g = np.radians(phase)
+
+    # cos(arg - g) = cos(arg)cos(g) + sin(arg)sin(g)
+    levels = (amplitude * np.cos(g)) @ (f * np.cos(arg)) + (
+        amplitude * np.sin(g)
+    ) @ (f * np.sin(arg))
+
+    return levels
+
+
+def predict_at(amplitude, phase, constituents, times):
+    """
+    Predict the tide level of each point at its own time.
+
+    Parameters
+    ----------
+    amplitude : Array
+        Constituent amplitudes in metres, shape (points, constituents).
+    phase : Array
+        Constituent Greenwich phase lags in degrees, shape (points, constituents).
+    constituents : list
+        Constituent names, keys of CONSTITUENTS.
+    times : Array
+        One prediction time per point as datetime64 (UT).
+
+    Returns
+    -------
+    levels : Array
+        Tide levels relative to MSL, shape (points,).
+
+    """
+    V, f, u = equilibrium_arguments(constituents, times)
+    arg = np.radians(V + u).T
+    g = np.radians(phase)
+
+    return (amplitude * f.T * np.cos(arg - g)).sum(axis=1)
@@ -4,16 +4,24 @@ Created on Thu Apr 22 08:06:48 2021
 
 @author: vlro
 """
+import itertools
 import pathlib
 import os
 import shutil
-import subprocess
-import datetime
 import fiona
+import numpy as np
+
+from tidepods import atl, columnar, datums, pfs, pointgrid, predict, profiling
+from tidepods.constituents import find_constituents, load_grid
+from tidepods.pointset import PointSet
 
 VALID_LEVELS = ["LAT", "MSL"]
+# time bin of the points predicted once with dedupe, shapefile times are
+# read to the minute
+DEDUPE_SECONDS = 60
 
 
+@profiling.profiled(items=profiling.count_result)
 def read_shapefile_pts(shape):
     c = fiona.open(shape)
     pts = [p for p in c]
@@ -21,6 +29,31 @@ def read_shapefile_pts(shape):
     return pts
 
 
+def read_shapefile_chunks(shape, chunksize):
+    """Read the features of a shapefile in chunks.
+
+    Parameters
+    ----------
+    shape : str
+        Path to the shapefile.
+    chunksize : int
+        Number of features per chunk.
+
+    Yields
+    ------
+    pts : list
+        Fiona features of the next chunk, in file order.
+
+    """
+    with fiona.open(shape) as c:
+        features = iter(c)
+        while True:
+            pts = list(itertools.islice(features, chunksize))
+            if not pts:
+                return
+            yield pts
+
+
 def read_shapefile_props(shape):
     c = fiona.open(shape)
 
@@ -31,260 +64,481 @@ def read_shapefile_props(shape):
     return crs, driver, schema
 
 
-def write_pts(pts, tv, crs, driver, schema, outfile):
+@profiling.profiled(items=profiling.count_arg())
+def acquisition_times(pts):
+    """Acquisition time of each point.
+
+    Parameters
+    ----------
+    pts : list
+        Fiona features with a "time" property (yyyy-mm-dd HH:MM).
+
+    Returns
+    -------
+    times : Array
+        datetime64[s] times, one per point.
+
+    """
+    return np.array(
+        [p["properties"]["time"] for p in pts], dtype="datetime64[m]"
+    ).astype("datetime64[s]")
+
+
+def feature_columns(pts):
+    """Properties of fiona features as one array per property."""
+    names = list(pts[0]["properties"]) if pts else []
+    return {n: np.asarray([p["properties"][n] for p in pts]) for n in names}
+
+
+def table_times(values):
+    """Acquisition times of a time column, datetimes or yyyy-mm-dd HH:MM text."""
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values
+
+    return values.astype("datetime64[s]")
 
+
+def tide_schema(schema):
+    """Schema of the input points with the added tide_level property."""
+    schema["properties"].update({"tide_level": "float:24.15"})
+
+    return schema
+
+
+def tide_features(pts, tv):
+    """The input features with their tide_level property set."""
     for p, t in zip(pts, tv):
         p["properties"]["tide_level"] = t
+        yield p
 
-    schema["properties"].update({"tide_level": "float:24.15"})
 
-    with fiona.open(outfile, "w", crs=crs, driver=driver, schema=schema) as o:
-        for p in pts:
-            o.write(p)
+@profiling.profiled(items=profiling.count_arg())
+def write_pts(pts, tv, crs, driver, schema, outfile):
 
+    with fiona.open(
+        outfile, "w", crs=crs, driver=driver, schema=tide_schema(schema)
+    ) as o:
+        o.writerecords(tide_features(pts, tv))
 
-def generate_pfs(pts, mikepath, tempdir):
-    """Generate a pfs file using DHI.PFS.
+
+@profiling.profiled(items=profiling.count_arg(1))
+def append_pts(dst, pts, tv):
+    """Append points and their tide values to an open output collection.
 
     Parameters
     ----------
+    dst : fiona Collection
+        Output opened in "w" mode with tide_schema().
     pts : list
-        List of shapely points generated by create_pts().
+        Fiona features of a chunk.
+    tv : list
+        Tide value of each point.
+
+    """
+    dst.writerecords(tide_features(pts, tv))
+
+
+@profiling.profiled(items=profiling.count_arg())
+def generate_pfs(pts, mikepath, tempdir, start, end, timestep=0.5):
+    """Generate the TidePredictor pfs file.
+
+    Parameters
+    ----------
+    pts : PointSet
+        Points to predict, read from the input shapefile.
     mikepath : pathlib Path
         Path to MIKE installation directory.
     tempdir : str
         Path to the temporary working directory.
+    start, end : datetime
+        Start and end of the predicted series, e.g. from
+        predict.prediction_period().
+    timestep : float, optional
+        Timestep of the predicted series in hours. The default is 0.5.
 
     Raises
     ------
     ValueError
-        If DHI.PFS could not be imported or is not found in the mike folder.
+        If the tide constituent files are not found in the mike folder.
     ValueError
         If the PFS file could not be created.
 
     """
-    one_date = pts[0]["properties"]["time"]
-    date = datetime.datetime.strptime(one_date, "%Y-%m-%d %H:%M")
     temppfs = os.path.join(tempdir, "temp.pfs")
 
-    dhi_pfs_path = list(mikepath.glob("**/Mike SDK/**/*DHI.PFS.dll"))[0]
-    constituents_path = list(
-        mikepath.glob("**/global_tide_constituents_height_0.125deg.dfs2")
-    )[0]
-    prepack_path = list(mikepath.glob("**/Tide_Constituents/prepack.dat"))[0]
-
-    import clr
-    import System
-
-    try:
-        clr.AddReference(str(dhi_pfs_path))
-        import DHI.PFS
-
-    except (ImportError, System.IO.FileNotFoundException) as exception:
-        msg = f'DHI.PFS not found. Is the path correct: "{dhi_pfs_path}"?'
-        raise ValueError(msg) from exception
-
-    # Begin PFS Generation Parameters using DHI.PFS.PFSBuilder
-
-    pfsbuilder = DHI.PFS.PFSBuilder()
-
-    pfsbuilder.AddTarget("TidePredictor")  # First Section
-
-    pfsbuilder.AddKeyword("Name")
-    pfsbuilder.AddString("Icesat2-Points")
-    pfsbuilder.AddKeyword("constituent_file_name")
-    pfsbuilder.AddString(str(constituents_path))
-    pfsbuilder.AddKeyword("prepack_file_name")
-    pfsbuilder.AddString(str(prepack_path))
-    pfsbuilder.AddKeyword("start_date")
-    DHI.PFS.PFSExtensions.AddDate(pfsbuilder, System.DateTime(date.year, 1, 1))
-    pfsbuilder.AddKeyword("end_date")
-    DHI.PFS.PFSExtensions.AddDate(pfsbuilder, System.DateTime(date.year, 12, 31))
-    pfsbuilder.AddKeyword("timestep")
-    pfsbuilder.AddDouble(0.5)
-    pfsbuilder.AddKeyword("number_of_files")
-    pfsbuilder.AddInt(1)
-    pfsbuilder.AddKeyword("ShowGeographic")
-    pfsbuilder.AddInt(1)
-
-    pfsbuilder.AddSection("File_1")  # File Section
-    pfsbuilder.AddKeyword("format")
-    pfsbuilder.AddInt(0)
-    pfsbuilder.AddKeyword("file_name")
-    pfsbuilder.AddFileName("temp.dfs0")
-    pfsbuilder.AddKeyword("description")
-    pfsbuilder.AddString("Predicted Tide Level")
-    pfsbuilder.AddKeyword("number_of_points")
-    pfsbuilder.AddInt(len(pts))
-
-    # Points section enumerated for each point generated within shapefile
-
-    for p in pts:
-        pid = int(p["id"]) + 1
-        pfsbuilder.AddSection("Point_" + (str(pid)))
-        pfsbuilder.AddKeyword("description")
-        pfsbuilder.AddInt(pid)
-        pfsbuilder.AddKeyword("y")
-        pfsbuilder.AddDouble(p["properties"]["lat"])
-        pfsbuilder.AddKeyword("x")
-        pfsbuilder.AddDouble(p["properties"]["lon"])
-        pfsbuilder.EndSection()
-
-    pfsbuilder.EndSection()
-    pfsbuilder.EndSection()
-    pfsbuilder.Write(temppfs)
+    constituents_path, prepack_path = pfs.tide_files(mikepath)
+    pfs.write_tidepredictor_pfs(
+        temppfs,
+        pts,
+        constituents_path,
+        prepack_path,
+        start,
+        end,
+        name="Icesat2-Points",
+        timestep=timestep,
+    )
 
     if not os.path.exists(temppfs):
         raise ValueError("PFS file not created. Recheck creation options.")
 
 
-def make_dfs0(mikepath, pfsfile):
-    """Generate a dfs0 file from the input PFS in the same directory.
+@profiling.profiled(items=profiling.count_arg())
+def tide_values_at(
+    points,
+    dates,
+    level,
+    constituents_path,
+    mikepath,
+    tempfolder,
+    backend="mike",
+    window=None,
+    workers=None,
+    timestep=0.5,
+    interpolation="linear",
+):
+    """Tide value of each point at its own acquisition time.
 
     Parameters
     ----------
-    mikepath : str
+    points : PointSet
+        Points to predict.
+    dates : Array
+        Acquisition time of each point.
+    level : str
+        Click option LAT or MSL.
+    constituents_path : pathlib Path
+        Path to the global tide constituent dfs2.
+    mikepath : pathlib Path
         Path to MIKE installation directory.
-    pfsfile : str
-        Path to PFS file.
+    tempfolder : str
+        Path to the temporary working directory.
+    backend, window, workers, timestep, interpolation
+        As for main().
+
+    Returns
+    -------
+    tv : Array
+        Tide value of each point.
 
-    Raises
-    ------
-    ValueError
-        If the DFS file could not be created.
     """
-    tp = str(list(mikepath.glob("**/TidePredictor.exe"))[0])
-    cmd = [tp, pfsfile]
-    try:
-        subprocess.check_call(cmd, shell=True)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(
-            "command '{}' return with error (code {}): {}".format(
-                e.cmd, e.returncode, e.output
-            )
+    lon, lat = points.lon, points.lat
+
+    if backend == "native":
+        return np.asarray(predict.tide_values(lon, lat, dates, level, constituents_path))
+
+    lat_datum = None
+    if level == "LAT":
+        lat_datum = datums.lowest_astronomical_tide(lon, lat, constituents_path)
+
+    def write_pfs(shard, workdir, *period):
+        generate_pfs(shard, mikepath, workdir, *period)
+
+    # one series per group of acquisitions close in time, each point is
+    # then read at its own acquisition time
+    tv = np.empty(len(points))
+    for index, start, end in predict.group_periods(dates, window, timestep):
+        levels = predict.cached_levels(
+            points[index],
+            write_pfs,
+            start,
+            end,
+            timestep,
+            constituents_path,
+            mikepath,
+            tempfolder,
+            workers,
         )
-    dfsfile = pfsfile.replace(".pfs", ".dfs0")
-
-    if not os.path.exists(dfsfile):
-        raise ValueError(
-            f"DFS file not created. Please check that you are connected to the VPN and that the path to the tide predictor is correct: {tp}."
+        tv[index] = predict.tide_values_from_series(
+            levels,
+            start,
+            timestep,
+            dates[index],
+            level,
+            None if lat_datum is None else lat_datum[index],
+            interpolation,
         )
 
+    return tv
+
 
-def tide_values_from_dfs0(mikepath, pts, dfsfilepath, level):
-    """Read and extract values from dfs0 file using DHI.Generic.MikeZero.DFS.
+@profiling.profiled(items=profiling.count_arg())
+def predict_points(points, dates, level, constituents_path, mikepath, tempfolder,
+                   dedupe=False, dedupe_seconds=DEDUPE_SECONDS, **options):
+    """Tide value of each point at its own acquisition time.
 
     Parameters
     ----------
-    mikepath : str
-        Path to MIKE installation directory.
-    meta : dictionary
-        Metadata dictionary created by read_meta().
-    dfsfilepath : str
-        Path to the dfs file created by make_dfs0().
+    points : PointSet
+        Points to predict.
+    dates : Array
+        Acquisition time of each point.
     level : str
         Click option LAT or MSL.
+    constituents_path : pathlib Path
+        Path to the global tide constituent dfs2.
+    mikepath : pathlib Path
+        Path to MIKE installation directory.
+    tempfolder : str
+        Path to the temporary working directory.
+    dedupe : bool, optional
+        Predict the points at the node of their constituent grid cell, once
+        per cell and time bin, and copy the values back to the points. Points
+        whose node has no value (land) are predicted at their own location
+        and time. The default is False.
+    dedupe_seconds : float, optional
+        Length of the time bins of dedupe, the points are predicted at the
+        start of their bin. The default is DEDUPE_SECONDS, one minute.
+    **options
+        backend, window, workers, timestep and interpolation of main().
 
     Returns
     -------
-    tide_values : list
-        List of tide values for image acquisiton date and time.
+    tv : Array
+        Tide value of each point.
 
     Raises
     ------
     ValueError
-        If an invalid level type was provided.
-    ValueError
-        If DHI.Generic could not be imported or is not found in the sdkpath folder.
-    ValueError
-        If no tide values could be generated.
+        If dedupe_seconds is not positive.
 
     """
-    if level not in VALID_LEVELS:
-        raise ValueError(f"Level should be one of {VALID_LEVELS}, not {level}.")
+    if not dedupe:
+        return tide_values_at(
+            points, dates, level, constituents_path, mikepath, tempfolder, **options
+        )
 
-    import clr
+    step = int(round(dedupe_seconds * 1000))
+    if step <= 0:
+        raise ValueError(f"dedupe_seconds should be positive, not {dedupe_seconds}.")
 
-    clr.AddReference("System")
-    import System
+    # bins counted from the epoch, so they do not depend on the chunk
+    bins = np.asarray(dates, dtype="datetime64[ms]").astype(np.int64) // step
+    grid = load_grid(constituents_path)
+    cells = pointgrid.cell_ids(grid, points.lon, points.lat)
+    _, first, inverse = np.unique(
+        np.column_stack([cells, bins]), axis=0, return_index=True, return_inverse=True
+    )
+    inverse = inverse.reshape(-1)
+    nodes = PointSet(*pointgrid.cell_coordinates(grid, cells[first]), cells[first])
+
+    tv = tide_values_at(
+        nodes,
+        (bins[first] * step).astype("datetime64[ms]"),
+        level,
+        constituents_path,
+        mikepath,
+        tempfolder,
+        **options,
+    )[inverse]
+
+    # points whose node is on land are predicted at their own location, they
+    # may still be at sea
+    land = np.flatnonzero(np.isnan(tv))
+    if len(land):
+        tv[land] = tide_values_at(
+            points[land],
+            np.asarray(dates)[land],
+            level,
+            constituents_path,
+            mikepath,
+            tempfolder,
+            **options,
+        )
 
-    generic_mike_zero_path = list(
-        mikepath.glob("**/Mike SDK/**/*DHI.Generic.MikeZero.DFS.dll")
-    )[0]
-    try:
-        clr.AddReference(str(generic_mike_zero_path))
-        import DHI.Generic.MikeZero.DFS
+    return tv
 
-    except (ImportError, System.IO.FileNotFoundException) as exception:
-        msg = f'DHI.Generic not found. Is the path to the mike installation directory correct: "{mikepath}"?'
-        raise ValueError(msg) from exception
 
-    dfs_img_datetime = datetime.datetime.strptime(
-        pts[0]["properties"]["time"], "%Y-%m-%d %H:%M"
-    )
+def point_tide_values(pts, level, constituents_path, mikepath, tempfolder, **options):
+    """Tide value of each input feature at its own acquisition time.
 
-    dfsfile = DHI.Generic.MikeZero.DFS.DfsFileFactory.DfsGenericOpen(dfsfilepath)
-    tide_values = []
+    Parameters
+    ----------
+    pts : list
+        Fiona features with lon, lat and time properties.
+    level, constituents_path, mikepath, tempfolder, **options
+        As for predict_points().
 
-    # read timestep in seconds, convert to minutes
-    timestep = int(dfsfile.FileInfo.TimeAxis.TimeStep / 60)
-    sdt = dfsfile.FileInfo.TimeAxis.StartDateTime
-    dfs_start_datetime = datetime.datetime(
-        *(getattr(sdt, n) for n in ["Year", "Month", "Day", "Hour", "Minute", "Second"])
-    )
+    Returns
+    -------
+    tv : list
+        Tide value of each point.
 
-    diff = dfs_img_datetime - dfs_start_datetime
-    img_timestep = int(((diff.days * 24 * 60) + (diff.seconds / 60)) / timestep)
+    """
+    return predict_points(
+        PointSet.from_features(pts),
+        acquisition_times(pts),
+        level,
+        constituents_path,
+        mikepath,
+        tempfolder,
+        **options,
+    ).tolist()
 
-    for i in range(len(dfsfile.ItemInfo)):
-        min_value = float(dfsfile.ItemInfo[i].MinValue)
-        acq_value = dfsfile.ReadItemTimeStep(i + 1, img_timestep).Data[
-            0
-        ]  # Value c.f. MSL
 
-        if level == "LAT":
-            lat_value = acq_value - min_value  # Value above LAT
-            tide_values.append(lat_value)
-        elif level == "MSL":
-            tide_values.append(acq_value)
-        else:
-            raise ValueError("Invalid level.")
+def tide_columns(chunks, level, constituents_path, mikepath, tempfolder, **options):
+    """Point columns of each chunk with the tide value of the points added.
 
-    dfsfile.Dispose()
+    Parameters
+    ----------
+    chunks : iterable
+        Dictionaries of arrays with lon, lat and time columns.
+    level, constituents_path, mikepath, tempfolder, **options
+        As for predict_points().
 
-    if not tide_values:
-        raise ValueError("No tide values generated, recheck AOI")
+    Yields
+    ------
+    columns : dictionary
+        The columns of the chunk and its tide_level column.
 
-    return tide_values
+    """
+    for columns in chunks:
+        columns["tide_level"] = predict_points(
+            PointSet(columns["lon"], columns["lat"]),
+            table_times(columns["time"]),
+            level,
+            constituents_path,
+            mikepath,
+            tempfolder,
+            **options,
+        )
+        yield columns
 
 
-def main(shapefile, outfolder, level):
+def process_table(chunks, outfile, level, constituents_path, mikepath, tempfolder,
+                  **options):
+    """Write point columns and their tide values as a GeoParquet or Arrow table.
+
+    Parameters
+    ----------
+    chunks : iterable
+        Dictionaries of arrays with lon, lat and time columns, e.g. from
+        columnar.read_table_chunks() or feature_columns().
+    outfile : str
+        Output .parquet, .arrow or .feather file.
+    level, constituents_path, mikepath, tempfolder, **options
+        As for predict_points().
+
+    """
+    with columnar.table_writer(outfile, geometry=True) as write:
+        for columns in tide_columns(
+            chunks, level, constituents_path, mikepath, tempfolder, **options
+        ):
+            write(columns)
+
+
+def process_granule(granule, outfile, level, constituents_path, mikepath, tempfolder,
+                    beams=None, variables=None, chunksize=None, **options):
+    """Tide levels and tide-corrected heights of an ATL03 or ATL08 granule.
+
+    The granule is read, predicted and written one chunk of a beam at a time.
+
+    Parameters
+    ----------
+    granule : str
+        Path to the HDF5 granule.
+    outfile : str
+        Output .parquet, .arrow or .feather file.
+    level, constituents_path, mikepath, tempfolder, **options
+        As for predict_points().
+    beams, variables : list, optional
+        Beams and further datasets to read, see atl.read_granule().
+    chunksize : int, optional
+        Maximum number of photons or segments per chunk. The default is None,
+        atl.CHUNKSIZE.
+
+    """
+    chunks = atl.read_granule(granule, beams, variables, chunksize or atl.CHUNKSIZE)
+    with columnar.table_writer(outfile, geometry=True) as write:
+        for columns in tide_columns(
+            chunks, level, constituents_path, mikepath, tempfolder, **options
+        ):
+            columns["h_tide_corrected"] = columns["height"] - columns["tide_level"]
+            write(columns)
+
+
+def main(shapefile, outfolder, level, backend="mike", constituents=None, window=None,
+         workers=None, timestep=0.5, interpolation="linear", chunksize=None,
+         dedupe=False, dedupe_seconds=DEDUPE_SECONDS, beams=None, variables=None,
+         output_format=None):
 
     mikepath = os.environ.get("MIKE")
-    mikepath = pathlib.Path(mikepath)
+    mikepath = pathlib.Path(mikepath) if mikepath else None
 
     if not os.path.isdir(outfolder):
         os.makedirs(outfolder)
 
     shapefile_path = pathlib.Path(shapefile)
     shapefile_name = shapefile_path.stem
-  
-    pts = read_shapefile_pts(shapefile)
+
+    # granules and tables are written as tables, shapefiles as shapefiles
+    # unless another format is asked for
+    suffix = shapefile_path.suffix.lower()
+    if suffix in atl.SUFFIXES:
+        output_format = output_format or "parquet"
+    elif suffix in columnar.FORMATS:
+        output_format = output_format or columnar.FORMATS[suffix]
+    output_format = output_format or "shp"
+    if output_format == "shp" and suffix != ".shp":
+        raise ValueError(f"Shapefile output needs a shapefile input, not {shapefile}.")
+
+    extension = columnar.EXTENSIONS.get(output_format, ".shp")
+    outfilename = "_".join([shapefile_name, level, "tides" + extension])
+    outfile = os.path.join(outfolder, outfilename)
 
     tempfolder = os.path.join(outfolder, "temp")
     os.makedirs(tempfolder, exist_ok=True)
-    generate_pfs(pts, mikepath, tempfolder)
-
-    temp_pfs_path = str(list(pathlib.Path(tempfolder).glob("*.pfs"))[0])
-    make_dfs0(mikepath, temp_pfs_path)
-
-    temp_dfs0_path = str(list(pathlib.Path(tempfolder).glob("*.dfs0"))[0])
-    tv = tide_values_from_dfs0(mikepath, pts, temp_dfs0_path, level)
-
-    outfilename = "_".join([shapefile_name, level, "tides.shp"])
-    outfile = os.path.join(outfolder, outfilename)
+    constituents_path = find_constituents(mikepath, constituents)
+    options = dict(
+        backend=backend,
+        window=window,
+        workers=workers,
+        timestep=timestep,
+        interpolation=interpolation,
+        dedupe=dedupe,
+        dedupe_seconds=dedupe_seconds,
+    )
 
-    crs, driver, schema = read_shapefile_props(shapefile)
-    write_pts(pts, tv, crs, driver, schema, outfile)
+    if suffix in atl.SUFFIXES:
+        process_granule(
+            shapefile,
+            outfile,
+            level,
+            constituents_path,
+            mikepath,
+            tempfolder,
+            beams,
+            variables,
+            chunksize,
+            **options,
+        )
+    elif output_format != "shp":
+        if suffix in columnar.FORMATS:
+            chunks = columnar.read_table_chunks(shapefile, chunksize)
+        elif chunksize:
+            chunks = map(feature_columns, read_shapefile_chunks(shapefile, chunksize))
+        else:
+            chunks = [feature_columns(read_shapefile_pts(shapefile))]
+        process_table(
+            chunks, outfile, level, constituents_path, mikepath, tempfolder, **options
+        )
+    elif chunksize:
+        crs, driver, schema = read_shapefile_props(shapefile)
+        # only one chunk of features and series is held in memory at a time
+        with fiona.open(
+            outfile, "w", crs=crs, driver=driver, schema=tide_schema(schema)
+        ) as dst:
+            for pts in read_shapefile_chunks(shapefile, chunksize):
+                tv = point_tide_values(
+                    pts, level, constituents_path, mikepath, tempfolder, **options
+                )
+                append_pts(dst, pts, tv)
+    else:
+        crs, driver, schema = read_shapefile_props(shapefile)
+        pts = read_shapefile_pts(shapefile)
+        tv = point_tide_values(
+            pts, level, constituents_path, mikepath, tempfolder, **options
+        )
+        write_pts(pts, tv, crs, driver, schema, outfile)
 
     shutil.rmtree(tempfolder)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Land masks of node rasters, cut from a (global) land polygon file.
+
+The bounding boxes of all land features are read once and kept as an index
+in the tidepods cache directory, so later runs only read the features whose
+boxes overlap the raster. The rasterized mask of each node raster grid is
+cached as well, so masking a tile that was masked before reads neither.
+"""
+import hashlib
+import os
+
+import fiona
+import numpy as np
+from rasterio import features
+from rasterio.transform import array_bounds
+from shapely.geometry import shape
+
+from tidepods import cache, profiling
+
+_indexes = {}
+
+
+def _save(path, save, *args, **kwargs):
+    """Write a cache file under a temporary name and move it into place."""
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp{path.suffix}")
+    save(tmp, *args, **kwargs)
+    os.replace(tmp, path)
+
+
+@profiling.profiled(items=lambda result, *args, **kwargs: len(result[0]))
+def feature_index(landmask):
+    """
+    Feature ids and bounding boxes of a land polygon file.
+
+    Parameters
+    ----------
+    landmask : str
+        Path to the land polygons, e.g. a shapefile, in EPSG:4326.
+
+    Returns
+    -------
+    fids : Array
+        int64 feature ids.
+    bounds : Array
+        Feature bounds (minx, miny, maxx, maxy), shape (features, 4).
+
+    """
+    fingerprint = cache.file_fingerprint(landmask)
+    if fingerprint not in _indexes:
+        path = cache.cache_dir("landmask") / (fingerprint + ".index.npz")
+        if not path.exists():
+            fids, bounds = [], []
+            with fiona.open(landmask) as src:
+                for fid, f in src.items():
+                    if f["geometry"] is not None:
+                        fids.append(fid)
+                        bounds.append(shape(f["geometry"]).bounds)
+            _save(
+                path,
+                np.savez,
+                fids=np.asarray(fids, dtype=np.int64),
+                bounds=np.asarray(bounds, dtype=np.float64).reshape(-1, 4),
+            )
+        with np.load(path) as index:
+            _indexes[fingerprint] = index["fids"], index["bounds"]
+
+    return _indexes[fingerprint]
+
+
+def query_features(landmask, bounds):
+    """
+    Land features whose bounding boxes overlap bounds.
+
+    Parameters
+    ----------
+    landmask : str
+        Path to the land polygons in EPSG:4326.
+    bounds : tuple
+        (minx, miny, maxx, maxy) in EPSG:4326.
+
+    Returns
+    -------
+    geometries : list
+        GeoJSON-like geometries of the overlapping features.
+
+    """
+    fids, boxes = feature_index(landmask)
+    minx, miny, maxx, maxy = bounds
+    hits = fids[
+        (boxes[:, 0] <= maxx)
+        & (boxes[:, 2] >= minx)
+        & (boxes[:, 1] <= maxy)
+        & (boxes[:, 3] >= miny)
+    ]
+    with fiona.open(landmask) as src:
+        return [src[int(fid)]["geometry"] for fid in hits]
+
+
+def grid_key(landmask, profile):
+    """Cache key of the mask of a land polygon file on a raster grid."""
+    t = profile["transform"]
+    grid = (t.a, t.b, t.c, t.d, t.e, t.f, int(profile["width"]), int(profile["height"]))
+    h = hashlib.sha1(cache.file_fingerprint(landmask).encode())
+    h.update(np.asarray(grid, dtype=np.float64).tobytes())
+
+    return h.hexdigest()[:16]
+
+
+@profiling.profiled(items=lambda result, *args, **kwargs: result.size)
+def land_mask(landmask, profile):
+    """
+    Land pixels of a raster grid, cached per grid.
+
+    A pixel is land if its centre falls within a land polygon.
+
+    Parameters
+    ----------
+    landmask : str
+        Path to the land polygons in EPSG:4326.
+    profile : Dictionary
+        Profile of the raster, in EPSG:4326, e.g. from rasterize_points().
+
+    Returns
+    -------
+    mask : Array
+        Boolean array, shape (height, width), True on land.
+
+    """
+    path = cache.cache_dir("landmask") / (grid_key(landmask, profile) + ".npy")
+    if path.exists():
+        return np.load(path)
+
+    out_shape = (int(profile["height"]), int(profile["width"]))
+    west, south, east, north = array_bounds(*out_shape, profile["transform"])
+    geometries = query_features(landmask, (west, south, east, north))
+    if geometries:
+        mask = features.geometry_mask(
+            geometries, out_shape=out_shape, transform=profile["transform"], invert=True
+        )
+    else:
+        mask = np.zeros(out_shape, dtype=bool)
+    _save(path, np.save, mask)
+
+    return mask
@@ -1,103 +1,18 @@
-import datetime
 import os
+import shutil
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 
-def generate_pfs(pts, meta, mikepath, tempdir):
-    """Generate a pfs file using DHI.PFS.
+from tidepods import dfs0, profiling
 
-    Parameters
-    ----------
-    pts : list
-        List of shapely points generated by create_pts().
-    meta : dictionary
-        Metadata dictionary created by read_meta().
-    mikepath : pathlib Path
-        Path to MIKE installation directory.
-    tempdir : str
-        Path to the temporary working directory.
-
-    Raises
-    ------
-    ValueError
-        If DHI.PFS could not be imported or is not found in the mike folder.
-    ValueError
-        If the PFS file could not be created.
-
-    """
-    date = datetime.datetime.strptime(meta["sensing_time"], "%Y-%m-%dT%H:%M:%S")
-    temppfs = os.path.join(tempdir, "temp.pfs")
-
-    dhi_pfs_path = list(mikepath.glob("**/Mike SDK/**/*DHI.PFS.dll"))[0]
-    constituents_path = list(
-        mikepath.glob("**/global_tide_constituents_height_0.125deg.dfs2")
-    )[0]
-    prepack_path = list(mikepath.glob("**/Tide_Constituents/prepack.dat"))[0]
-
-    import clr
-    import System
-
-    try:
-        clr.AddReference(str(dhi_pfs_path))
-        import DHI.PFS
-
-    except (ImportError, System.IO.FileNotFoundException) as exception:
-        msg = f'DHI.PFS not found. Is the path correct: "{dhi_pfs_path}"?'
-        raise ValueError(msg) from exception
-
-    # Begin PFS Generation Parameters using DHI.PFS.PFSBuilder
-
-    pfsbuilder = DHI.PFS.PFSBuilder()
-
-    pfsbuilder.AddTarget("TidePredictor")  # First Section
-
-    pfsbuilder.AddKeyword("Name")
-    pfsbuilder.AddString(str(meta["tile_id"]))
-    pfsbuilder.AddKeyword("constituent_file_name")
-    pfsbuilder.AddString(str(constituents_path))
-    pfsbuilder.AddKeyword("prepack_file_name")
-    pfsbuilder.AddString(str(prepack_path))
-    pfsbuilder.AddKeyword("start_date")
-    DHI.PFS.PFSExtensions.AddDate(pfsbuilder, System.DateTime(date.year, 1, 1))
-    pfsbuilder.AddKeyword("end_date")
-    DHI.PFS.PFSExtensions.AddDate(pfsbuilder, System.DateTime(date.year, 12, 31))
-    pfsbuilder.AddKeyword("timestep")
-    pfsbuilder.AddDouble(0.5)
-    pfsbuilder.AddKeyword("number_of_files")
-    pfsbuilder.AddInt(1)
-    pfsbuilder.AddKeyword("ShowGeographic")
-    pfsbuilder.AddInt(1)
-
-    pfsbuilder.AddSection("File_1")  # File Section
-    pfsbuilder.AddKeyword("format")
-    pfsbuilder.AddInt(0)
-    pfsbuilder.AddKeyword("file_name")
-    pfsbuilder.AddFileName("temp.dfs0")
-    pfsbuilder.AddKeyword("description")
-    pfsbuilder.AddString("Predicted Tide Level")
-    pfsbuilder.AddKeyword("number_of_points")
-    pfsbuilder.AddInt(len(pts))
-
-    # Points section enumerated for each point generated within shapefile
-
-    for pid, p in enumerate(pts, 1):
-        pfsbuilder.AddSection("Point_" + str(pid))
-        pfsbuilder.AddKeyword("description")
-        pfsbuilder.AddInt(pid)
-        pfsbuilder.AddKeyword("y")
-        pfsbuilder.AddDouble(p.coords[0][1])
-        pfsbuilder.AddKeyword("x")
-        pfsbuilder.AddDouble(p.coords[0][0])
-        pfsbuilder.EndSection()
-
-    pfsbuilder.EndSection()
-    pfsbuilder.EndSection()
-    pfsbuilder.Write(temppfs)
-
-    if not os.path.exists(temppfs):
-        raise ValueError("PFS file not created. Recheck creation options.")
+# smallest number of points worth a TidePredictor run of its own
+MIN_SHARD_SIZE = 200
 
 
+@profiling.profiled()
 def make_dfs0(mikepath, pfsfile):
     """Generate a dfs0 file from the input PFS in the same directory.
 
@@ -110,23 +25,150 @@ def make_dfs0(mikepath, pfsfile):
 
     Raises
     ------
+    RuntimeError
+        If TidePredictor returned an error.
     ValueError
         If the DFS file could not be created.
     """
     tp = str(list(mikepath.glob("**/TidePredictor.exe"))[0])
+    dfsfile = pfsfile.replace(".pfs", ".dfs0")
+    # a dfs0 left by an earlier run would pass for the output of this one
+    if os.path.exists(dfsfile):
+        os.remove(dfsfile)
+
     cmd = [tp, pfsfile]
-    print(cmd)
-    try:
-        subprocess.check_call(cmd, shell=True)
-    except subprocess.CalledProcessError as e:
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode:
         raise RuntimeError(
             "command '{}' return with error (code {}): {}".format(
-                e.cmd, e.returncode, e.output
+                cmd, result.returncode, result.stderr or result.stdout
             )
         )
-    dfsfile = pfsfile.replace(".pfs", ".dfs0")
 
     if not os.path.exists(dfsfile):
         raise ValueError(
             f"DFS file not created. Please check that you are connected to the VPN and that the path to the tide predictor is correct: {tp}?"
         )
+
+
+@profiling.profiled(items=profiling.count_result)
+def read_dfs0(dfsfilepath):
+    """Read all predicted tide series from a TidePredictor dfs0 file.
+
+    Parameters
+    ----------
+    dfsfilepath : str
+        Path to the dfs file created by make_dfs0().
+
+    Returns
+    -------
+    levels : Array
+        Tide levels c.f. MSL, shape (points, times), in point order.
+
+    """
+    header, levels = dfs0.open_dfs0(dfsfilepath)
+
+    # copied out of the memory map, the shard folders are removed afterwards
+    return np.array(levels, dtype=np.float32)
+
+
+def shard_indices(npoints, workers=None):
+    """Split point indices into contiguous shards, at most one per worker.
+
+    Parameters
+    ----------
+    npoints : int
+        Number of points.
+    workers : int, optional
+        Maximum number of shards. The default is None, the number of CPUs.
+
+    Returns
+    -------
+    shards : list
+        Index arrays, in point order.
+
+    """
+    workers = workers or os.cpu_count() or 1
+    nshards = max(1, min(workers, -(-npoints // MIN_SHARD_SIZE)))
+
+    return np.array_split(np.arange(npoints), nshards)
+
+
+@profiling.profiled(items=profiling.count_arg())
+def predict_shards(pts, write_pfs, mikepath, tempdir, workers=None, read=read_dfs0):
+    """Run TidePredictor.exe concurrently on shards of the points.
+
+    Every shard gets its own PFS and dfs0 in a new sub directory of tempdir,
+    removed once read. The PFS files are written first, then the
+    TidePredictor runs are started together; each run is its own process, so
+    the pool threads only wait on them.
+
+    Parameters
+    ----------
+    pts : PointSet
+        Points to predict.
+    write_pfs : callable
+        Called as write_pfs(shard_pts, workdir) to write the PFS of a shard,
+        e.g. wrapping the generate_pfs() of the command.
+    mikepath : pathlib Path
+        Path to MIKE installation directory.
+    tempdir : str
+        Path to the temporary working directory.
+    workers : int, optional
+        Maximum number of concurrent TidePredictor runs. The default is None,
+        the number of CPUs.
+    read : callable, optional
+        Reads the dfs0 of a shard. The default is read_dfs0().
+
+    Returns
+    -------
+    results : list
+        The read() result of every shard, in point order.
+
+    """
+    os.makedirs(tempdir, exist_ok=True)
+    workdirs = []
+    try:
+        for k, shard in enumerate(shard_indices(len(pts), workers)):
+            # unique per call, so concurrent or earlier calls sharing tempdir
+            # never leave their files in this run
+            workdirs.append(tempfile.mkdtemp(prefix=f"shard_{k}_", dir=tempdir))
+            write_pfs(pts[shard], workdirs[-1])
+        pfsfiles = [os.path.join(workdir, "temp.pfs") for workdir in workdirs]
+
+        with ThreadPoolExecutor(max_workers=len(pfsfiles)) as executor:
+            runs = [executor.submit(make_dfs0, mikepath, path) for path in pfsfiles]
+            for run in runs:
+                run.result()
+
+        return [read(path.replace(".pfs", ".dfs0")) for path in pfsfiles]
+    finally:
+        for workdir in workdirs:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def concat_series(frames):
+    """Join the series DataFrames of the shards, numbering the points globally.
+
+    The PFS of every shard numbers its points from Point_1, so the columns are
+    renamed Point_1 to Point_N over all shards, as predict.tide_series() names
+    them.
+
+    Parameters
+    ----------
+    frames : list
+        DataFrames of the shards in point order, e.g. the
+        predict_shards(read=dfs0.to_dataframe) result.
+
+    Returns
+    -------
+    df : DataFrame
+        The series of all points, one "Point_N" column per point.
+
+    """
+    import pandas as pd
+
+    df = pd.concat(frames, axis=1)
+    df.columns = ["Point_" + str(pid) for pid in range(1, df.shape[1] + 1)]
+
+    return df
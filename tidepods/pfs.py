@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Write TidePredictor PFS files without DHI.PFS and the .NET runtime.
+
+The text follows the layout of DHI.PFS.PFSBuilder: three spaces of
+indentation per level, strings in single quotes, file names between pipes
+and every section closed by "EndSect  // <name>" and a blank line. The point
+sections are formatted from the coordinate arrays and streamed to disk in
+chunks.
+"""
+import datetime
+import pathlib
+
+INDENT = "   "
+
+# number of point sections formatted per write
+CHUNKSIZE = 10000
+
+POINT_SECTION = (
+    "      [Point_{n}]\n"
+    "         description = {pid}\n"
+    "         y = {y}\n"
+    "         x = {x}\n"
+    "      EndSect  // Point_{n}\n"
+    "\n"
+)
+
+
+def format_double(value):
+    """Shortest round-trip text of a double, as written by .NET."""
+    text = repr(float(value))
+    if text.endswith(".0"):
+        text = text[:-2]
+    return text.replace("e", "E")
+
+
+def format_value(value):
+    """
+    PFS text of a keyword value.
+
+    Parameters
+    ----------
+    value : str, int, float, datetime or pathlib Path
+        Strings are quoted, paths are written as file names and datetimes as
+        the six comma separated date/time fields.
+
+    Returns
+    -------
+    text : str
+
+    """
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        fields = (value.year, value.month, value.day)
+        fields += (value.hour, value.minute, value.second)
+        return ", ".join(str(v) for v in fields)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return format_double(value)
+    if hasattr(value, "__fspath__"):
+        return f"|{value}|"
+
+    return f"'{value}'"
+
+
+def _keywords(level, keywords):
+    """Keyword lines of a section."""
+    return "".join(
+        f"{INDENT * level}{key} = {format_value(value)}\n"
+        for key, value in keywords.items()
+    )
+
+
+def tide_files(mikepath):
+    """
+    Locate the TidePredictor constituent and prepack files.
+
+    Parameters
+    ----------
+    mikepath : pathlib Path
+        Path to MIKE installation directory.
+
+    Returns
+    -------
+    constituents_path, prepack_path : pathlib Path
+
+    Raises
+    ------
+    ValueError
+        If one of the files could not be found.
+
+    """
+    constituents_path = next(
+        mikepath.glob("**/global_tide_constituents_height_0.125deg.dfs2"), None
+    )
+    prepack_path = next(mikepath.glob("**/Tide_Constituents/prepack.dat"), None)
+    if constituents_path is None or prepack_path is None:
+        raise ValueError(f"Tide constituent files not found in {mikepath}.")
+
+    return constituents_path, prepack_path
+
+
+def write_tidepredictor_pfs(
+    path,
+    pts,
+    constituents_path,
+    prepack_path,
+    start,
+    end,
+    timestep=0.5,
+    name=None,
+    dfs0_name="temp.dfs0",
+):
+    """
+    Write the TidePredictor PFS of a set of points.
+
+    Parameters
+    ----------
+    path : str
+        Output PFS file.
+    pts : PointSet
+        Points to predict.
+    constituents_path : pathlib Path
+        Path to the global tide constituent dfs2.
+    prepack_path : pathlib Path
+        Path to the TidePredictor prepack.dat.
+    start, end : datetime
+        Start and end of the predicted series.
+    timestep : float, optional
+        Timestep in hours. The default is 0.5.
+    name : str, optional
+        Value of the Name keyword. The default is None, which leaves it empty.
+    dfs0_name : str, optional
+        Output dfs0 file name, relative to the PFS. The default is "temp.dfs0".
+
+    """
+    header = {
+        "Name": name,
+        "constituent_file_name": str(constituents_path),
+        "prepack_file_name": str(prepack_path),
+        "start_date": start,
+        "end_date": end,
+        "timestep": float(timestep),
+        "number_of_files": 1,
+        "ShowGeographic": 1,
+    }
+    file_section = {
+        "format": 0,
+        "file_name": pathlib.PurePath(dfs0_name),
+        "description": "Predicted Tide Level",
+        "number_of_points": len(pts),
+    }
+
+    with open(path, "w", newline="\r\n") as f:
+        f.write(f"// Created     : {datetime.datetime.now():%Y-%m-%d %H:%M:%S}\n")
+        f.write("// Created by  : tidepods\n\n")
+        f.write("[TidePredictor]\n")
+        f.write(_keywords(1, header))
+        f.write(f"{INDENT}[File_1]\n")
+        f.write(_keywords(2, file_section))
+
+        ids = pts.ids.tolist()
+        lon = pts.lon.tolist()
+        lat = pts.lat.tolist()
+        for i in range(0, len(pts), CHUNKSIZE):
+            f.write(
+                "".join(
+                    POINT_SECTION.format(
+                        n=n, pid=pid, y=format_double(y), x=format_double(x)
+                    )
+                    for n, pid, x, y in zip(
+                        range(i + 1, i + CHUNKSIZE + 1),
+                        ids[i : i + CHUNKSIZE],
+                        lon[i : i + CHUNKSIZE],
+                        lat[i : i + CHUNKSIZE],
+                    )
+                )
+            )
+
+        f.write(f"{INDENT}EndSect  // File_1\n\n")
+        f.write("EndSect  // TidePredictor\n\n")
+
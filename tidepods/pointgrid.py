@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Generate the regular grid of prediction points within an AOI.
+"""
+import numpy as np
+import rasterio.transform
+import shapely
+
+# number of grid points tested for containment at once
+BLOCKSIZE = 2 ** 20
+
+
+def _contains_xy(shp):
+    """Bulk point-in-polygon test for a prepared geometry."""
+    if hasattr(shapely, "contains_xy"):
+        shapely.prepare(shp)
+        return lambda x, y: shapely.contains_xy(shp, x, y)
+
+    # shapely < 2.0
+    from shapely import vectorized
+    from shapely.prepared import prep
+
+    prepared = prep(shp)
+    return lambda x, y: vectorized.contains(prepared, x, y)
+
+
+def _points_within(shp, xs, ys):
+    """Points of the xs, ys lattice within shp, tested in blocks."""
+    contains = _contains_xy(shp)
+
+    lon, lat = [], []
+    ncols = max(1, BLOCKSIZE // max(len(ys), 1))
+    for i in range(0, len(xs), ncols):
+        x, y = np.meshgrid(xs[i : i + ncols], ys, indexing="ij")
+        x, y = x.ravel(), y.ravel()
+        inside = contains(x, y)
+        lon.append(x[inside])
+        lat.append(y[inside])
+
+    lon = np.concatenate(lon) if lon else np.empty(0)
+    lat = np.concatenate(lat) if lat else np.empty(0)
+
+    if not len(lon):
+        raise ValueError(
+            "No points generated. Is the input file covering a large enough AOI?"
+        )
+
+    return lon, lat
+
+
+def grid_points(shp, spacing, offset=0.0):
+    """
+    Fixed distance points within a polygon, as coordinate arrays.
+
+    The candidate points are built with NumPy and tested against the prepared
+    polygon in blocks, so the run time scales with the number of points and
+    not with a Python loop per point. Points are ordered as by the original
+    x-then-y double loop.
+
+    Parameters
+    ----------
+    shp : shapely object
+        AOI polygon in EPSG:4326.
+    spacing : float
+        Point spacing in degrees.
+    offset : float, optional
+        Inset of the first and last point from the polygon bounds. The
+        default is 0.
+
+    Returns
+    -------
+    lon, lat : Array
+        float64 coordinates of the points within the polygon.
+
+    Raises
+    ------
+    ValueError
+        If no points have been generated.
+
+    """
+    minx, miny, maxx, maxy = shp.bounds
+    xs = np.arange(minx + offset, maxx - offset, spacing)
+    ys = np.arange(miny + offset, maxy - offset, spacing)
+
+    return _points_within(shp, xs, ys)
+
+
+def lattice_points(shp, grid):
+    """
+    Nodes of the constituent grid within a polygon.
+
+    Unlike grid_points(), the lattice does not depend on the polygon bounds,
+    so overlapping AOIs get identical coordinates and can share predictions.
+
+    Parameters
+    ----------
+    shp : shapely object
+        AOI polygon in EPSG:4326.
+    grid : dictionary
+        Constituent grid from constituents.load_grid(), its nodes at
+        x0 + k * dx, y0 + k * dy.
+
+    Returns
+    -------
+    lon, lat : Array
+        float64 coordinates of the lattice nodes within the polygon.
+
+    Raises
+    ------
+    ValueError
+        If no points have been generated.
+
+    """
+    minx, miny, maxx, maxy = shp.bounds
+    x0, y0, dx, dy = grid["x0"], grid["y0"], grid["dx"], grid["dy"]
+    # coordinates are computed from integer node indices so they are
+    # bit-identical for every AOI
+    cols = np.arange(np.ceil((minx - x0) / dx), np.floor((maxx - x0) / dx) + 1)
+    rows = np.arange(np.ceil((miny - y0) / dy), np.floor((maxy - y0) / dy) + 1)
+    xs = x0 + cols * dx
+    ys = y0 + rows * dy
+
+    return _points_within(shp, xs, ys)
+
+
+def lattice_transform(grid, bounds):
+    """
+    Raster with one cell centred on each grid node, enclosing bounds.
+
+    The raster of the points of lattice_points(), whose nodes are not on a
+    lattice starting at the AOI bounds.
+
+    Parameters
+    ----------
+    grid : dictionary
+        Constituent grid from constituents.load_grid().
+    bounds : tuple
+        (minx, miny, maxx, maxy) in EPSG:4326.
+
+    Returns
+    -------
+    transform : Affine
+        North-up transform, cell edges half a step from the nodes.
+    shape : tuple
+        Raster size (rows, cols).
+
+    """
+    minx, miny, maxx, maxy = bounds
+    x0, y0, dx, dy = grid["x0"], grid["y0"], grid["dx"], grid["dy"]
+    # first and last node whose cell overlaps the bounds
+    col0 = np.floor((minx - x0) / dx + 0.5)
+    col1 = np.ceil((maxx - x0) / dx - 0.5)
+    row0 = np.floor((miny - y0) / dy + 0.5)
+    row1 = np.ceil((maxy - y0) / dy - 0.5)
+
+    transform = rasterio.transform.from_origin(
+        x0 + (col0 - 0.5) * dx, y0 + (row1 + 0.5) * dy, dx, dy
+    )
+
+    return transform, (int(row1 - row0) + 1, int(col1 - col0) + 1)
+
+
+def scatter(lon, lat, values, transform, shape, fill=np.nan):
+    """
+    Burn point values into the cells of a north-up raster.
+
+    The replacement for features.rasterize() of the points of grid_points()
+    or lattice_points(): the cell of each point is computed from the
+    transform and the values are assigned with NumPy indexing, without
+    building a geometry per point. As with rasterize(), a point on a cell
+    edge falls into the cell to its lower right, later points overwrite
+    earlier ones and points outside the raster are left out.
+
+    Parameters
+    ----------
+    lon, lat : Array
+        Point coordinates in the CRS of the raster.
+    values : Array
+        Values of the points, shape (points,) or (bands, points).
+    transform : Affine
+        North-up transform of the raster.
+    shape : tuple
+        Raster size (rows, cols).
+    fill : float, optional
+        Value of cells without a point. The default is NaN.
+
+    Returns
+    -------
+    image : Array
+        float64 raster, shape shape or (bands, rows, cols).
+
+    """
+    values = np.asarray(values, dtype=np.float64)
+    cols = np.floor((np.asarray(lon) - transform.c) / transform.a).astype(np.int64)
+    rows = np.floor((np.asarray(lat) - transform.f) / transform.e).astype(np.int64)
+    inside = (rows >= 0) & (rows < shape[0]) & (cols >= 0) & (cols < shape[1])
+
+    image = np.full(values.shape[:-1] + tuple(shape), fill, dtype=np.float64)
+    image[..., rows[inside], cols[inside]] = values[..., inside]
+
+    return image
+
+
+def _ncols(grid):
+    """Number of grid nodes around the globe."""
+    return int(round(360.0 / grid["dx"]))
+
+
+def cell_ids(grid, lon, lat):
+    """
+    Stable global ids of the constituent grid cells of points.
+
+    Parameters
+    ----------
+    grid : dictionary
+        Constituent grid from constituents.load_grid().
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+
+    Returns
+    -------
+    ids : Array
+        int64 id row * ncols + col of the nearest grid node, counted from the
+        grid origin, with ncols the number of nodes around the globe.
+
+    """
+    ncols = _ncols(grid)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    col = np.mod(np.rint((lon - grid["x0"]) / grid["dx"]), ncols)
+    row = np.rint((lat - grid["y0"]) / grid["dy"])
+
+    return row.astype(np.int64) * ncols + col.astype(np.int64)
+
+
+def cell_coordinates(grid, ids):
+    """
+    Coordinates of the grid nodes of cell ids, the inverse of cell_ids().
+
+    Parameters
+    ----------
+    grid : dictionary
+        Constituent grid from constituents.load_grid().
+    ids : Array
+        Cell ids from cell_ids().
+
+    Returns
+    -------
+    lon, lat : Array
+        float64 coordinates of the grid nodes.
+
+    """
+    row, col = np.divmod(np.asarray(ids, dtype=np.int64), _ncols(grid))
+
+    return grid["x0"] + col * grid["dx"], grid["y0"] + row * grid["dy"]
@@ -5,33 +5,36 @@ Created on March 13 2022
 @autor: ansu
 """
 import pathlib
-from pathlib import Path
 import xml.etree.ElementTree as ET
 import numpy as np
 from affine import Affine
-from shapely.geometry import box, Point, shape, mapping
+from shapely.geometry import shape
 import fiona
 from fiona.crs import from_epsg
 import datetime
 import os
-import subprocess
 import rasterio
-from rasterio import features
 import shutil
 import matplotlib
 import matplotlib.pyplot as plt
-from rasterio.io import MemoryFile
 from rasterio.transform import Affine
 import rasterio.warp
 import rasterio.mask
 from datetime import datetime as dt
-import mikeio
-from mikeio import Dfs0, Dataset
+
+from tidepods import aoi, datums, dfs0, pfs, pointgrid, predict, profiling, surface
+from tidepods.constituents import find_constituents, load_grid
+from tidepods.make_pfs import concat_series, predict_shards
+from tidepods.pointset import PointSet
 
 
 # import ipdb; ipdb.set_trace()
 
+# bands of the datum raster
+DATUMS = ["MSL", "LAT", "HAT"]
+
 
+@profiling.profiled()
 def read_meta(infile):
     """
     Read metadata xml file of Sentinel 2 tile.
@@ -95,119 +98,74 @@ def make_profile(meta):
     return profile
 
 
-def make_ds_array(profile):
-    """
-    Create an empty numpy array of the needed shape as per the profile.
-
-    Parameters
-    ----------
-    profile : Dictionary
-        The rasterio profile created by make_profile().
-
-    Returns
-    -------
-    ds : Array
-        Empty numpy array.
-
+@profiling.profiled()
+def get_dataset_outline(profile, target_epsg=4326, buffer=0.25):
     """
-    ds = np.empty(
-        [int(profile["width"]), int(profile["height"])], dtype=profile["dtype"]
-    )
-    ds = ds[np.newaxis, :, :]
-
-    return ds
+    Get the outline of the target grid, reproject and buffer if wanted.
 
-
-def get_dataset_outline(dataset, profile, target_epsg=4326, buffer= 0.25):
-    """
-    Get the outline of the input raster dataset, reporject and buffer if wanted.
+    The outline is computed from the transform and size in the profile, see
+    aoi.outline(), so no raster of the grid is created.
 
     Parameters
     ----------
-    dataset : Array
-        Numpy array as created by make_ds_array().
     profile : Dictionary
-        The rasterio profile created by make_profile()..
+        The rasterio profile created by make_profile().
     target_epsg : Integer, optional
         The target EPSG code. The default is 4326.
     buffer : Float, optional
         The wanted buffer to be added to the shape. The value should be
         consistent with the given EPSG. i.e. give buffer size in degrees for
-        EPSG 4326. The default is 0.125.
+        EPSG 4326. The default is 0.25.
 
     Returns
     -------
     shp : Shapely object
-        Input dataset AOI bounds as a shapely polygon object.
+        Target grid AOI as a shapely polygon object.
 
     """
-    with MemoryFile() as memfile:
-        with memfile.open(**profile) as ds:
-            ds.write(dataset)
-
-    left, bottom, right, top = ds.bounds
-    in_crs = ds.crs
-
-    if target_epsg is None:
-        shp = box(left, bottom, right, top)
-
-    else:
-        out_crs = rasterio.crs.CRS.from_epsg(target_epsg)
-        minx, miny, maxx, maxy = rasterio.warp.transform_bounds(
-            in_crs, out_crs, left, bottom, right, top
-        )
-        shp = box(minx, miny, maxx, maxy)
-
-    if buffer:
-        shp = shp.buffer(buffer, join_style=2)
-
-    return shp
+    return aoi.outline(profile, target_epsg, buffer)
 
 
-def create_pts(shp, spacing):
+@profiling.profiled(items=lambda result, *args, **kwargs: len(result[0]))
+def create_pts(shp, spacing, grid=None):
     """Generate fixed distance points within a polygon.
 
     Parameters
     ----------
-    infile : str
-        Path to polygon or raster AOI.
+    shp : shapely object
+        AOI polygon in EPSG:4326.
+    spacing : float
+        Point spacing in degrees.
+    grid : dictionary, optional
+        Constituent grid from constituents.load_grid(). If given, the points
+        are its nodes within shp, see pointgrid.lattice_points(), instead of
+        a lattice starting at the AOI bounds. The default is None.
 
     Returns
     -------
-    plist : list
-        List of shapely points for points within infile.
+    lon, lat : Array
+        Coordinates of the points within shp.
 
     Raises
     ------
     ValueError
-        If plist is empty as no points have been generated.
+        If no points have been generated.
 
     """
-    bounds = shp.bounds
-    minx, miny, maxx, maxy = bounds
-    plist = []
-    offset = spacing / 2
-    for x in np.arange(minx + offset, maxx - offset, spacing):
-        for y in np.arange(miny + offset, maxy - offset, spacing):
-            p = Point(x, y)
-            if p.within(shp):
-                plist.append(p)
-
-    if not plist:
-        raise ValueError(
-            "No points generated. Is the input file covering a large enough AOI?"
-        )
+    if grid is not None:
+        return pointgrid.lattice_points(shp, grid)
 
-    return plist
+    return pointgrid.grid_points(shp, spacing, offset=spacing / 2)
 
 
+@profiling.profiled(items=profiling.count_arg())
 def generate_pfs(pts, meta, mikepath, tempdir, date):
-    """Generate a pfs file using DHI.PFS.
+    """Generate the TidePredictor pfs file.
 
     Parameters
     ----------
-    pts : list
-        List of shapely points generated by create_pts().
+    pts : PointSet
+        Points to predict, e.g. from create_pts().
     meta : dictionary
         Metadata dictionary created by read_meta().
     mikepath : pathlib Path
@@ -218,277 +176,93 @@ def generate_pfs(pts, meta, mikepath, tempdir, date):
     Raises
     ------
     ValueError
-        If DHI.PFS could not be imported or is not found in the mike folder.
+        If the tide constituent files are not found in the mike folder.
     ValueError
         If the PFS file could not be created.
 
     """
-
     temppfs = os.path.join(tempdir, "temp.pfs")
 
-    dhi_pfs_path = list(mikepath.glob("**/Mike SDK/**/*DHI.PFS.dll"))[0]
-
-    constituents_path = list(
-        mikepath.glob("**/global_tide_constituents_height_0.125deg.dfs2")
-    )[0]
-    prepack_path = list(mikepath.glob("**/Tide_Constituents/prepack.dat"))[0]
-
-    import clr
-    import System
-
-    try:
-        clr.AddReference(str(dhi_pfs_path))
-        import DHI.PFS
-
-    except (ImportError, System.IO.FileNotFoundException) as exception:
-        msg = f'DHI.PFS not found. Is the path correct: "{dhi_pfs_path}"?'
-        raise ValueError(msg) from exception
-
-    # Begin PFS Generation Parameters using DHI.PFS.PFSBuilder
-
-    pfsbuilder = DHI.PFS.PFSBuilder()
-
-    pfsbuilder.AddTarget("TidePredictor")  # First Section
-
-    pfsbuilder.AddKeyword("Name")
-    #pfsbuilder.AddString(str(meta["tile_id"]))
-    pfsbuilder.AddKeyword("constituent_file_name")
-    pfsbuilder.AddString(str(constituents_path))
-
-    pfsbuilder.AddKeyword("prepack_file_name")
-    pfsbuilder.AddString(str(prepack_path))
-
-    pfsbuilder.AddKeyword("start_date")
-    DHI.PFS.PFSExtensions.AddDate(pfsbuilder, System.DateTime(date.year-1, date.month, date.day))
-    pfsbuilder.AddKeyword("end_date")
-    DHI.PFS.PFSExtensions.AddDate(pfsbuilder, System.DateTime(date.year, date.month, date.day))
-    pfsbuilder.AddKeyword("timestep")
-    pfsbuilder.AddDouble(24)
-
-    pfsbuilder.AddKeyword("number_of_files")
-    pfsbuilder.AddInt(1)
-
-    pfsbuilder.AddKeyword("ShowGeographic")
-    pfsbuilder.AddInt(1)
-
-    pfsbuilder.AddSection("File_1")  # File Section
-    pfsbuilder.AddKeyword("format")
-    pfsbuilder.AddInt(0)
-    pfsbuilder.AddKeyword("file_name")
-    pfsbuilder.AddFileName("temp.dfs0")
-    pfsbuilder.AddKeyword("description")
-    pfsbuilder.AddString("Predicted Tide Level")
-    pfsbuilder.AddKeyword("number_of_points")
-    pfsbuilder.AddInt(len(pts))
-
-    # Points section enumerated for each point generated within shapefile
-
-    for pid, p in enumerate(pts, 1):
-        pfsbuilder.AddSection("Point_" + str(pid))
-        pfsbuilder.AddKeyword("description")
-        pfsbuilder.AddInt(pid)
-        pfsbuilder.AddKeyword("y")
-        pfsbuilder.AddDouble(p.coords[0][1])
-        pfsbuilder.AddKeyword("x")
-        pfsbuilder.AddDouble(p.coords[0][0])
-        pfsbuilder.EndSection()
-
-    pfsbuilder.EndSection()
-    pfsbuilder.EndSection()
-    pfsbuilder.Write(temppfs)
+    start = datetime.datetime(date.year - 1, date.month, date.day)
+    end = datetime.datetime(date.year, date.month, date.day)
+    constituents_path, prepack_path = pfs.tide_files(mikepath)
+    pfs.write_tidepredictor_pfs(
+        temppfs, pts, constituents_path, prepack_path, start, end, timestep=24
+    )
 
     if not os.path.exists(temppfs):
         raise ValueError("PFS file not created. Recheck creation options.")
-        
-  
-
-def make_dfs0(mikepath, pfsfile):
-
-    """Generate a dfs0 file from the input PFS in the same directory.
-
-    Parameters
-    ----------
-    mikepath : str
-        Path to MIKE installation directory.
-    pfsfile : str
-        Path to PFS file.
-
-    Raises
-    ------
-    ValueError
-        If the DFS file could not be created.
-    """
-    tp = str(list(mikepath.glob("**/TidePredictor.exe"))[0])
-    cmd = [tp, pfsfile]
-    
-    try:
-        subprocess.check_call(cmd, shell=True)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(
-            "command '{}' return with error (code {}): {}".format(
-                e.cmd, e.returncode, e.output
-            )
-        )
-    dfsfile = pfsfile.replace(".pfs", ".dfs0")
-
-    if not os.path.exists(dfsfile):
-        raise ValueError(
-            f"DFS file not created. Please check that you are connected to the VPN and that the path to the tide predictor is correct: {tp}."
-        )
 
 
-def tide_values_from_dfs0(mikepath, meta, dfsfilepath, date, df):
-    """Read and extract values from dfs0 file using DHI.Generic.MikeZero.DFS.
-
-    Parameters
-    ----------
-    mikepath : str
-        Path to MIKE installation directory.
-    meta : dictionary
-        Metadata dictionary created by read_meta().
-    dfsfilepath : str
-        Path to the dfs file created by make_dfs0().
-
-    Returns
-    -------
-    tide_values : list
-        List of tide values for image acquisiton date and time.
-
-    Raises
-    ------
-
-
-    ValueError
-        If DHI.Generic could not be imported or is not found in the sdkpath folder.
-    ValueError
-        If no tide values could be generated.
-
-    """
-
-
-    import clr
-
-    clr.AddReference("System")
-    import System
-
-    generic_mike_zero_path = list(
-        mikepath.glob("**/Mike SDK/**/*DHI.Generic.MikeZero.DFS.dll")
-    )[0]
-    try:
-        clr.AddReference(str(generic_mike_zero_path))
-        import DHI.Generic.MikeZero.DFS
-
-    except (ImportError, System.IO.FileNotFoundException) as exception:
-        msg = f'DHI.Generic not found. Is the path to the mike installation directory correct: "{mikepath}"?'
-        raise ValueError(msg) from exception
-
-    #dfs_img_datetime = datetime.datetime.strptime(
-    #    meta["sensing_time"], "%Y-%m-%dT%H:%M:%S"
-    #)
-          
-    dfs_img_datetime = date
-    dfsfile = DHI.Generic.MikeZero.DFS.DfsFileFactory.DfsGenericOpen(dfsfilepath)    
-  
-    # read timestep in seconds, convert to minutes
-    timestep = int(dfsfile.FileInfo.TimeAxis.TimeStep)
-    sdt = dfsfile.FileInfo.TimeAxis.StartDateTime
-
-    dfs_start_datetime = datetime.datetime(
-        *(getattr(sdt, n) for n in ["Year", "Month", "Day", "Hour", "Minute", "Second"]))
-
-    print("dfs_start_datetime", dfs_start_datetime)
-    print("dfs_img_datetime", dfs_img_datetime)
-
-    diff = dfs_img_datetime - dfs_start_datetime
-
-    
-    tide_values_lat = []
-    tide_values_hat = []
-    for i in range(len(dfsfile.ItemInfo)):
-        min_value = float(dfsfile.ItemInfo[i].MinValue)
-        max_value = float(dfsfile.ItemInfo[i].MaxValue)
-        tide_values_lat.append(min_value)
-        tide_values_hat.append(max_value) 
-
-    tide_values_msl = []   
-    for (columnName, columnData) in df.iteritems():
-        msl_value = columnData.mean()
-        tide_values_msl.append(msl_value) 
-
-    dfsfile.Dispose()
-
-    return tide_values_msl, tide_values_lat, tide_values_hat, 
-
-
-def write_tide_values(tv_MSL,tv_LAT,tv_HAT, plist, outfile, outfolder):
+@profiling.profiled(items=profiling.count_arg(3))
+def write_tide_values(tv_MSL,tv_LAT,tv_HAT, pts, outfile, outfolder):
     """Write generated points and tide values to a new shapefile.
 
     Parameters
     ----------
-    tide_values : list
-        List of tide values generated by tide_values_from_dfs0().
-    plist : list
-        List of shapely points generated by create_pts()
-
-    Returns
-    -------
-    ms : Fiona collection
-        Points
+    tv_MSL, tv_LAT, tv_HAT : list
+        MSL, LAT and HAT of each point.
+    pts : PointSet
+        Points generated by create_pts().
+    outfile : str
+        Path to the output shapefile.
+    outfolder : str
+        Path to the output folder.
 
     """
     pts_schema = {
         "geometry": "Point",
         "properties": {"p_ID": "int", "MSL": "float",
                        "LAT": "float", "HAT": "float"}}
-    mem_file = fiona.MemoryFile()
-    ms = mem_file.open(crs=from_epsg(4326), driver="ESRI Shapefile", schema=pts_schema)
 
-    outfile_path = Path(outfile)
-    out_name_points = outfile_path.stem + '.shp'
-
-    for pid, (p, tv_MSLL,tv_LATT,tv_HATT) in enumerate(zip(plist, tv_MSL,tv_LAT,tv_HAT)):
-        prop = {"p_ID": int(pid + 1), "MSL": float(tv_MSLL),
-              "LAT": float(tv_LATT), "HAT": float(tv_HATT)}
-        ms.write({"geometry": mapping(p), "properties": prop})
-    
-    
     with fiona.open(outfile, 'w', crs=from_epsg(4326), driver='ESRI Shapefile',
                     schema=pts_schema) as output:
-        for pid, (p, tv_MSL,tv_LAT,tv_HAT) in enumerate(zip(plist, tv_MSL,tv_LAT,tv_HAT)):
-            prop = {"p_ID": int(pid + 1), "MSL": float(tv_MSL),"LAT": float(tv_LAT), "HAT": float(tv_HAT)}
-            output.write({"geometry": mapping(p), "properties": prop})
-    
-    return ms
+        output.writerecords(
+            {"geometry": g, "properties": {"p_ID": pid, "MSL": float(msl),
+                                           "LAT": float(lat), "HAT": float(hat)}}
+            for g, pid, msl, lat, hat in zip(
+                pts.geometries(), pts.ids.tolist(), tv_MSL, tv_LAT, tv_HAT
+            )
+        )
 
-def rasterize_points(pc, shp):
+@profiling.profiled(items=profiling.count_arg())
+def rasterize_points(pts, tv_MSL, tv_LAT, tv_HAT, shp, grid=None):
     """
     Rasterize the created points
 
     Parameters
     ----------
-    pc : Fiona collection
-        Points collection as created by write_tide_values().
+    pts : PointSet
+        Points generated by create_pts().
+    tv_MSL, tv_LAT, tv_HAT : list
+        MSL, LAT and HAT of each point.
     shp : Shapely shape
         Shapely polygon as created by get_dataset_outline().
+    grid : dictionary, optional
+        Constituent grid of points snapped to its nodes, see create_pts().
+        The raster cells are then centred on the nodes. The default is None.
 
     Returns
     -------
     image : array
-        Image array.
+        Image array, shape (3, rows, cols), one band per datum in the order
+        of DATUMS.
     profile : dictionary
         Dictionary of the updated profile.
 
     """
-    pc.mode = "r"  
-
-
-    # transform for the target raster, hardcoded 0.125 deg resoution as
-
-    tr = rasterio.transform.from_origin(shp.bounds[0], shp.bounds[-1], 0.125, 0.125)
+    if grid is None:
+        # transform for the target raster, hardcoded 0.125 deg resoution as
+        # that is the resolution of the tide values
+        tr = rasterio.transform.from_origin(
+            shp.bounds[0], shp.bounds[-1], 0.125, 0.125
+        )
 
-    minx, miny, maxx, maxy = shp.bounds
-    xsize = int((maxx - minx) / 0.125)
-    ysize = int((maxy - miny) / 0.125)
+        minx, miny, maxx, maxy = shp.bounds
+        xsize = int((maxx - minx) / 0.125)
+        ysize = int((maxy - miny) / 0.125)
+    else:
+        tr, (ysize, xsize) = pointgrid.lattice_transform(grid, shp.bounds)
 
     profile = {
         "driver": "GTiff",
@@ -496,69 +270,64 @@ def rasterize_points(pc, shp):
         "nodata": None,
         "width": xsize,
         "height": ysize,
-        "count": 1,
+        "count": len(DATUMS),
         "crs": "EPSG:4326",
         "transform": tr,
     }
 
-    image_MSL = features.rasterize(((p["geometry"], p["properties"][[*pc.schema["properties"].keys()][1]])
-            for p in pc), out_shape=(xsize, ysize),transform=tr)
-    image_MSL = image_MSL[np.newaxis, :, :]
-
-
-    image_LAT = features.rasterize(((p["geometry"], p["properties"][[*pc.schema["properties"].keys()][2]])
-            for p in pc), out_shape=(xsize, ysize),transform=tr)
-    image_LAT = image_LAT[np.newaxis, :, :]
+    values = [np.asarray(tv, dtype=np.float64) for tv in (tv_MSL, tv_LAT, tv_HAT)]
+    image = pointgrid.scatter(pts.lon, pts.lat, values, tr, (ysize, xsize))
 
+    return image, profile
 
- 
-    image_HAT = features.rasterize(((p["geometry"], p["properties"][[*pc.schema["properties"].keys()][3]])
-            for p in pc), out_shape=(xsize, ysize),transform=tr)
-    image_HAT = image_HAT[np.newaxis, :, :]
 
-    return image_MSL, image_LAT, image_HAT, profile
 
-
-
-def write_raster(src_array, src_profile, dst_array, dst_profile, outfile):
+@profiling.profiled()
+def write_raster(src_array, src_profile, dst_profile, outfile, method="cubic",
+                 memory=surface.MEMORY, cog=False, compress=None, descriptions=None):
     """
-    Write the final masked or unmasked raster to file.
+    Interpolate the tide surface onto the target grid and write it to file.
+
+    The surface is computed and written window by window straight from the
+    node raster, see surface.write_surface().
 
     Parameters
     ----------
     src_array : Array
-        The reprojected image array created by rasterize_points().
+        The masked or unmasked node raster created by rasterize_points().
     src_profile : Dictionary
-        The profile dictionary of the reprojected array.
-    dst_array : Array
-        The array created by make_ds_array().
+        The profile dictionary of the node raster.
     dst_profile : Dictionary
-        The profile dictionary for the dst_array.
+        The profile dictionary of the target grid created by make_profile().
     outfile : String
         Path to output file.
+    method : String, optional
+        Interpolation between the nodes, "nearest", "linear" or "cubic".
+        The default is "cubic".
+    memory : float, optional
+        Memory budget in MiB of the windows. The default is surface.MEMORY.
+    cog : bool, optional
+        Write a cloud-optimized GeoTIFF with overviews. The default is False.
+    compress : String, optional
+        "deflate" or "zstd" compression. The default is None, uncompressed,
+        or "deflate" for a cloud-optimized GeoTIFF.
+    descriptions : list, optional
+        Band descriptions, e.g. DATUMS. The default is None.
 
     Returns
     -------
     None.
 
     """
+    surface.write_surface(
+        outfile, src_array, src_profile, dst_profile, method, memory, cog, compress,
+        descriptions,
+    )
 
-    dst_image = rasterio.warp.reproject(
-        src_array,
-        dst_array,
-        src_transform=src_profile["transform"],
-        src_crs=src_profile["crs"],
-        src_nodata=None,
-        dst_transform=dst_profile["transform"],
-        dst_crs=dst_profile["crs"],
-        dst_nodata=None,
-        resampling=1,
-    )[0]
-
-    with rasterio.open(outfile, "w", **dst_profile) as dst:
-        dst.write(dst_image)
 
-def main(infile, outfolder = None, date=None, timestamp=None):
+def main(infile, outfolder = None, date=None, timestamp=None, backend="mike", constituents=None,
+         snap=False, workers=None, resampling="cubic", memory=256, cog=False,
+         compress=None):
 
     """
     Run main function to run the timeseries command.
@@ -569,6 +338,31 @@ def main(infile, outfolder = None, date=None, timestamp=None):
         Path to the vht image file.
     outfolder : String
         Path to the output folder. This will be created if it does not exist.
+    backend : String, optional
+        Tide prediction backend, "mike" (TidePredictor.exe) or "native".
+        The default is "mike".
+    constituents : String, optional
+        Path to the global tide constituent dfs2, used by the native backend
+        and for the tidal datums. The default is None, which searches the
+        MIKE installation directory.
+    snap : bool, optional
+        Snap the points to the nodes of the constituent grid and number them
+        by global cell id. The default is False.
+    workers : int, optional
+        Maximum number of TidePredictor runs in parallel, each on its own
+        shard of the points. The default is None, the number of CPUs.
+    resampling : str, optional
+        Interpolation of the tide surface between the 0.125 degree nodes,
+        "nearest", "linear" or "cubic". The default is "cubic".
+    memory : float, optional
+        Approximate memory budget in MiB of the tide surface, which is
+        computed and written in windows that fit it. The default is 256.
+    cog : bool, optional
+        Write the tide surface as a cloud-optimized GeoTIFF with overviews.
+        The default is False.
+    compress : str, optional
+        Compression of the tide surface, "deflate" or "zstd". The default is
+        None, uncompressed, or "deflate" with cog.
 
     Returns
     -------
@@ -596,51 +390,53 @@ def main(infile, outfolder = None, date=None, timestamp=None):
         os.makedirs(outfolder)
      
     
-    mikepath = os.environ.get['MIKE']
-    mikepath = pathlib.Path(mikepath)
+    mikepath = os.environ.get("MIKE")
+    mikepath = pathlib.Path(mikepath) if mikepath else None
     
     dst_profile = make_profile(meta)
-    dst_array = make_ds_array(dst_profile)
-    
-    shp = get_dataset_outline(dst_array, dst_profile)
-    pts = create_pts(shp, 0.125)
+    shp = get_dataset_outline(dst_profile)
+    constituents_path = find_constituents(mikepath, constituents)
+    grid = load_grid(constituents_path) if snap else None
+    lon, lat = create_pts(shp, 0.125, grid)
+    pts = PointSet(lon, lat, pointgrid.cell_ids(grid, lon, lat) if snap else None)
 
     tempfolder = os.path.join(outfolder, "temp")
     os.makedirs(tempfolder, exist_ok=True)
-    generate_pfs(pts, meta, mikepath, tempfolder, date)
-
-    temp_pfs_path = str(list(pathlib.Path(tempfolder).glob("*.pfs"))[0])
-    make_dfs0(mikepath, temp_pfs_path)
-    temp_dfs0_path = str(list(pathlib.Path(tempfolder).glob("*.dfs0"))[0])
 
+    if backend == "native":
+        times = predict.time_range(
+            datetime.datetime(date.year - 1, date.month, date.day),
+            datetime.datetime(date.year, date.month, date.day), 24
+        )
+        df = predict.tide_series(lon, lat, times, constituents_path)
+    else:
+        shards = predict_shards(
+            pts,
+            lambda shard, workdir: generate_pfs(shard, meta, mikepath, workdir, date),
+            mikepath,
+            tempfolder,
+            workers,
+            read=dfs0.to_dataframe,
+        )
+        df = concat_series(shards)
 
-    dfs = Dfs0(temp_dfs0_path)
-    df = dfs.to_dataframe()
     utfilename_csv = ".".join(["tides",str(indate), "csv"])
     outfile_csv = os.path.join(outfolder, utfilename_csv)
     df.to_csv(outfile_csv)
 
-
-    tv_MSL,tv_LAT,tv_HAT = tide_values_from_dfs0(mikepath, meta, temp_dfs0_path, date, df)
+    # MSL, LAT and HAT over the full nodal cycle, looked up in the datum store
+    tide_datums = datums.get_datums(lon, lat, constituents_path)
+    tv_MSL, tv_LAT, tv_HAT = tide_datums["MSL"], tide_datums["LAT"], tide_datums["HAT"]
 
     outfilename_shp = ".".join(["tides",str(indate), "shp"])
     outfile_shp = os.path.join(outfolder, outfilename_shp)
     
-    c = write_tide_values(tv_MSL,tv_LAT,tv_HAT, pts, outfile_shp, outfolder)
-
-    image_MSL, image_LAT, image_HAT, src_profile = rasterize_points(c, shp)
-
-    utfilename_tif_MSL = ".".join(["tides",str(indate), "MSL", "tif"])
-    outfile_tif_MSL = os.path.join(outfolder, utfilename_tif_MSL)
-    write_raster(image_MSL, src_profile, dst_array, dst_profile, outfile_tif_MSL)
-
-    outfilename_tif_HAT = ".".join(["tides",str(indate), "HAT", "tif"])
-    outfile_tif_HAT = os.path.join(outfolder, outfilename_tif_HAT)
-    write_raster(image_HAT, src_profile, dst_array, dst_profile, outfile_tif_HAT)
-
+    write_tide_values(tv_MSL,tv_LAT,tv_HAT, pts, outfile_shp, outfolder)
 
-    outfilename_tif_LAT = ".".join(["tides",str(indate), "LAT", "tif"])
-    outfile_tif_LAT = os.path.join(outfolder, outfilename_tif_LAT)
-    write_raster(image_LAT, src_profile, dst_array, dst_profile, outfile_tif_LAT)    
+    # one band per datum, interpolated in a single pass over the windows
+    image, src_profile = rasterize_points(pts, tv_MSL, tv_LAT, tv_HAT, shp, grid)
+    outfile_tif = os.path.join(outfolder, ".".join(["tides", str(indate), "tif"]))
+    write_raster(image, src_profile, dst_profile, outfile_tif, resampling, memory, cog,
+                 compress, DATUMS)
 
     # shutil.rmtree(tempfolder) 
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Compact set of prediction points backed by coordinate arrays.
+"""
+import numpy as np
+
+
+class PointSet:
+    """
+    Points in EPSG:4326 as contiguous float64 lon/lat arrays.
+
+    Replaces lists of shapely points: a point takes 16 bytes and the PFS
+    writers and rasterizers slice the arrays instead of reading one geometry
+    at a time.
+
+    Parameters
+    ----------
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+    ids : Array, optional
+        Integer point ids. The default is None, which numbers the points
+        from 1 in order.
+
+    """
+
+    __slots__ = ("lon", "lat", "_ids")
+
+    def __init__(self, lon, lat, ids=None):
+        self.lon = np.ascontiguousarray(lon, dtype=np.float64).reshape(-1)
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64).reshape(-1)
+        if len(self.lon) != len(self.lat):
+            raise ValueError("lon and lat must have the same length.")
+        self._ids = None if ids is None else np.asarray(ids, dtype=np.int64)
+
+    @classmethod
+    def from_features(cls, features, lon="lon", lat="lat"):
+        """
+        PointSet from fiona point features.
+
+        Parameters
+        ----------
+        features : list
+            Fiona features.
+        lon, lat : str, optional
+            Properties holding the coordinates. If None, the feature geometry
+            is used. The defaults are "lon" and "lat".
+
+        Returns
+        -------
+        pts : PointSet
+            Points numbered from 1 in feature order.
+
+        """
+        if lon is None or lat is None:
+            xy = np.array(
+                [f["geometry"]["coordinates"][:2] for f in features], dtype=np.float64
+            ).reshape(-1, 2)
+            return cls(xy[:, 0], xy[:, 1])
+
+        return cls(
+            [f["properties"][lon] for f in features],
+            [f["properties"][lat] for f in features],
+        )
+
+    @property
+    def ids(self):
+        """Point ids, numbered from 1 unless given."""
+        if self._ids is None:
+            return np.arange(1, len(self) + 1, dtype=np.int64)
+        return self._ids
+
+    def __len__(self):
+        return len(self.lon)
+
+    def __getitem__(self, index):
+        """Subset of the points, keeping their ids."""
+        return PointSet(self.lon[index], self.lat[index], self.ids[index])
+
+    def __iter__(self):
+        """Iterate over (id, lon, lat) tuples of Python scalars."""
+        return zip(self.ids.tolist(), self.lon.tolist(), self.lat.tolist())
+
+    def __repr__(self):
+        return f"PointSet({len(self)} points)"
+
+    def geometries(self):
+        """
+        GeoJSON-like point geometries, e.g. for fiona or rasterio.features.
+
+        Returns
+        -------
+        geometries : generator
+            One {"type": "Point", "coordinates": (lon, lat)} dict per point.
+
+        """
+        return (
+            {"type": "Point", "coordinates": (x, y)}
+            for x, y in zip(self.lon.tolist(), self.lat.tolist())
+        )
@@ -0,0 +1,573 @@
+# -*- coding: utf-8 -*-
+"""
+Tide prediction with either backend.
+
+The native (NumPy) backend is the alternative to the generate_pfs ->
+TidePredictor.exe chain that runs without MIKE, e.g. on Linux workers. The
+MIKE backend runs that chain through tidepredictor_values(), which all
+commands share.
+"""
+import datetime
+
+import numpy as np
+
+from tidepods import cache, constituents, dfs0, harmonics, profiling
+from tidepods.make_pfs import predict_shards, read_dfs0
+
+VALID_LEVELS = ["LAT", "MSL"]
+BACKENDS = ["mike", "native"]
+INTERPOLATIONS = ["previous", "linear", "cubic"]
+
+
+def time_range(start, end, timestep):
+    """
+    Regular time axis, equivalent to the TidePredictor start/end/timestep.
+
+    Parameters
+    ----------
+    start, end : datetime
+        First and last time (inclusive).
+    timestep : float
+        Timestep in hours.
+
+    Returns
+    -------
+    times : Array
+        datetime64[s] times.
+
+    """
+    step = np.timedelta64(int(round(timestep * 3600)), "s")
+    start = np.datetime64(start, "s")
+    end = np.datetime64(end, "s")
+
+    return np.arange(start, end + step // 2, step)
+
+
+def acquisition_window(date, window, timestep=0.5, last=None):
+    """
+    Start and end of a short prediction series around the acquisition.
+
+    The start is aligned to the timestep, as the full-year series starting
+    at midnight is, so the acquisition falls on the same timestep grid.
+
+    Parameters
+    ----------
+    date : datetime
+        Acquisition date and time.
+    window : float
+        Hours predicted before and after the acquisition.
+    timestep : float, optional
+        Timestep in hours. The default is 0.5.
+    last : datetime, optional
+        Last acquisition of a group starting at date. The default is None,
+        a single acquisition.
+
+    Returns
+    -------
+    start, end : datetime
+        First and last time of the series.
+
+    """
+    last = last or date
+    step = datetime.timedelta(hours=timestep)
+    midnight = datetime.datetime(date.year, date.month, date.day)
+    start = midnight + ((date - datetime.timedelta(hours=window)) - midnight) // step * step
+    nsteps = -(-(last + datetime.timedelta(hours=window) - start) // step)
+
+    return start, start + nsteps * step
+
+
+def prediction_period(date, window=None, timestep=0.5):
+    """
+    Start and end of the series predicted for an acquisition.
+
+    Parameters
+    ----------
+    date : datetime
+        Acquisition date and time.
+    window : float, optional
+        Hours predicted before and after the acquisition. The default is None,
+        which predicts the full calendar year.
+    timestep : float, optional
+        Timestep in hours. The default is 0.5.
+
+    Returns
+    -------
+    start, end : datetime
+        First and last time of the series.
+
+    """
+    if window:
+        return acquisition_window(date, window, timestep)
+
+    return datetime.datetime(date.year, 1, 1), datetime.datetime(date.year, 12, 31)
+
+
+def group_periods(dates, window=None, timestep=0.5):
+    """
+    Split acquisitions at many times into groups sharing one prediction series.
+
+    Without a window, acquisitions are grouped by calendar year, each group
+    predicting its full year. With a window, the sorted acquisitions are
+    split wherever the gap between two of them is longer than the two
+    windows, and each group predicts from the window before its first to the
+    window after its last acquisition.
+
+    Parameters
+    ----------
+    dates : Array
+        Acquisition times, one per point.
+    window : float, optional
+        Hours predicted before and after the acquisitions. The default is
+        None, which predicts full calendar years.
+    timestep : float, optional
+        Timestep in hours. The default is 0.5.
+
+    Returns
+    -------
+    groups : list
+        (index, start, end) tuples: the point indices of the group, in
+        acquisition order, and the first and last time of its series.
+
+    """
+    dates = np.asarray(dates, dtype="datetime64[s]")
+    order = np.argsort(dates, kind="stable")
+    ordered = dates[order]
+
+    if window:
+        gap = np.timedelta64(int(round((2 * window + timestep) * 3600)), "s")
+        breaks = np.flatnonzero(np.diff(ordered) > gap) + 1
+    else:
+        years = ordered.astype("datetime64[Y]")
+        breaks = np.flatnonzero(years[1:] != years[:-1]) + 1
+
+    groups = []
+    for index in np.split(order, breaks):
+        first = dates[index[0]].item()
+        last = dates[index[-1]].item()
+        if window:
+            start, end = acquisition_window(first, window, timestep, last)
+        else:
+            start, end = prediction_period(first)
+        groups.append((index, start, end))
+
+    return groups
+
+
+def interpolate_series(levels, start, timestep, date, interpolation="linear"):
+    """
+    Values of predicted series at an instant between timesteps.
+
+    Only the two (linear) or four (cubic) timesteps around the instant are
+    read, for all points at once, so levels may be a memory-mapped dfs0.
+
+    Parameters
+    ----------
+    levels : Array
+        Tide levels, shape (points, times).
+    start : datetime
+        Time of the first timestep.
+    timestep : float
+        Timestep in hours.
+    date : datetime or Array
+        Instant to interpolate to, or one instant per point.
+    interpolation : str, optional
+        "previous" takes the last timestep before the instant, "linear" and
+        "cubic" interpolate linearly or with a Catmull-Rom spline. The
+        default is "linear".
+
+    Returns
+    -------
+    values : Array
+        float64 values, one per point.
+
+    Raises
+    ------
+    ValueError
+        If an invalid interpolation was provided.
+    ValueError
+        If the instant is outside the predicted series.
+
+    """
+    if interpolation not in INTERPOLATIONS:
+        raise ValueError(
+            f"Interpolation should be one of {INTERPOLATIONS}, not {interpolation}."
+        )
+
+    npoints, ntimes = np.shape(levels)
+    step = np.timedelta64(int(round(timestep * 3600e3)), "ms")
+    position = (
+        np.asarray(date, dtype="datetime64[ms]") - np.datetime64(start, "ms")
+    ) / step
+    if np.any(position < 0) or np.any(position > ntimes - 1):
+        raise ValueError("Acquisition time outside the predicted series.")
+
+    # with one instant per point, gather one value per row
+    rows = slice(None) if position.ndim == 0 else np.arange(npoints)
+
+    def column(i):
+        return np.asarray(levels[rows, np.clip(i, 0, ntimes - 1)], dtype=np.float64)
+
+    index = position.astype(np.int64)
+    if interpolation == "previous" or ntimes == 1:
+        return column(index)
+
+    i = np.minimum(index, ntimes - 2)
+    t = position - i
+    p1, p2 = column(i), column(i + 1)
+    if interpolation == "linear":
+        return p1 + t * (p2 - p1)
+
+    # the series ends are extended by repeating the first and last value
+    p0, p3 = column(i - 1), column(i + 2)
+    return p1 + 0.5 * t * (
+        p2 - p0 + t * (2 * p0 - 5 * p1 + 4 * p2 - p3 + t * (3 * (p1 - p2) + p3 - p0))
+    )
+
+
+@profiling.profiled(items=profiling.count_arg())
+def tide_values_from_series(
+    levels, start, timestep, date, level, lat_datum=None, interpolation="linear"
+):
+    """
+    Tide values at the acquisition time from predicted series.
+
+    Parameters
+    ----------
+    levels : Array
+        Tide levels c.f. MSL, shape (points, times).
+    start : datetime
+        Time of the first timestep.
+    timestep : float
+        Timestep in hours.
+    date : datetime or Array
+        Acquisition date and time, or one per point.
+    level : str
+        Click option LAT or MSL.
+    lat_datum : Array, optional
+        LAT of each point relative to MSL, needed for level LAT.
+    interpolation : str, optional
+        Interpolation between the timesteps, see interpolate_series(). The
+        default is "linear".
+
+    Returns
+    -------
+    tide_values : list
+        List of tide values for image acquisiton date and time.
+
+    Raises
+    ------
+    ValueError
+        If an invalid level type was provided.
+    ValueError
+        If no tide values could be generated.
+
+    """
+    if level not in VALID_LEVELS:
+        raise ValueError(f"Level should be one of {VALID_LEVELS}, not {level}.")
+
+    tide_values = interpolate_series(levels, start, timestep, date, interpolation)
+
+    if level == "LAT":
+        tide_values = tide_values - lat_datum  # Value above LAT
+
+    if not len(tide_values):
+        raise ValueError("No tide values generated, recheck AOI")
+
+    return tide_values.tolist()
+
+
+def read_period(dfsfilepath, start, end, timestep):
+    """
+    Read the series of a TidePredictor dfs0, checking they cover a period.
+
+    Parameters
+    ----------
+    dfsfilepath : str
+        Path to the dfs file created by make_dfs0().
+    start, end : datetime
+        Requested start and end of the series.
+    timestep : float
+        Requested timestep in hours.
+
+    Returns
+    -------
+    levels : Array
+        Tide levels c.f. MSL, shape (points, times).
+
+    Raises
+    ------
+    ValueError
+        If the series do not start at start or do not have the timesteps of
+        time_range(start, end, timestep).
+
+    """
+    header = dfs0.read_header(dfsfilepath)
+    ntimes = len(time_range(start, end, timestep))
+    step = header["timestep"]
+    if (
+        np.datetime64(header["start"], "s") != np.datetime64(start, "s")
+        or header["ntimes"] != ntimes
+        or (
+            ntimes > 1
+            and (step is None or round(step * 3600) != round(timestep * 3600))
+        )
+    ):
+        raise ValueError(
+            f"{dfsfilepath} holds {header['ntimes']} steps of {step} h from "
+            f"{header['start']}, not {ntimes} steps of {timestep} h from {start}."
+        )
+
+    return read_dfs0(dfsfilepath)
+
+
+def cached_levels(
+    pts, write_pfs, start, end, timestep, constituents_path, mikepath, tempdir,
+    workers=None,
+):
+    """
+    Predicted series of points with TidePredictor, reusing cached series.
+
+    Points with the same cache key, e.g. one cell node at several acquisition
+    times, are predicted once.
+
+    Parameters
+    ----------
+    pts : PointSet
+        Points to predict.
+    write_pfs : callable
+        Called as write_pfs(shard_pts, workdir, start, end, timestep) to write
+        the PFS of a shard, e.g. wrapping the generate_pfs() of the command.
+    start, end : datetime
+        Start and end of the predicted series.
+    timestep : float
+        Timestep in hours.
+    constituents_path : pathlib Path
+        Path to the global tide constituent dfs2, fingerprinted in the cache.
+    mikepath : pathlib Path
+        Path to MIKE installation directory.
+    tempdir : str
+        Path to the temporary working directory.
+    workers : int, optional
+        Maximum number of TidePredictor runs in parallel. The default is
+        None, the number of CPUs.
+
+    Returns
+    -------
+    levels : Array
+        Tide levels c.f. MSL, shape (points, times).
+
+    Raises
+    ------
+    ValueError
+        If the TidePredictor series do not match the points or the period,
+        see read_period().
+
+    """
+    fingerprint = cache.file_fingerprint(constituents_path)
+    keys = cache.series_keys(pts.lon, pts.lat, start, end, timestep, fingerprint)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    pts = pts[first]
+    keys = [keys[i] for i in first]
+
+    # only predict the points whose series are not cached yet
+    levels, found = cache.get_series(keys, len(time_range(start, end, timestep)))
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        shards = predict_shards(
+            pts[missing],
+            lambda shard, workdir: write_pfs(shard, workdir, start, end, timestep),
+            mikepath,
+            tempdir,
+            workers,
+            read=lambda path: read_period(path, start, end, timestep),
+        )
+        predicted = np.concatenate(shards)
+        if len(predicted) != len(missing):
+            raise ValueError(
+                f"TidePredictor returned {len(predicted)} series for "
+                f"{len(missing)} points."
+            )
+        levels[missing] = predicted
+        cache.put_series([keys[i] for i in missing], levels[missing])
+
+    return levels[inverse.reshape(-1)]
+
+
+@profiling.profiled(items=profiling.count_arg())
+def tidepredictor_values(
+    pts,
+    write_pfs,
+    date,
+    level,
+    constituents_path,
+    mikepath,
+    tempdir,
+    window=None,
+    timestep=0.5,
+    workers=None,
+    interpolation="linear",
+):
+    """
+    Tide values at the acquisition time, predicted with TidePredictor.
+
+    LAT is taken from datums.lowest_astronomical_tide().
+
+    Parameters
+    ----------
+    pts : PointSet
+        Points to predict.
+    write_pfs : callable
+        Writes the PFS of a shard, see cached_levels().
+    date : datetime
+        Acquisition date and time.
+    level : str
+        Click option LAT or MSL.
+    constituents_path : pathlib Path
+        Path to the global tide constituent dfs2.
+    mikepath : pathlib Path
+        Path to MIKE installation directory.
+    tempdir : str
+        Path to the temporary working directory.
+    window : float, optional
+        Hours predicted before and after the acquisition, see
+        prediction_period(). The default is None, the full calendar year.
+    timestep : float, optional
+        Timestep in hours. The default is 0.5.
+    workers : int, optional
+        Maximum number of TidePredictor runs in parallel. The default is
+        None, the number of CPUs.
+    interpolation : str, optional
+        Interpolation between the timesteps, see interpolate_series(). The
+        default is "linear".
+
+    Returns
+    -------
+    tide_values : list
+        List of tide values for image acquisiton date and time.
+
+    """
+    start, end = prediction_period(date, window, timestep)
+    levels = cached_levels(
+        pts, write_pfs, start, end, timestep, constituents_path, mikepath, tempdir,
+        workers,
+    )
+
+    lat_datum = None
+    if level == "LAT":
+        from tidepods import datums
+
+        lat_datum = datums.lowest_astronomical_tide(pts.lon, pts.lat, constituents_path)
+
+    return tide_values_from_series(
+        levels, start, timestep, date, level, lat_datum, interpolation
+    )
+
+
+def tide_levels(lon, lat, times, constituents_path):
+    """
+    Predict tide levels relative to MSL for all points and times.
+
+    Parameters
+    ----------
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+    times : Array
+        Prediction times (datetime or datetime64).
+    constituents_path : str or pathlib Path
+        Path to the global tide constituent dfs2.
+
+    Returns
+    -------
+    levels : Array
+        Tide levels, shape (points, times).
+
+    """
+    grid = constituents.load_grid(constituents_path)
+    amplitude, phase = constituents.sample(grid, lon, lat)
+
+    return harmonics.predict(amplitude, phase, grid["constituents"], times)
+
+
+@profiling.profiled(items=profiling.count_arg())
+def tide_values(lon, lat, date, level, constituents_path):
+    """
+    Tide values at the acquisition time, the native tidepredictor_values().
+
+    LAT is taken from datums.lowest_astronomical_tide().
+
+    Parameters
+    ----------
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+    date : datetime or Array
+        Acquisition date and time, or one per point.
+    level : str
+        Click option LAT or MSL.
+    constituents_path : str or pathlib Path
+        Path to the global tide constituent dfs2.
+
+    Returns
+    -------
+    tide_values : list
+        List of tide values for image acquisiton date and time.
+
+    Raises
+    ------
+    ValueError
+        If an invalid level type was provided.
+    ValueError
+        If no tide values could be generated.
+
+    """
+    if level not in VALID_LEVELS:
+        raise ValueError(f"Level should be one of {VALID_LEVELS}, not {level}.")
+
+    if np.ndim(date):
+        grid = constituents.load_grid(constituents_path)
+        amplitude, phase = constituents.sample(grid, lon, lat)
+        tide_values = harmonics.predict_at(
+            amplitude, phase, grid["constituents"], harmonics.to_datetime64(date)
+        )
+    else:
+        tide_values = tide_levels(lon, lat, [date], constituents_path)[:, 0]
+
+    if level == "LAT":
+        from tidepods import datums
+
+        lat_datum = datums.lowest_astronomical_tide(lon, lat, constituents_path)
+        tide_values = tide_values - lat_datum  # Value above LAT
+
+    if not len(tide_values):
+        raise ValueError("No tide values generated, recheck AOI")
+
+    return tide_values.tolist()
+
+
+@profiling.profiled(items=profiling.count_arg())
+def tide_series(lon, lat, times, constituents_path):
+    """
+    Predicted tide series as a DataFrame, the native Dfs0.to_dataframe().
+
+    Parameters
+    ----------
+    lon, lat : Array
+        Point coordinates in EPSG:4326.
+    times : Array
+        Prediction times (datetime or datetime64).
+    constituents_path : str or pathlib Path
+        Path to the global tide constituent dfs2.
+
+    Returns
+    -------
+    df : DataFrame
+        Tide levels indexed by time, one "Point_N" column per point.
+
+    """
+    import pandas as pd
+
+    times = harmonics.to_datetime64(times)
+    levels = tide_levels(lon, lat, times, constituents_path)
+    columns = ["Point_" + str(pid) for pid in range(1, len(levels) + 1)]
+
+    return pd.DataFrame(levels.T, index=pd.DatetimeIndex(times), columns=columns)
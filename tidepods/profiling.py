@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Stage-level instrumentation of the tidepods commands.
+
+Functions decorated with profiled() record their wall time, how much they
+raised the peak resident memory of the process and an item count per call
+once profiling is enabled, e.g. by the CLI --profile option. Disabled, the
+decorator only adds a function call.
+"""
+import datetime
+import functools
+import json
+import sys
+import threading
+import time
+
+# report of the current run, None when profiling is disabled
+_report = None
+_lock = threading.Lock()
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process and of its finished children.
+
+    Returns
+    -------
+    self_mb, children_mb : float or None
+        Peak RSS in MiB, None where it can not be determined.
+
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None, None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 2 ** 20, None
+
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    scale = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    )
+
+
+def enable(command=None):
+    """
+    Start recording a run.
+
+    Parameters
+    ----------
+    command : str, optional
+        Name of the command, stored in the report.
+
+    """
+    global _report
+    _report = {
+        "command": command,
+        "argv": sys.argv[1:],
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "t0": time.perf_counter(),
+        "stages": {},
+        # running calls and start of the current busy period of each stage
+        "running": {},
+    }
+
+
+def disable():
+    """Stop recording and discard the report."""
+    global _report
+    _report = None
+
+
+def record(name, seconds, items=None, wall_seconds=None, rss_growth=None):
+    """
+    Add a call of a stage to the report.
+
+    Parameters
+    ----------
+    name : str
+        Stage name.
+    seconds : float
+        Wall time of the call.
+    items : int, optional
+        Number of items (points, features, pixels, ...) handled by the call.
+    wall_seconds : float, optional
+        Wall time added to the stage, less than seconds where the call
+        overlapped other calls of the stage, e.g. in pool threads. The
+        default is None, seconds.
+    rss_growth : float, optional
+        MiB by which the call raised the peak RSS of the process.
+
+    """
+    if _report is None:
+        return
+
+    rss, rss_children = peak_rss()
+    with _lock:
+        stage = _report["stages"].setdefault(
+            name,
+            {
+                "calls": 0,
+                "seconds": 0.0,
+                "wall_seconds": 0.0,
+                "items": None,
+                "peak_rss_growth_mb": None,
+            },
+        )
+        stage["calls"] += 1
+        stage["seconds"] += seconds
+        stage["wall_seconds"] += seconds if wall_seconds is None else wall_seconds
+        if items is not None:
+            stage["items"] = (stage["items"] or 0) + int(items)
+        if rss_growth is not None:
+            stage["peak_rss_growth_mb"] = max(
+                stage["peak_rss_growth_mb"] or 0.0, rss_growth
+            )
+        # cumulative over the run so far, not of this stage alone
+        stage["process_peak_rss_mb"] = rss
+        stage["process_peak_rss_children_mb"] = rss_children
+
+
+def _started(name):
+    """Count a running call of a stage."""
+    now = time.perf_counter()
+    with _lock:
+        running = _report["running"].setdefault(name, [0, now])
+        if not running[0]:
+            running[1] = now
+        running[0] += 1
+
+    return now
+
+
+def _finished(name, t0):
+    """Count a finished call of a stage, its time and the wall time it adds."""
+    now = time.perf_counter()
+    with _lock:
+        if _report is None:
+            return now - t0, 0.0
+        running = _report["running"][name]
+        running[0] -= 1
+        if running[0]:
+            # another call is still running and accounts for the time
+            return now - t0, 0.0
+        since, running[1] = running[1], now
+
+    return now - t0, now - since
+
+
+def count_arg(index=0):
+    """Item counter for profiled(): the length of a positional argument."""
+    return lambda result, *args, **kwargs: len(args[index])
+
+
+def size_arg(index=0):
+    """Item counter for profiled(): the size of a positional array argument."""
+    return lambda result, *args, **kwargs: args[index].size
+
+
+def count_result(result, *args, **kwargs):
+    """Item counter for profiled(): the length of the result."""
+    return len(result)
+
+
+def profiled(name=None, items=None):
+    """
+    Decorator recording each call of a function as a stage.
+
+    Parameters
+    ----------
+    name : str, optional
+        Stage name. The default is the function name.
+    items : callable, optional
+        Called as items(result, *args, **kwargs) to count the items handled
+        by the call, e.g. count_arg(), size_arg() or count_result().
+
+    Returns
+    -------
+    decorator : callable
+
+    """
+
+    def decorator(func):
+        stage = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _report is None:
+                return func(*args, **kwargs)
+
+            rss = peak_rss()[0]
+            t0 = _started(stage)
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                seconds, wall_seconds = _finished(stage, t0)
+            count = None if items is None else items(result, *args, **kwargs)
+            growth = None if rss is None else peak_rss()[0] - rss
+            record(stage, seconds, count, wall_seconds, growth)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def report():
+    """
+    The report of the current run.
+
+    Returns
+    -------
+    report : Dictionary or None
+        Command, arguments, total wall time, peak RSS and the stages in the
+        order they first finished. Stage times are inclusive, so nested
+        stages are also counted in their caller; seconds is summed over the
+        calls and wall_seconds counts concurrent calls once. None if
+        profiling is disabled.
+
+    """
+    if _report is None:
+        return None
+
+    rss, rss_children = peak_rss()
+    with _lock:
+        stages = [dict(name=name, **stage) for name, stage in _report["stages"].items()]
+
+    return {
+        "command": _report["command"],
+        "argv": _report["argv"],
+        "started": _report["started"],
+        "seconds": time.perf_counter() - _report["t0"],
+        "peak_rss_mb": rss,
+        "peak_rss_children_mb": rss_children,
+        "stages": stages,
+    }
+
+
+def write_report(path):
+    """
+    Write the report of the current run as JSON.
+
+    Parameters
+    ----------
+    path : str or pathlib Path
+        Output json file.
+
+    """
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
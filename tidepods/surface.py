@@ -0,0 +1,527 @@
+# -*- coding: utf-8 -*-
+"""
+Tide surfaces interpolated from the prediction nodes onto the target grid.
+
+The tide values of the 0.125 degree nodes form a small EPSG:4326 raster, e.g.
+from rasterize_points(). The target grid is filled window by window: the
+pixel centres of a window are transformed to node coordinates on a coarse
+control mesh, interpolated to every pixel, and the tide values are
+interpolated from the surrounding nodes. Nodes without a value (NaN), e.g.
+masked land, are left out. write_surface() writes each window as soon as it
+is computed, so only the node raster and one window are held in memory.
+With cog=True the tiles are then copied into a cloud-optimized GeoTIFF with
+overviews.
+"""
+import os
+import tempfile
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+import rasterio.warp
+from rasterio.windows import Window
+
+from tidepods import profiling
+
+METHODS = ["nearest", "linear", "cubic"]
+
+COMPRESSIONS = ["deflate", "zstd"]
+
+# tile size and overview resampling of cloud-optimized GeoTIFFs
+COG_BLOCKSIZE = 512
+OVERVIEW_RESAMPLING = "average"
+
+# pixels per side of the windows filled at once
+BLOCKSIZE = 512
+
+# default memory budget in MiB of write_surface()
+MEMORY = 256
+
+# peak working memory per pixel of interpolate_window() with cubic
+# interpolation, and the output bytes per pixel and band
+PIXEL_BYTES = 320
+BAND_BYTES = 12
+
+# GeoTIFF tiles are multiples of 16 pixels
+TILE_MULTIPLE = 16
+MAX_BLOCKSIZE = 4096
+
+# pixels between the points at which the pixel centres are transformed, the
+# node coordinates in between are interpolated linearly
+CONTROL_STEP = 64
+
+NODE_CRS = "EPSG:4326"
+
+
+def windows(height, width, blocksize=BLOCKSIZE):
+    """
+    Windows covering a raster, row by row.
+
+    Parameters
+    ----------
+    height, width : int
+        Raster size in pixels.
+    blocksize : int, optional
+        Maximum window size in pixels. The default is BLOCKSIZE.
+
+    Yields
+    ------
+    window : rasterio Window
+
+    """
+    for row in range(0, height, blocksize):
+        for col in range(0, width, blocksize):
+            yield Window(
+                col, row, min(blocksize, width - col), min(blocksize, height - row)
+            )
+
+
+def memory_blocksize(memory=MEMORY, bands=1):
+    """
+    Largest window size of a memory budget.
+
+    Parameters
+    ----------
+    memory : float, optional
+        Memory budget in MiB. The default is MEMORY.
+    bands : int, optional
+        Number of bands interpolated per window. The default is 1.
+
+    Returns
+    -------
+    blocksize : int
+        Window size in pixels, a multiple of 16 between 16 and 4096.
+
+    """
+    side = np.sqrt(memory * 2 ** 20 / (PIXEL_BYTES + BAND_BYTES * bands))
+    side = int(side) // TILE_MULTIPLE * TILE_MULTIPLE
+
+    return int(np.clip(side, TILE_MULTIPLE, MAX_BLOCKSIZE))
+
+
+def _apply(transform, x, y):
+    """Transform arrays of coordinates with an Affine."""
+    return (
+        transform.a * x + transform.b * y + transform.c,
+        transform.d * x + transform.e * y + transform.f,
+    )
+
+
+def _invert(transform, x, y):
+    """Pixel coordinates of arrays of coordinates, the inverse of _apply()."""
+    a, b, c = transform.a, transform.b, transform.c
+    d, e, f = transform.d, transform.e, transform.f
+    x, y = x - c, y - f
+    det = a * e - b * d
+
+    return (e * x - b * y) / det, (a * y - d * x) / det
+
+
+def _control(offset, size, step):
+    """Control pixel indices of a window axis, including its last pixel."""
+    return np.unique(np.r_[np.arange(offset, offset + size, step), offset + size - 1])
+
+
+def _upsample(control, pixels):
+    """Matrix interpolating values at the control pixels linearly to pixels."""
+    if len(control) == 1:
+        return np.ones((len(pixels), 1))
+    eye = np.eye(len(control))
+    return np.stack([np.interp(pixels, control, e) for e in eye], axis=1)
+
+
+def node_coordinates(src_transform, dst_transform, dst_crs, window, step=CONTROL_STEP):
+    """
+    Node row and column of the pixel centres of a window.
+
+    Parameters
+    ----------
+    src_transform : Affine
+        Transform of the node raster, in EPSG:4326.
+    dst_transform : Affine
+        Transform of the target grid.
+    dst_crs : str or CRS
+        CRS of the target grid.
+    window : rasterio Window
+        Window of the target grid.
+    step : int, optional
+        Pixels between the transformed control points. The default is
+        CONTROL_STEP.
+
+    Returns
+    -------
+    rows, cols : Array
+        Fractional node indices, shape (window height, window width). Whole
+        numbers fall on node centres.
+
+    """
+    rows = _control(int(window.row_off), int(window.height), step)
+    cols = _control(int(window.col_off), int(window.width), step)
+    xs, ys = _apply(dst_transform, *np.meshgrid(cols + 0.5, rows + 0.5))
+    lon, lat = rasterio.warp.transform(dst_crs, NODE_CRS, xs.ravel(), ys.ravel())
+    node_cols, node_rows = _invert(src_transform, np.asarray(lon), np.asarray(lat))
+
+    row_weights = _upsample(rows, np.arange(window.height) + window.row_off)
+    col_weights = _upsample(cols, np.arange(window.width) + window.col_off)
+
+    def upsample(values):
+        values = values.reshape(len(rows), len(cols)) - 0.5
+        return row_weights @ values @ col_weights.T
+
+    return upsample(node_rows), upsample(node_cols)
+
+
+def _cubic_weights(t):
+    """Catmull-Rom weights of the nodes at -1, 0, 1 and 2 for offsets t."""
+    t2, t3 = t * t, t * t * t
+    return (
+        0.5 * (-t + 2 * t2 - t3),
+        0.5 * (2 - 5 * t2 + 3 * t3),
+        0.5 * (t + 4 * t2 - 3 * t3),
+        0.5 * (t3 - t2),
+    )
+
+
+# edge nodes repeated around the node raster, enough for the cubic stencil
+PAD = 3
+
+
+def _weighted(nodes, index, offsets, weights):
+    """Weighted sum of the nodes around each pixel, leaving out missing nodes.
+
+    Returns the sum normalized by the weights of the valid nodes and whether
+    all nodes were valid.
+    """
+    values, valid = nodes
+    total = np.zeros(index.shape)
+    if valid is None:
+        # no missing nodes
+        for offset, w in zip(offsets, weights):
+            total += w * np.take(values, index + offset)
+        return total, True
+
+    norm = np.zeros(index.shape)
+    count = np.zeros(index.shape)
+    for offset, w in zip(offsets, weights):
+        v = np.take(valid, index + offset)
+        total += w * np.take(values, index + offset)
+        norm += w * v
+        count += v
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(norm != 0, total / norm, np.nan), count == len(offsets)
+
+
+def _padded(band):
+    """Flat padded node values and validity, see _weighted()."""
+    padded = np.pad(np.asarray(band, dtype=np.float64), PAD, mode="edge")
+    valid = ~np.isnan(padded)
+    if valid.all():
+        return padded.ravel(), None
+
+    return np.where(valid, padded, 0).ravel(), valid.ravel().astype(np.float64)
+
+
+def interpolate(image, rows, cols, method="cubic"):
+    """
+    Values of a node raster at fractional node indices.
+
+    Outside the raster, the edge nodes are repeated. The stencil weights are
+    computed once and shared by all bands.
+
+    Parameters
+    ----------
+    image : Array
+        Node values, shape (node rows, node cols) or (bands, node rows,
+        node cols), NaN where missing.
+    rows, cols : Array
+        Fractional node indices, e.g. from node_coordinates().
+    method : str, optional
+        "nearest" takes the closest node, "linear" interpolates bilinearly
+        and "cubic" with a bicubic Catmull-Rom spline, falling back to linear
+        next to missing nodes. The default is "cubic".
+
+    Returns
+    -------
+    values : Array
+        float64 values, NaN where no node around a pixel has a value, shape
+        of rows, with a leading band axis if image has one.
+
+    Raises
+    ------
+    ValueError
+        If an invalid method was provided.
+
+    """
+    if method not in METHODS:
+        raise ValueError(f"Method should be one of {METHODS}, not {method}.")
+
+    image = np.asarray(image, dtype=np.float64)
+    bands = image if image.ndim == 3 else image[np.newaxis]
+    nrows, ncols = image.shape[-2:]
+    if method == "nearest":
+        values = bands[
+            :,
+            np.clip(np.floor(rows + 0.5).astype(np.int64), 0, nrows - 1),
+            np.clip(np.floor(cols + 0.5).astype(np.int64), 0, ncols - 1),
+        ]
+        return values if image.ndim == 3 else values[0]
+
+    # flat indices into the padded raster, the stencil nodes are then at
+    # fixed offsets from the top left node
+    width = ncols + 2 * PAD
+    rows = np.clip(rows, -1 - 1e-9, nrows)
+    cols = np.clip(cols, -1 - 1e-9, ncols)
+    r0, c0 = np.floor(rows), np.floor(cols)
+    tr, tc = rows - r0, cols - c0
+    index = (r0.astype(np.int64) + PAD) * width + c0.astype(np.int64) + PAD
+
+    linear = (
+        [i * width + j for i in (0, 1) for j in (0, 1)],
+        [wr * wc for wr in (1 - tr, tr) for wc in (1 - tc, tc)],
+    )
+    if method == "cubic":
+        cubic = (
+            [i * width + j for i in (-1, 0, 1, 2) for j in (-1, 0, 1, 2)],
+            [wr * wc for wr in _cubic_weights(tr) for wc in _cubic_weights(tc)],
+        )
+
+    values = []
+    for band in bands:
+        nodes = _padded(band)
+        band_values, _ = _weighted(nodes, index, *linear)
+        if method == "cubic":
+            smooth, complete = _weighted(nodes, index, *cubic)
+            band_values = np.where(complete, smooth, band_values)
+        values.append(band_values)
+
+    return np.stack(values) if image.ndim == 3 else values[0]
+
+
+@profiling.profiled(items=lambda result, *args, **kwargs: result[0].size)
+def interpolate_window(image, src_transform, dst_transform, dst_crs, window,
+                       method="cubic"):
+    """
+    Tide surface of a window of the target grid.
+
+    Parameters
+    ----------
+    image : Array
+        Node values, shape (bands, node rows, node cols), NaN where missing.
+    src_transform : Affine
+        Transform of the node raster, in EPSG:4326.
+    dst_transform : Affine
+        Transform of the target grid.
+    dst_crs : str or CRS
+        CRS of the target grid.
+    window : rasterio Window
+        Window of the target grid.
+    method : str, optional
+        Interpolation between the nodes, see interpolate(). The default is
+        "cubic".
+
+    Returns
+    -------
+    block : Array
+        float32 values, shape (bands, window height, window width).
+
+    """
+    rows, cols = node_coordinates(src_transform, dst_transform, dst_crs, window)
+
+    return interpolate(np.asarray(image), rows, cols, method).astype(np.float32)
+
+
+def surface_blocks(image, src_profile, dst_profile, method="cubic",
+                   blocksize=BLOCKSIZE):
+    """
+    Tide surface on the target grid, window by window.
+
+    Parameters
+    ----------
+    image : Array
+        Node values, shape (bands, node rows, node cols), e.g. from
+        rasterize_points(), NaN where missing.
+    src_profile : dictionary
+        Profile of the node raster, in EPSG:4326.
+    dst_profile : dictionary
+        Profile of the target grid, e.g. from make_profile().
+    method : str, optional
+        Interpolation between the nodes, see interpolate(). The default is
+        "cubic".
+    blocksize : int, optional
+        Maximum window size in pixels. The default is BLOCKSIZE.
+
+    Yields
+    ------
+    window : rasterio Window
+        Window of the target grid.
+    block : Array
+        float32 values of the window, shape (bands, height, width).
+
+    """
+    for window in windows(
+        int(dst_profile["height"]), int(dst_profile["width"]), blocksize
+    ):
+        yield window, interpolate_window(
+            image,
+            src_profile["transform"],
+            dst_profile["transform"],
+            dst_profile["crs"],
+            window,
+            method,
+        )
+
+
+def raster_profile(dst_profile, bands, blocksize, compress=None):
+    """
+    Profile of a tiled float32 GeoTIFF of the target grid.
+
+    Parameters
+    ----------
+    dst_profile : dictionary
+        Profile of the target grid, e.g. from make_profile().
+    bands : int
+        Number of bands.
+    blocksize : int
+        Tile size in pixels, a multiple of 16.
+    compress : str, optional
+        "deflate" or "zstd", with the floating point predictor. The default
+        is None, uncompressed.
+
+    Returns
+    -------
+    profile : dictionary
+
+    Raises
+    ------
+    ValueError
+        If an invalid compression was provided.
+
+    """
+    profile = dict(
+        dst_profile,
+        driver="GTiff",
+        dtype="float32",
+        nodata=np.nan,
+        width=int(dst_profile["width"]),
+        height=int(dst_profile["height"]),
+        count=bands,
+        tiled=True,
+        blockxsize=blocksize,
+        blockysize=blocksize,
+    )
+    if compress is not None:
+        if compress not in COMPRESSIONS:
+            raise ValueError(
+                f"Compression should be one of {COMPRESSIONS}, not {compress}."
+            )
+        profile.update(compress=compress, predictor=3)
+
+    return profile
+
+
+@profiling.profiled()
+def write_cog(src, outfile, compress="deflate", memory=MEMORY):
+    """
+    Copy a GeoTIFF to a cloud-optimized GeoTIFF with overviews.
+
+    GDAL's block cache is limited to the memory budget during the copy.
+
+    Parameters
+    ----------
+    src : str
+        Input GeoTIFF.
+    outfile : str
+        Output cloud-optimized GeoTIFF.
+    compress : str, optional
+        "deflate" or "zstd", with the floating point predictor. The default
+        is "deflate".
+    memory : float, optional
+        Memory budget in MiB. The default is MEMORY.
+
+    """
+    with rasterio.Env(GDAL_CACHEMAX=max(int(memory), 1)):
+        rasterio.shutil.copy(
+            src,
+            outfile,
+            driver="COG",
+            blocksize=COG_BLOCKSIZE,
+            compress=compress,
+            predictor="YES",
+            overviews="AUTO",
+            overview_resampling=OVERVIEW_RESAMPLING,
+            bigtiff="IF_SAFER",
+        )
+
+
+def _write_tiles(outfile, image, src_profile, dst_profile, method, memory, compress,
+                 descriptions):
+    """Stream the surface to a tiled GeoTIFF, one window per tile."""
+    blocksize = memory_blocksize(memory, len(image))
+    profile = raster_profile(dst_profile, len(image), blocksize, compress)
+
+    with rasterio.open(outfile, "w", **profile) as dst:
+        for bidx, description in enumerate(descriptions or [], start=1):
+            dst.set_band_description(bidx, description)
+        for window, block in surface_blocks(
+            image, src_profile, profile, method, blocksize
+        ):
+            dst.write(block, window=window)
+
+
+@profiling.profiled(
+    items=lambda result, *args, **kwargs: int(args[3]["width"]) * int(args[3]["height"])
+)
+def write_surface(outfile, image, src_profile, dst_profile, method="cubic",
+                  memory=MEMORY, cog=False, compress=None, descriptions=None):
+    """
+    Interpolate a tide surface onto the target grid and stream it to a GeoTIFF.
+
+    The GeoTIFF is tiled with the window size, and each window is written as
+    soon as it is computed, so memory stays within the budget whatever the
+    size of the target grid. All bands of a window are interpolated together,
+    sharing the node coordinates and stencil weights. Pixels without a value
+    are NaN, the nodata value.
+    A cloud-optimized GeoTIFF is copied from a temporary tiled GeoTIFF next to
+    the output, see write_cog().
+
+    Parameters
+    ----------
+    outfile : str
+        Output GeoTIFF.
+    image : Array
+        Node values, shape (bands, node rows, node cols), NaN where missing.
+    src_profile : dictionary
+        Profile of the node raster, in EPSG:4326.
+    dst_profile : dictionary
+        Profile of the target grid, e.g. from make_profile(). Its count is
+        set to the number of bands.
+    method : str, optional
+        Interpolation between the nodes, see interpolate(). The default is
+        "cubic".
+    memory : float, optional
+        Memory budget in MiB, see memory_blocksize(). The default is MEMORY.
+    cog : bool, optional
+        Write a cloud-optimized GeoTIFF with overviews. The default is False.
+    compress : str, optional
+        "deflate" or "zstd" compression. The default is None, uncompressed,
+        or "deflate" for a cloud-optimized GeoTIFF.
+    descriptions : list, optional
+        Band descriptions, e.g. the datum of each band. The default is None.
+
+    """
+    if not cog:
+        _write_tiles(
+            outfile, image, src_profile, dst_profile, method, memory, compress,
+            descriptions,
+        )
+        return
+
+    compress = compress or COMPRESSIONS[0]
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(outfile) or None) as tmp:
+        tiles = os.path.join(tmp, "tiles.tif")
+        _write_tiles(
+            tiles, image, src_profile, dst_profile, method, memory, compress,
+            descriptions,
+        )
+        write_cog(tiles, outfile, compress, memory)
@@ -7,14 +7,18 @@ Created on Jan 2023
 import pathlib
 import os
 import shutil
-import subprocess
 import datetime
 import fiona
-from mikeio import Dfs0, Dataset
+
+from tidepods import columnar, dfs0, pfs, predict, profiling
+from tidepods.constituents import find_constituents
+from tidepods.make_pfs import concat_series, predict_shards
+from tidepods.pointset import PointSet
 
 VALID_LEVELS = ["LAT", "MSL"]
 
 
+@profiling.profiled(items=profiling.count_result)
 def read_shapefile_pts(shape):
     c = fiona.open(shape)
     pts = [p for p in c]
@@ -30,6 +34,38 @@ def read_shapefile_props(shape):
     return crs, driver, schema
 
 
+def read_points(shape):
+    """Points of a shapefile, or of a GeoParquet or Arrow table, as a PointSet."""
+    if pathlib.Path(shape).suffix.lower() in columnar.FORMATS:
+        columns = columnar.read_points(shape)
+        return PointSet(columns["lon"], columns["lat"])
+
+    return PointSet.from_features(read_shapefile_pts(shape), lon=None, lat=None)
+
+
+@profiling.profiled(items=lambda result, df, outfile: len(df.columns))
+def write_series(df, outfile):
+    """Write the series as a csv file, or in bulk as a Parquet or Arrow table.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Tide levels indexed by time, one column per point.
+    outfile : str
+        Output .csv, .parquet, .arrow or .feather file.
+
+    """
+    if pathlib.Path(outfile).suffix.lower() not in columnar.FORMATS:
+        df.to_csv(outfile)
+        return
+
+    columns = {"time": df.index.values}
+    columns.update((str(name), df[name].to_numpy()) for name in df.columns)
+    with columnar.table_writer(outfile) as write:
+        write(columns)
+
+
+@profiling.profiled(items=profiling.count_arg())
 def write_pts(pts, tv, crs, driver, schema, outfile):
 
     for p, t in zip(pts, tv):
@@ -42,13 +78,14 @@ def write_pts(pts, tv, crs, driver, schema, outfile):
             o.write(p)
 
 
+@profiling.profiled(items=profiling.count_arg())
 def generate_pfs(pts, mikepath, tempdir, date):
-    """Generate a pfs file using DHI.PFS.
+    """Generate the TidePredictor pfs file.
 
     Parameters
     ----------
-    pts : list
-        List of shapely points generated by create_pts().
+    pts : PointSet
+        Points to predict, read from the input shapefile.
     mikepath : pathlib Path
         Path to MIKE installation directory.
     tempdir : str
@@ -57,123 +94,36 @@ def generate_pfs(pts, mikepath, tempdir, date):
     Raises
     ------
     ValueError
-        If DHI.PFS could not be imported or is not found in the mike folder.
+        If the tide constituent files are not found in the mike folder.
     ValueError
         If the PFS file could not be created.
 
     """
     temppfs = os.path.join(tempdir, "temp.pfs")
 
-    dhi_pfs_path = list(mikepath.glob("**/Mike SDK/**/*DHI.PFS.dll"))[0]
-    constituents_path = list(
-        mikepath.glob("**/global_tide_constituents_height_0.125deg.dfs2")
-    )[0]
-    prepack_path = list(mikepath.glob("**/Tide_Constituents/prepack.dat"))[0]
-
-    import clr
-    import System
-
-    try:
-        clr.AddReference(str(dhi_pfs_path))
-        import DHI.PFS
-
-    except (ImportError, System.IO.FileNotFoundException) as exception:
-        msg = f'DHI.PFS not found. Is the path correct: "{dhi_pfs_path}"?'
-        raise ValueError(msg) from exception
-
-    # Begin PFS Generation Parameters using DHI.PFS.PFSBuilder
-
-    pfsbuilder = DHI.PFS.PFSBuilder()
-
-    pfsbuilder.AddTarget("TidePredictor")  # First Section
-
-    pfsbuilder.AddKeyword("Name")
-    pfsbuilder.AddString("Points Shapefile")
-    pfsbuilder.AddKeyword("constituent_file_name")
-    pfsbuilder.AddString(str(constituents_path))
-    pfsbuilder.AddKeyword("prepack_file_name")
-    pfsbuilder.AddString(str(prepack_path))
-
-    pfsbuilder.AddKeyword("start_date")
-    DHI.PFS.PFSExtensions.AddDate(pfsbuilder, System.DateTime(date.year-10, date.month, date.day))
-    pfsbuilder.AddKeyword("end_date")
-    DHI.PFS.PFSExtensions.AddDate(pfsbuilder, System.DateTime(date.year, date.month, date.day))
-    pfsbuilder.AddKeyword("timestep")
-    pfsbuilder.AddDouble(0.5)
-
-    pfsbuilder.AddKeyword("number_of_files")
-    pfsbuilder.AddInt(1)
-    pfsbuilder.AddKeyword("ShowGeographic")
-    pfsbuilder.AddInt(1)
-
-    pfsbuilder.AddSection("File_1")  # File Section
-    pfsbuilder.AddKeyword("format")
-    pfsbuilder.AddInt(0)
-    pfsbuilder.AddKeyword("file_name")
-    pfsbuilder.AddFileName("temp.dfs0")
-    pfsbuilder.AddKeyword("description")
-    pfsbuilder.AddString("Predicted Tide Level")
-    pfsbuilder.AddKeyword("number_of_points")
-    pfsbuilder.AddInt(len(pts))
-
-    # Points section enumerated for each point generated within shapefile
-
-    for pid, p in enumerate(pts, 1):
-        pfsbuilder.AddSection("Point_" + str(pid))
-        pfsbuilder.AddKeyword("description")
-        pfsbuilder.AddInt(pid)
-        pfsbuilder.AddKeyword("y")
-        pfsbuilder.AddDouble(p["geometry"]["coordinates"][1])
-        pfsbuilder.AddKeyword("x")
-        pfsbuilder.AddDouble(p["geometry"]["coordinates"][0])
-        pfsbuilder.EndSection()
-
-    pfsbuilder.EndSection()
-    pfsbuilder.EndSection()
-    pfsbuilder.Write(temppfs)
+    start = datetime.datetime(date.year - 10, date.month, date.day)
+    end = datetime.datetime(date.year, date.month, date.day)
+    constituents_path, prepack_path = pfs.tide_files(mikepath)
+    pfs.write_tidepredictor_pfs(
+        temppfs,
+        pts,
+        constituents_path,
+        prepack_path,
+        start,
+        end,
+        name="Points Shapefile",
+    )
 
     if not os.path.exists(temppfs):
         raise ValueError("PFS file not created. Recheck creation options.")
 
 
-def make_dfs0(mikepath, pfsfile):
-    """Generate a dfs0 file from the input PFS in the same directory.
-
-    Parameters
-    ----------
-    mikepath : str
-        Path to MIKE installation directory.
-    pfsfile : str
-        Path to PFS file.
-
-    Raises
-    ------
-    ValueError
-        If the DFS file could not be created.
-    """
-    tp = str(list(mikepath.glob("**/TidePredictor.exe"))[0])
-    cmd = [tp, pfsfile]
-    try:
-        subprocess.check_call(cmd, shell=True)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(
-            "command '{}' return with error (code {}): {}".format(
-                e.cmd, e.returncode, e.output
-            )
-        )
-    dfsfile = pfsfile.replace(".pfs", ".dfs0")
-
-    if not os.path.exists(dfsfile):
-        raise ValueError(
-            f"DFS file not created. Please check that you are connected to the VPN and that the path to the tide predictor is correct: {tp}."
-        )
-
-
-def main(shapefile, outfolder, date, timestamp):
+def main(shapefile, outfolder, date, timestamp, backend="mike", constituents=None,
+         workers=None, output_format="csv"):
 
     # mikepath = os.environ['MIKE'] = "C:\Program Files (x86)\DHI"
     mikepath = os.environ.get("MIKE")
-    mikepath = pathlib.Path(mikepath)
+    mikepath = pathlib.Path(mikepath) if mikepath else None
 
     if not os.path.isdir(outfolder):
         os.makedirs(outfolder)
@@ -181,26 +131,41 @@ def main(shapefile, outfolder, date, timestamp):
     shapefile_path = pathlib.Path(shapefile)
     shapefile_name = shapefile_path.stem
   
-    pts = read_shapefile_pts(shapefile)
+    points = read_points(shapefile)
 
 
     tempfolder = os.path.join(outfolder, "temp")
     os.makedirs(tempfolder, exist_ok=True)
 
-    generate_pfs(pts, mikepath, tempfolder, date)
-   
-    temp_pfs_path = str(list(pathlib.Path(tempfolder).glob("*.pfs"))[0])
-    make_dfs0(mikepath, temp_pfs_path)
-    temp_dfs0_path = str(list(pathlib.Path(tempfolder).glob("*.dfs0"))[0])
-
     date_time = datetime.datetime.combine(date, timestamp)
 
-    dfs = Dfs0(temp_dfs0_path)
-    df = dfs.to_dataframe()
-    df = df.at_time(timestamp)
+    if backend == "native":
+        # only the daily values at the acquisition time are kept, so predict
+        # those instead of the full half-hourly series
+        constituents_path = find_constituents(mikepath, constituents)
+        times = predict.time_range(
+            datetime.datetime.combine(
+                datetime.date(date.year - 10, date.month, date.day), timestamp
+            ),
+            datetime.datetime(date.year, date.month, date.day), 24
+        )
+        df = predict.tide_series(points.lon, points.lat, times, constituents_path)
+    else:
+        shards = predict_shards(
+            points,
+            lambda shard, workdir: generate_pfs(shard, mikepath, workdir, date),
+            mikepath,
+            tempfolder,
+            workers,
+            read=dfs0.to_dataframe,
+        )
+        df = concat_series(shards)
+        df = df.at_time(timestamp)
+
     df.rename(columns = {'Level (A':'tide'}, inplace = True)
 
-    utfilename_csv = "_".join([str(date),"tides.csv"])
-    outfile_csv = os.path.join(outfolder, utfilename_csv)
+    extension = columnar.EXTENSIONS.get(output_format, ".csv")
+    utfilename = "_".join([str(date), "tides" + extension])
+    outfile = os.path.join(outfolder, utfilename)
 
-    df.to_csv(outfile_csv)
+    write_series(df, outfile)